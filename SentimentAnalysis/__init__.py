@@ -1,3 +1,23 @@
-from .sentiment import analysis_sentiment
+# 按需导入: import SentimentAnalysis(以及 SentimentAnalysis.server 等子模块)时不加载 torch / transformers / pandas,
+# 第一次调用下面的函数时才导入 sentiment 模块
 
-__all__ = ['analysis_sentiment']
\ No newline at end of file
+
+def analysis_sentiment(*args, **kwargs):
+    """见 sentiment.analysis_sentiment"""
+    from .sentiment import analysis_sentiment
+    return analysis_sentiment(*args, **kwargs)
+
+
+def analysis_sentiment_stream(*args, **kwargs):
+    """见 sentiment.analysis_sentiment_stream"""
+    from .sentiment import analysis_sentiment_stream
+    return analysis_sentiment_stream(*args, **kwargs)
+
+
+def rescore_from_store(*args, **kwargs):
+    """见 sentiment.rescore_from_store"""
+    from .sentiment import rescore_from_store
+    return rescore_from_store(*args, **kwargs)
+
+
+__all__ = ['analysis_sentiment', 'analysis_sentiment_stream', 'rescore_from_store']
@@ -0,0 +1,162 @@
+"""情感分析性能基准
+
+    python -m SentimentAnalysis.benchmark batching [--max-tokens 8192] [--long-every 10]
+    python -m SentimentAnalysis.benchmark parallel [--rows 100000] [--workers 1,2,4,8] [--preload]
+    python -m SentimentAnalysis.benchmark coldstart
+
+默认使用 SentimentModelTrain/data/weibo2018/test.txt 作为语料.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .sentiment import _SentimentAnalyzer, _make_token_budget_batches, _padding_ratio, _MAX_BATCH_TOKENS, _MAX_SEQ_LENGTH
+
+_TEST_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "SentimentModelTrain", "data", "weibo2018", "test.txt",
+)
+
+
+def load_corpus(path: str = _TEST_PATH) -> list[tuple[str, int]]:
+    """读取 weibo2018 格式的语料(id,label,content), 返回 [(content, label)]"""
+    data = []
+    with open(path, "r", encoding="utf8") as f:
+        for line in f:
+            _, label, content = line.rstrip("\n").split(",", 2)
+            data.append((content, int(label)))
+    return data
+
+
+def load_texts(path: str = _TEST_PATH, *, long_every: int = 0, rows: int = 0) -> list[str]:
+    """读取语料中的文本
+
+    Args:
+        path (str): 语料路径.
+        long_every (int): 每隔多少条把后续若干条拼成一条长文本, 模拟短评论里夹杂长微博的情况, 0 表示不拼接.
+        rows (int): 循环采样到指定条数, 0 表示使用原始条数.
+    """
+    texts = [content for content, _ in load_corpus(path)]
+    if long_every > 0:
+        texts = [
+            "".join(texts[i:i + 10]) if i % long_every == 0 else text
+            for i, text in enumerate(texts)
+        ]
+    if rows > 0:
+        texts = [texts[i % len(texts)] for i in range(rows)]
+    return texts
+
+
+def bench_batching(texts: list[str], *, batch_size: int = 32, max_tokens: int = _MAX_BATCH_TOKENS) -> dict:
+    """对比按到达顺序固定分批和按长度分桶(token 预算)两种方式的 padding 比例与吞吐"""
+    analyzer = _SentimentAnalyzer()
+    lengths = [len(ids) for ids in analyzer.tokenizer(texts, truncation=True, max_length=_MAX_SEQ_LENGTH)["input_ids"]]
+
+    fixed_batches = [list(range(i, min(i + batch_size, len(texts)))) for i in range(0, len(texts), batch_size)]
+    bucket_batches = _make_token_budget_batches(lengths, max_tokens=max_tokens, max_batch_size=batch_size)
+
+    report = {}
+    for name, batches, kwargs in [
+        ("fixed", fixed_batches, {"max_tokens": None}),
+        ("bucketed", bucket_batches, {"max_tokens": max_tokens}),
+    ]:
+        start = time.perf_counter()
+        analyzer.predict(texts, batch_size=batch_size, use_cache=False, **kwargs)
+        elapsed = time.perf_counter() - start
+        report[name] = {
+            "batches": len(batches),
+            "padding_ratio": _padding_ratio(lengths, batches),
+            "texts_per_sec": len(texts) / elapsed,
+        }
+    return report
+
+
+def bench_parallel(texts: list[str], *, workers_list: list[int], threads_per_worker: int, batch_size: int = 32, preload: bool = False) -> dict:
+    """对比不同进程数下的吞吐, 0 表示按 choose_workers 自动选择"""
+    from .parallel import ParallelSentimentAnalyzer
+
+    report = {}
+    for workers in workers_list:
+        analyzer = ParallelSentimentAnalyzer(workers or None, threads_per_worker=threads_per_worker, preload=preload)
+        start = time.perf_counter()
+        analyzer.predict(texts, batch_size=batch_size, use_cache=False)
+        elapsed = time.perf_counter() - start
+        report["auto" if workers == 0 else str(workers)] = {
+            "seconds": elapsed,
+            "texts_per_sec": len(texts) / elapsed,
+        }
+    return report
+
+
+_COLD_START_CODE = """
+import json, time
+start = time.perf_counter()
+from SentimentAnalysis.sentiment import _SentimentAnalyzer
+imported = time.perf_counter()
+_SentimentAnalyzer()
+loaded = time.perf_counter()
+from SentimentAnalysis.weights import private_memory_mb
+print(json.dumps({"import_seconds": imported - start, "load_seconds": loaded - imported, "private_mb": private_memory_mb()}))
+"""
+
+
+def bench_cold_start(weights_format: str) -> dict:
+    """在新进程中测量导入与加载模型的耗时, 以及加载后的私有内存"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, SENTIMENT_WEIGHTS=weights_format, SENTIMENT_BACKEND="torch", SENTIMENT_SCORE_CACHE="0")
+    proc = subprocess.run([sys.executable, "-c", _COLD_START_CODE], cwd=root, env=env, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="情感分析性能基准")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batching = subparsers.add_parser("batching", help="固定分批 vs 按长度分桶")
+    batching.add_argument("--path", default=_TEST_PATH)
+    batching.add_argument("--batch-size", type=int, default=32)
+    batching.add_argument("--max-tokens", type=int, default=_MAX_BATCH_TOKENS)
+    batching.add_argument("--long-every", type=int, default=10)
+
+    parallel = subparsers.add_parser("parallel", help="多进程分片打分的吞吐")
+    parallel.add_argument("--path", default=_TEST_PATH)
+    parallel.add_argument("--rows", type=int, default=100_000)
+    parallel.add_argument("--batch-size", type=int, default=32)
+    parallel.add_argument("--workers", default="1,2,4,8,0", help="逗号分隔的进程数列表, 0 表示自动选择")
+    parallel.add_argument("--threads-per-worker", type=int, default=4)
+    parallel.add_argument("--preload", action="store_true", help="父进程加载模型后 fork 出 worker")
+
+    subparsers.add_parser("coldstart", help="from_pretrained vs 内存映射权重的冷启动耗时与内存")
+
+    args = parser.parse_args()
+
+    if args.command == "batching":
+        texts = load_texts(args.path, long_every=args.long_every)
+        report = bench_batching(texts, batch_size=args.batch_size, max_tokens=args.max_tokens)
+        print(f"{len(texts)} texts, batch_size={args.batch_size}, max_tokens={args.max_tokens}")
+        for name, stats in report.items():
+            print(f"{name:>9}: batches={stats['batches']:>4}  padding_ratio={stats['padding_ratio']:.2%}  texts/sec={stats['texts_per_sec']:.1f}")
+    elif args.command == "parallel":
+        from .parallel import available_cores, choose_workers
+        texts = load_texts(args.path, rows=args.rows)
+        workers_list = [int(w) for w in args.workers.split(",")]
+        report = bench_parallel(texts, workers_list=workers_list, threads_per_worker=args.threads_per_worker, batch_size=args.batch_size, preload=args.preload)
+        n_cores = len(available_cores())
+        auto = choose_workers(len(texts), n_cores=n_cores, threads_per_worker=args.threads_per_worker, batch_size=args.batch_size)
+        print(f"{len(texts)} texts, {n_cores} cores, threads_per_worker={args.threads_per_worker}, auto workers={auto}")
+        for name, stats in report.items():
+            print(f"workers={name:>4}: {stats['seconds']:.1f}s  texts/sec={stats['texts_per_sec']:.1f}")
+    elif args.command == "coldstart":
+        # 先跑一次 mmap, 确保转存文件已经生成, 不把转存时间算进冷启动
+        bench_cold_start("mmap")
+        for weights_format in ("pretrained", "mmap"):
+            stats = bench_cold_start(weights_format)
+            private_mb = f"{stats['private_mb']:.0f} MB" if stats['private_mb'] is not None else "n/a"
+            print(f"{weights_format:>10}: import={stats['import_seconds']:.2f}s  load={stats['load_seconds']:.2f}s  private memory={private_mb}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""情感分数的持久化缓存
+
+以 "模型指纹 + 归一化文本" 的哈希为键, 把分数保存在本地 SQLite 中. 模型权重变化后指纹随之改变,
+旧分数自然失效. 条目数超过上限时按最近使用时间(LRU)淘汰.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+# SQLite 单条语句的变量个数有限制, 批量查询时分块
+_SQL_CHUNK_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本: 去掉零宽字符, 合并连续空白, 去掉首尾空白"""
+    return _WHITESPACE_PATTERN.sub(" ", text.replace("\u200b", "")).strip()
+
+
+def file_fingerprint(*paths: str) -> str:
+    """计算若干文件内容的 sha256, 作为模型版本指纹"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stat_fingerprint(*paths: str) -> str:
+    """用大小和修改时间作为大文件(BERT 权重几百 MB, 每次启动都算哈希太慢)的版本指纹, 文件不存在时记为 missing"""
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+        except FileNotFoundError:
+            digest.update(f"{path}\0missing\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_stale(path: str, *sources: str) -> bool:
+    """派生文件(导出的模型等)不存在, 或者比任一源文件旧"""
+    if not os.path.exists(path):
+        return True
+    mtime = os.path.getmtime(path)
+    return any(os.path.exists(source) and os.path.getmtime(source) > mtime for source in sources)
+
+
+class _ScoreCache:
+    """基于 SQLite 的 LRU 分数缓存
+
+    Attributes:
+        path (str): SQLite 文件路径
+        fingerprint (str): 模型指纹, 参与键的计算
+        max_entries (int): 最多保存的条目数; 多个进程共用一个文件时, 其他进程的写入要等本进程的估计值超过上限才会计入,
+            所以是一个近似的上限
+    """
+
+    def __init__(self, path: str, *, fingerprint: str, max_entries: int = 1_000_000):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # 常驻服务在 executor 线程里调用 predict, 所以允许跨线程使用连接, 由 _lock 串行化
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "key TEXT PRIMARY KEY, score REAL NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_last_used ON scores(last_used)")
+        self._conn.commit()
+        # 条目数只在打开时 COUNT 一次, 之后按本进程的写入累加; 其他进程也可能写入同一个文件,
+        # 所以估计值超过上限时先重新 COUNT 再决定淘汰多少
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()
+
+    def key(self, text: str) -> str:
+        payload = f"{self.fingerprint}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.blake2b(payload, digest_size=20).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, float]:
+        """批量查询, 命中的条目会刷新最近使用时间"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique_keys), _SQL_CHUNK_SIZE):
+                chunk = unique_keys[i:i + _SQL_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key, score FROM scores WHERE key IN ({placeholders})", chunk)
+                found.update(rows)
+
+            if found:
+                now = time.time_ns()
+                self._conn.executemany("UPDATE scores SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self._conn.commit()
+        return found
+
+    def put_many(self, items: dict[str, float]) -> None:
+        """批量写入, 写入后超出上限的部分按 LRU 淘汰"""
+        if not items:
+            return
+        now = time.time_ns()
+        keys = list(items)
+        with self._lock:
+            existing = 0
+            for i in range(0, len(keys), _SQL_CHUNK_SIZE):
+                chunk = keys[i:i + _SQL_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                (n,) = self._conn.execute(f"SELECT COUNT(*) FROM scores WHERE key IN ({placeholders})", chunk).fetchone()
+                existing += n
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scores (key, score, last_used) VALUES (?, ?, ?)",
+                [(key, score, now) for key, score in items.items()],
+            )
+            self._count += len(keys) - existing
+            if self._count > self.max_entries:
+                (self._count,) = self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()
+            if self._count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM scores WHERE key IN (SELECT key FROM scores ORDER BY last_used LIMIT ?)",
+                    (self._count - self.max_entries,),
+                )
+                self._count = self.max_entries
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()
+        return count
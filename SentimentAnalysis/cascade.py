@@ -0,0 +1,227 @@
+"""级联打分: 先用 jieba + 线性模型快速打分, 只有落在不确定区间里的文本才交给 BERT
+
+快速模型沿用 SentimentModelTrain/1.bayes.ipynb 的做法(jieba 分词 + CountVectorizer + MultinomialNB),
+也可以换成逻辑回归. 正向概率在 [low, high] 之间的文本视为不确定, 交给 _SentimentAnalyzer 打分.
+
+    python -m SentimentAnalysis.cascade train [--kind bayes|logreg]
+    python -m SentimentAnalysis.cascade evaluate [--low 0.2] [--high 0.8]
+
+evaluate 在 weibo2018 测试集上报告升级到 BERT 的比例, 以及级联与纯 BERT 的准确率和耗时.
+"""
+import argparse
+import os
+import pickle
+import re
+import sys
+import time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TRAIN_DATA_DIR = os.path.join(_ROOT, "SentimentModelTrain", "data")
+_TRAIN_PATH = os.path.join(_TRAIN_DATA_DIR, "weibo2018", "train.txt")
+_STOPWORDS_PATH = os.path.join(_TRAIN_DATA_DIR, "stopwords.txt")
+_CASCADE_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "cascade", "fast_model.pkl")
+
+_DEFAULT_LOW = 0.2
+_DEFAULT_HIGH = 0.8
+
+
+def processing(text: str) -> str:
+    """与 SentimentModelTrain/utils.processing 相同的预处理(那边在 import 时按相对路径读停用词, 无法直接复用)"""
+    import jieba
+
+    text = re.sub(r"\{%.+?%\}", " ", text)           # 去除 {%xxx%} (地理定位, 微博话题等)
+    text = re.sub(r"@.+?( |$)", " ", text)           # 去除 @xxx (用户名)
+    text = re.sub(r"【.+?】", " ", text)              # 去除 【xx】 (里面的内容通常都不是用户自己写的)
+    text = re.sub("\u200b", " ", text)             # 数据集里的零宽空格
+    words = [w for w in jieba.lcut(text) if w.isalpha()]
+    # 否定词 `不` 与其后面的词拼接
+    while "不" in words:
+        index = words.index("不")
+        if index == len(words) - 1:
+            break
+        words[index: index + 2] = ["".join(words[index: index + 2])]
+    return " ".join(words)
+
+
+def _load_stopwords(path: str = _STOPWORDS_PATH) -> list[str]:
+    with open(path, "r", encoding="utf8") as f:
+        return [w.strip() for w in f]
+
+
+class _FastModel:
+    """jieba 分词 + 词袋 + 线性分类器
+
+    Attributes:
+        vectorizer (CountVectorizer): 词袋向量化
+        classifier: MultinomialNB 或 LogisticRegression
+    """
+
+    def __init__(self, vectorizer, classifier):
+        self.vectorizer = vectorizer
+        self.classifier = classifier
+
+    def predict_proba(self, texts: list[str]):
+        """返回每条文本为正向的概率"""
+        features = self.vectorizer.transform([processing(t) for t in texts])
+        return self.classifier.predict_proba(features)[:, 1]
+
+    def save(self, path: str = _CASCADE_MODEL_PATH) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 只保存 sklearn 对象, 这样以 python -m 运行时保存的文件在别处也能加载
+        with open(path, "wb") as f:
+            pickle.dump({"vectorizer": self.vectorizer, "classifier": self.classifier}, f)
+        return path
+
+    @staticmethod
+    def load(path: str = _CASCADE_MODEL_PATH) -> "_FastModel":
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        return _FastModel(state["vectorizer"], state["classifier"])
+
+
+def train_fast_model(train_path: str = _TRAIN_PATH, *, kind: str = "bayes") -> _FastModel:
+    """在 weibo2018 训练集上训练快速模型
+
+    Args:
+        train_path (str): weibo2018 格式的训练集.
+        kind (str): bayes(MultinomialNB) 或 logreg(LogisticRegression).
+
+    Returns:
+        _FastModel: 训练好的模型
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+    from .benchmark import load_corpus
+
+    corpus = load_corpus(train_path)
+    words = [processing(content) for content, _ in corpus]
+    labels = [label for _, label in corpus]
+
+    vectorizer = CountVectorizer(token_pattern=r"\[?\w+\]?", stop_words=_load_stopwords())
+    features = vectorizer.fit_transform(words)
+    if kind == "bayes":
+        from sklearn.naive_bayes import MultinomialNB
+        classifier = MultinomialNB()
+    elif kind == "logreg":
+        from sklearn.linear_model import LogisticRegression
+        classifier = LogisticRegression(max_iter=1000)
+    else:
+        raise ValueError(f"Unknown fast model kind '{kind}'")
+    classifier.fit(features, labels)
+    return _FastModel(vectorizer, classifier)
+
+
+class CascadeSentimentAnalyzer:
+    """级联打分器, 接口与 _SentimentAnalyzer.predict 一致, 可以直接传给 analysis_sentiment
+
+    Attributes:
+        low (float): 不确定区间下界
+        high (float): 不确定区间上界
+        last_escalated (int): 最近一次 predict 交给 BERT 的条数
+        last_total (int): 最近一次 predict 的非空文本条数
+    """
+
+    def __init__(self, low: float = _DEFAULT_LOW, high: float = _DEFAULT_HIGH, *, model_path: str = _CASCADE_MODEL_PATH, analyzer=None):
+        if not 0 <= low <= high <= 1:
+            raise ValueError(f"Invalid uncertainty band [{low}, {high}]")
+        self.low = low
+        self.high = high
+        self.fast_model = _FastModel.load(model_path)
+        self._analyzer = analyzer
+        self.last_escalated = 0
+        self.last_total = 0
+
+    @property
+    def analyzer(self):
+        # 全部文本都很确定时不需要加载 BERT
+        if self._analyzer is None:
+            from .sentiment import _SentimentAnalyzer
+            self._analyzer = _SentimentAnalyzer()
+        return self._analyzer
+
+    def predict(self, texts, **predict_kwargs):
+        texts = list(texts)
+        scores = [0.5] * len(texts)
+        valid = [i for i, t in enumerate(texts) if t]
+        if not valid:
+            self.last_escalated = self.last_total = 0
+            return scores
+
+        probabilities = self.fast_model.predict_proba([texts[i] for i in valid])
+        escalate = []
+        for i, probability in zip(valid, probabilities):
+            if self.low <= probability <= self.high:
+                escalate.append(i)
+            else:
+                scores[i] = float(probability)
+
+        self.last_total = len(valid)
+        self.last_escalated = len(escalate)
+        print(f"DEBUG [CascadeSentimentAnalyzer]: {len(escalate)}/{len(valid)} texts ({len(escalate) / len(valid):.1%}) escalated to BERT.", file=sys.stderr)
+        if escalate:
+            for i, score in zip(escalate, self.analyzer.predict([texts[i] for i in escalate], **predict_kwargs)):
+                scores[i] = score
+        return scores
+
+
+def evaluate(*, low: float = _DEFAULT_LOW, high: float = _DEFAULT_HIGH, path: str | None = None, model_path: str = _CASCADE_MODEL_PATH) -> dict:
+    """在 weibo2018 测试集上对比级联与纯 BERT 的准确率和耗时(都不使用分数缓存)"""
+    import numpy as np
+    from .benchmark import load_corpus, _TEST_PATH
+    from .sentiment import _SentimentAnalyzer
+
+    corpus = load_corpus(path or _TEST_PATH)
+    texts = [content for content, _ in corpus]
+    labels = np.array([label for _, label in corpus])
+
+    bert = _SentimentAnalyzer()
+    start = time.perf_counter()
+    bert_scores = np.array(bert.predict(texts, use_cache=False))
+    bert_seconds = time.perf_counter() - start
+
+    cascade = CascadeSentimentAnalyzer(low, high, model_path=model_path, analyzer=bert)
+    start = time.perf_counter()
+    cascade_scores = np.array(cascade.predict(texts, use_cache=False))
+    cascade_seconds = time.perf_counter() - start
+
+    fast_scores = cascade.fast_model.predict_proba(texts)
+    return {
+        "texts": len(texts),
+        "band": (low, high),
+        "escalated_fraction": cascade.last_escalated / max(1, cascade.last_total),
+        "fast_accuracy": float(np.mean((fast_scores > 0.5) == labels)),
+        "cascade_accuracy": float(np.mean((cascade_scores > 0.5) == labels)),
+        "bert_accuracy": float(np.mean((bert_scores > 0.5) == labels)),
+        "agreement_with_bert": float(np.mean((cascade_scores > 0.5) == (bert_scores > 0.5))),
+        "cascade_seconds": cascade_seconds,
+        "bert_seconds": bert_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="级联情感打分")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train = subparsers.add_parser("train", help="训练快速模型并保存到 model/cascade")
+    train.add_argument("--kind", choices=["bayes", "logreg"], default="bayes")
+    train.add_argument("--path", default=_TRAIN_PATH)
+
+    check = subparsers.add_parser("evaluate", help="在测试集上对比级联与纯 BERT")
+    check.add_argument("--low", type=float, default=_DEFAULT_LOW)
+    check.add_argument("--high", type=float, default=_DEFAULT_HIGH)
+    check.add_argument("--path", default=None, help="weibo2018 格式的语料, 默认使用测试集")
+
+    args = parser.parse_args()
+
+    if args.command == "train":
+        model = train_fast_model(args.path, kind=args.kind)
+        print(model.save())
+    elif args.command == "evaluate":
+        report = evaluate(low=args.low, high=args.high, path=args.path)
+        print(f"texts={report['texts']}  band=[{args.low}, {args.high}]  escalated={report['escalated_fraction']:.1%}")
+        print(f"accuracy: fast={report['fast_accuracy']:.2%}  cascade={report['cascade_accuracy']:.2%}  bert={report['bert_accuracy']:.2%}")
+        print(f"agreement with bert: {report['agreement_with_bert']:.2%}")
+        print(f"time: cascade={report['cascade_seconds']:.2f}s  bert={report['bert_seconds']:.2f}s  speedup={report['bert_seconds'] / report['cascade_seconds']:.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
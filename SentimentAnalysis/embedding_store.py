@@ -0,0 +1,163 @@
+"""CLS 向量存储
+
+_Net 只是 768 维 CLS 向量上的一层线性层, 换分类头或调整阈值时不需要重新跑 BERT. 这里把每条文本的
+CLS 向量以 float16 保存在一个内存映射数组里(每条 1.5KB), 用 SQLite 记录 键 -> 行号 的索引.
+键可以是 Mongo 的 _id, 也可以是文本哈希(text_key).
+
+BERT 或推理后端变化后指纹随之改变, 旧向量整体作废.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from .cache import normalize_text
+
+# SQLite 单条语句的变量个数有限制, 批量查询时分块
+_SQL_CHUNK_SIZE = 500
+_INITIAL_CAPACITY = 65536
+
+
+def text_key(text: str) -> str:
+    """没有文档 _id 时用归一化文本的哈希作为键"""
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=20).hexdigest()
+
+
+class _EmbeddingStore:
+    """float16 内存映射数组 + SQLite 索引
+
+    Attributes:
+        directory (str): 存储目录, 包含 embeddings.f16 与 index.sqlite3
+        fingerprint (str): BERT 指纹, 与已有存储不一致时清空重建
+        dim (int): 向量维度
+    """
+
+    def __init__(self, directory: str, *, fingerprint: str, dim: int = 768):
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.dim = dim
+        self._data_path = os.path.join(directory, "embeddings.f16")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        stored = dict(self._conn.execute("SELECT name, value FROM meta"))
+        if stored.get("fingerprint") != fingerprint or stored.get("dim") != str(dim):
+            self._conn.execute("DELETE FROM rows")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                [("fingerprint", fingerprint), ("dim", str(dim))],
+            )
+            if os.path.exists(self._data_path):
+                os.remove(self._data_path)
+        self._conn.commit()
+
+        self._count = self._row_count()
+        self._array = None
+        self._open(max(_INITIAL_CAPACITY, self._count))
+
+    def _row_count(self) -> int:
+        """已分配的行数; 行号连续分配, 等于 MAX(row) + 1"""
+        (count,) = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()
+        return count
+
+    def _open(self, capacity: int) -> None:
+        """打开(必要时扩大)数据文件, 行号从 0 开始连续分配"""
+        row_bytes = self.dim * np.dtype(np.float16).itemsize
+        existing = os.path.getsize(self._data_path) // row_bytes if os.path.exists(self._data_path) else 0
+        capacity = max(capacity, existing)
+        if capacity > existing:
+            with open(self._data_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._array = np.memmap(self._data_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows: int) -> None:
+        capacity = self._array.shape[0]
+        if rows <= capacity:
+            return
+        self._array.flush()
+        self._array = None
+        self._open(max(rows, capacity * 2))
+
+    def lookup(self, keys: list[str]) -> dict[str, int]:
+        """返回已存储的 键 -> 行号"""
+        with self._lock:
+            return self._lookup_locked(list(dict.fromkeys(keys)))
+
+    def _lookup_locked(self, unique_keys: list[str]) -> dict[str, int]:
+        found = {}
+        for i in range(0, len(unique_keys), _SQL_CHUNK_SIZE):
+            chunk = unique_keys[i:i + _SQL_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(self._conn.execute(f"SELECT key, row FROM rows WHERE key IN ({placeholders})", chunk))
+        return found
+
+    def read(self, rows: list[int]) -> np.ndarray:
+        """按行号读取向量, 返回 float32 副本"""
+        with self._lock:
+            if rows:
+                # 其他进程追加的行可能超出本进程打开时的容量
+                self._ensure_capacity(max(rows) + 1)
+            return np.asarray(self._array[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+
+    def put_many(self, keys: list[str], embeddings: np.ndarray) -> None:
+        """写入向量, 已存在的键覆盖原来的行, 新键追加到末尾
+
+        每次分析请求都会启动一个桥接进程, 多个进程可能同时追加, 所以行号在 BEGIN IMMEDIATE 事务里
+        按 MAX(row) + 1 分配, 向量写入并落盘后才提交, 提交前其他进程无法分配行号.
+        """
+        if not keys:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float16).reshape(len(keys), self.dim)
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            self._conn.commit()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._lookup_locked(unique_keys)
+                (next_row,) = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()
+                new_keys = [key for key in unique_keys if key not in existing]
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO rows (key, row) VALUES (?, ?)",
+                    [(key, next_row + i) for i, key in enumerate(new_keys)],
+                )
+                assigned = self._lookup_locked(unique_keys)
+                rows = [assigned[key] for key in keys]
+                self._ensure_capacity(max(rows) + 1)
+                self._array[np.asarray(rows, dtype=np.int64)] = embeddings
+                # 先落盘数据再提交索引, 索引里的行一定有对应的向量
+                self._array.flush()
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._count = max(self._count, next_row + len(new_keys))
+
+    def iter_chunks(self, chunk_rows: int = 65536):
+        """按行号顺序分块遍历全部向量
+
+        Yields:
+            tuple[list[str], np.ndarray]: 一块的键与 float32 向量
+        """
+        with self._lock:
+            self._count = self._row_count()
+            self._ensure_capacity(self._count)
+        for start in range(0, self._count, chunk_rows):
+            end = min(start + chunk_rows, self._count)
+            with self._lock:
+                keys = [key for (key,) in self._conn.execute(
+                    "SELECT key FROM rows WHERE row >= ? AND row < ? ORDER BY row", (start, end)
+                )]
+                embeddings = np.asarray(self._array[start:end], dtype=np.float32)
+            yield keys, embeddings
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._count = self._row_count()
+        return self._count
@@ -0,0 +1,212 @@
+"""ONNX Runtime 推理后端
+
+把 BERT 和 _Net 分类头一起导出成一个 ONNX 模型(输出 CLS 向量和分数), 可选再做动态 int8 量化,
+在没有 GPU 的机器上用 ONNX Runtime 代替 PyTorch eager 前向. 导出结果缓存在 model/onnx 目录下,
+源模型文件比缓存更新时会自动重新导出.
+
+通过环境变量选择后端:
+    SENTIMENT_BACKEND=torch      PyTorch(默认)
+    SENTIMENT_BACKEND=onnx       ONNX Runtime, fp32
+    SENTIMENT_BACKEND=onnx-int8  ONNX Runtime, 动态 int8 量化
+
+验证与 PyTorch 的一致率和加速比:
+    python -m SentimentAnalysis.onnx_backend validate [--int8]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from torch import nn
+
+from .cache import is_stale
+
+_ONNX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "onnx")
+_ONNX_INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+_ONNX_OPSET = 17
+
+
+class _ExportWrapper(nn.Module):
+    """导出用的包装: 输入分词结果, 输出 (CLS 向量, 分数)"""
+
+    def __init__(self, bert: nn.Module, head: nn.Module):
+        super().__init__()
+        self.bert = bert
+        self.head = head
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        outputs = self.bert(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)
+        cls_embeddings = outputs.last_hidden_state[:, 0]
+        return cls_embeddings, self.head(cls_embeddings).flatten()
+
+
+def onnx_model_path(quantize: bool) -> str:
+    return os.path.join(_ONNX_DIR, "sentiment.int8.onnx" if quantize else "sentiment.onnx")
+
+
+def export_onnx(bert: nn.Module, head: nn.Module, tokenizer, path: str) -> str:
+    """导出 BERT + _Net 为 ONNX, batch 和序列长度两个维度都是动态的"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    wrapper = _ExportWrapper(bert, head).cpu().eval()
+    dummy = tokenizer(["导出用的样例文本", "第二条"], padding=True, return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in _ONNX_INPUT_NAMES}
+    dynamic_axes.update({"cls_embeddings": {0: "batch"}, "scores": {0: "batch"}})
+
+    print(f"DEBUG [export_onnx]: Exporting ONNX model to {path} ...", file=sys.stderr)
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            tuple(dummy[name] for name in _ONNX_INPUT_NAMES),
+            path,
+            input_names=_ONNX_INPUT_NAMES,
+            output_names=["cls_embeddings", "scores"],
+            dynamic_axes=dynamic_axes,
+            opset_version=_ONNX_OPSET,
+        )
+    return path
+
+
+def quantize_onnx(source_path: str, target_path: str) -> str:
+    """对 ONNX 模型做动态 int8 量化(只量化权重, 激活在运行时量化)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"DEBUG [quantize_onnx]: Quantizing {source_path} -> {target_path} ...", file=sys.stderr)
+    quantize_dynamic(source_path, target_path, weight_type=QuantType.QInt8)
+    return target_path
+
+
+def ensure_onnx_model(*, quantize: bool, sources: list[str], load_torch_models) -> str:
+    """返回可用的 ONNX 模型路径, 缓存缺失或过期时才加载 PyTorch 模型导出
+
+    Args:
+        quantize (bool): 是否需要 int8 量化版本.
+        sources (list[str]): 源模型文件, 用于判断缓存是否过期.
+        load_torch_models (Callable): 返回 (tokenizer, bert, head) 的函数, 只在需要导出时调用.
+    """
+    fp32_path = onnx_model_path(quantize=False)
+    if is_stale(fp32_path, *sources):
+        tokenizer, bert, head = load_torch_models()
+        export_onnx(bert, head, tokenizer, fp32_path)
+    if not quantize:
+        return fp32_path
+
+    int8_path = onnx_model_path(quantize=True)
+    if is_stale(int8_path, fp32_path):
+        quantize_onnx(fp32_path, int8_path)
+    return int8_path
+
+
+class _OnnxRunner:
+    """ONNX Runtime 会话, 接口与 _SentimentAnalyzer._forward 对齐"""
+
+    def __init__(self, path: str, *, intra_op_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        print(f"DEBUG [_OnnxRunner]: Loaded {path}", file=sys.stderr)
+
+    def run(self, tokens) -> tuple[np.ndarray, np.ndarray]:
+        """tokens 是 tokenizer 返回的 pt 或 np 批次, 返回 (CLS 向量, 分数)"""
+        feeds = {}
+        for name in self.input_names:
+            value = tokens[name]
+            value = value.numpy() if hasattr(value, "numpy") else np.asarray(value)
+            feeds[name] = value.astype(np.int64, copy=False)
+        cls_embeddings, scores = self.session.run(["cls_embeddings", "scores"], feeds)
+        return cls_embeddings, scores
+
+
+def validate(*, quantize: bool, path: str | None = None, batch_size: int = 32, max_tokens: int | None = None) -> dict:
+    """在 weibo2018 测试集上对比 PyTorch 与 ONNX 两条路径的判定一致率与速度"""
+    from .benchmark import load_corpus, _TEST_PATH
+    from .sentiment import _load_torch_models, _make_token_budget_batches, _MODEL_SOURCES, _BERT_WEIGHTS_PATH, _MAX_BATCH_TOKENS, _MAX_SEQ_LENGTH
+
+    corpus = load_corpus(path or _TEST_PATH)
+    texts = [content for content, _ in corpus]
+    labels = np.array([label for _, label in corpus])
+
+    tokenizer, bert, head = _load_torch_models()
+    bert.cpu().eval()
+    head.cpu().eval()
+    onnx_path = ensure_onnx_model(
+        quantize=quantize,
+        sources=[*_MODEL_SOURCES, _BERT_WEIGHTS_PATH],
+        load_torch_models=lambda: (tokenizer, bert, head),
+    )
+    runner = _OnnxRunner(onnx_path)
+
+    encodings = tokenizer(texts, truncation=True, max_length=_MAX_SEQ_LENGTH)
+    lengths = [len(ids) for ids in encodings["input_ids"]]
+    batches = _make_token_budget_batches(lengths, max_tokens=max_tokens or _MAX_BATCH_TOKENS, max_batch_size=batch_size)
+    padded = [
+        tokenizer.pad({key: [values[j] for j in batch] for key, values in encodings.items()}, padding=True, return_tensors="pt")
+        for batch in batches
+    ]
+
+    def score_all(forward) -> tuple[np.ndarray, float]:
+        scores = np.empty(len(texts), dtype=np.float32)
+        start = time.perf_counter()
+        for batch, tokens in zip(batches, padded):
+            scores[batch] = forward(tokens)
+        return scores, time.perf_counter() - start
+
+    def torch_forward(tokens):
+        with torch.no_grad():
+            cls_embeddings = bert(**tokens).last_hidden_state[:, 0]
+            return head(cls_embeddings).flatten().numpy()
+
+    torch_scores, torch_seconds = score_all(torch_forward)
+    onnx_scores, onnx_seconds = score_all(lambda tokens: runner.run(tokens)[1])
+
+    return {
+        "texts": len(texts),
+        "backend": "onnx-int8" if quantize else "onnx",
+        "agreement": float(np.mean((torch_scores > 0.5) == (onnx_scores > 0.5))),
+        "max_abs_diff": float(np.max(np.abs(torch_scores - onnx_scores))),
+        "torch_accuracy": float(np.mean((torch_scores > 0.5) == labels)),
+        "onnx_accuracy": float(np.mean((onnx_scores > 0.5) == labels)),
+        "torch_seconds": torch_seconds,
+        "onnx_seconds": onnx_seconds,
+        "speedup": torch_seconds / onnx_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX Runtime 推理后端")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="导出(并量化) ONNX 模型到缓存目录")
+    export.add_argument("--int8", action="store_true")
+
+    check = subparsers.add_parser("validate", help="与 PyTorch 路径对比一致率与加速比")
+    check.add_argument("--int8", action="store_true")
+    check.add_argument("--path", default=None, help="weibo2018 格式的语料, 默认使用测试集")
+    check.add_argument("--batch-size", type=int, default=32)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from .sentiment import _load_torch_models, _MODEL_SOURCES, _BERT_WEIGHTS_PATH
+        path = ensure_onnx_model(
+            quantize=args.int8,
+            sources=[*_MODEL_SOURCES, _BERT_WEIGHTS_PATH],
+            load_torch_models=_load_torch_models,
+        )
+        print(path)
+    elif args.command == "validate":
+        report = validate(quantize=args.int8, path=args.path, batch_size=args.batch_size)
+        print(f"backend={report['backend']}  texts={report['texts']}")
+        print(f"agreement with torch: {report['agreement']:.2%}  (max |diff| = {report['max_abs_diff']:.4f})")
+        print(f"accuracy: torch={report['torch_accuracy']:.2%}  onnx={report['onnx_accuracy']:.2%}")
+        print(f"time: torch={report['torch_seconds']:.2f}s  onnx={report['onnx_seconds']:.2f}s  speedup={report['speedup']:.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""多进程分片打分
+
+单进程 PyTorch 的 intra-op 线程超过 8 个左右就几乎不再加速, 在多核机器上更好的做法是开 N 个进程,
+每个进程绑定一段互不重叠的 CPU 核并只用这几个线程, 各自处理一段连续的文本, 最后按原顺序拼回.
+
+N 的选择规则见 choose_workers.
+
+预加载(pre-fork)模式: 父进程先加载一次模型再 fork 出 worker, worker 以写时复制的方式共享父进程的权重页面,
+配合内存映射权重(见 weights.py), N 个 worker 不会占用 N 份模型内存, 也省去了每个 worker 各自加载模型的时间.
+只支持 torch 后端和提供 fork 的平台.
+"""
+import multiprocessing as mp
+import os
+import queue
+import sys
+import traceback
+
+from .sentiment import _MAX_BATCH_TOKENS
+
+# 每个 worker 使用的线程数: 单进程在 4 线程以内扩展性接近线性
+_THREADS_PER_WORKER = 4
+# 每个 worker 至少要分到的批次数, 太少的话加载模型的开销摊不平
+_MIN_BATCHES_PER_WORKER = 16
+# 设置环境变量 SENTIMENT_PREFORK=1 默认使用预加载模式
+_PREFORK = os.environ.get("SENTIMENT_PREFORK", "0") == "1"
+# 等待 worker 结果时每隔这么多秒检查一次是否有 worker 已经退出
+_POLL_SECONDS = 1.0
+
+
+def available_cores() -> list[int]:
+    """当前进程可以使用的 CPU 核编号"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def choose_workers(n_texts: int, *, n_cores: int | None = None, threads_per_worker: int = _THREADS_PER_WORKER, batch_size: int = 32) -> int:
+    """根据核数与数据量选择 worker 数
+
+    N = min(核数 // 每个 worker 的线程数, 文本数 // (batch_size * 16)), 且至少为 1.
+    前者保证每个 worker 独占 threads_per_worker 个核, 后者保证每个 worker 至少有 16 个批次的工作量.
+
+    Args:
+        n_texts (int): 文本条数.
+        n_cores (int | None): 可用核数, 为 None 时自动检测.
+        threads_per_worker (int): 每个 worker 的线程数. Defaults to 4.
+        batch_size (int): 批大小. Defaults to 32.
+
+    Returns:
+        int: worker 数
+    """
+    n_cores = n_cores or len(available_cores())
+    by_cores = n_cores // max(1, threads_per_worker)
+    by_work = n_texts // (batch_size * _MIN_BATCHES_PER_WORKER)
+    return max(1, min(by_cores, by_work))
+
+
+def _split(n_items: int, n_parts: int) -> list[tuple[int, int]]:
+    """把 [0, n_items) 切成 n_parts 段尽量等长的连续区间"""
+    size, rest = divmod(n_items, n_parts)
+    bounds = []
+    start = 0
+    for i in range(n_parts):
+        end = start + size + (1 if i < rest else 0)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _score_shard(index: int, texts: list[str], cores: list[int], threads: int, predict_kwargs: dict, results, preloaded: bool = False):
+    try:
+        if cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        import torch
+        torch.set_num_threads(threads)
+
+        from .sentiment import _SentimentAnalyzer, _open_score_cache
+        analyzer = _SentimentAnalyzer()
+        if preloaded and analyzer.cache is not None:
+            # SQLite 连接不能跨 fork 使用, 子进程重新打开
+            analyzer.cache = _open_score_cache()
+        scores = analyzer.predict(texts, **predict_kwargs)
+
+        from .weights import private_memory_mb
+        private_mb = private_memory_mb()
+        if private_mb is not None:
+            print(f"DEBUG [_score_shard]: Shard {index} done, private memory {private_mb:.0f} MB.", file=sys.stderr)
+        results.put((index, scores, None))
+    except Exception as e:
+        results.put((index, None, f"{str(e)}\n{traceback.format_exc()}"))
+
+
+class ParallelSentimentAnalyzer:
+    """多进程打分, 接口与 _SentimentAnalyzer.predict 一致, 可以直接传给 analysis_sentiment
+
+    Attributes:
+        workers (int | None): 进程数, 为 None 时按 choose_workers 自动选择
+        threads_per_worker (int): 每个进程的线程数
+        preload (bool): 预加载模式, 父进程加载模型后 fork 出 worker 共享权重
+    """
+
+    def __init__(self, workers: int | None = None, *, threads_per_worker: int = _THREADS_PER_WORKER, preload: bool = _PREFORK):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.preload = preload
+
+    def _can_preload(self) -> bool:
+        if not self.preload:
+            return False
+        from .sentiment import _BACKEND
+        if _BACKEND != "torch" or "fork" not in mp.get_all_start_methods():
+            # ONNX Runtime 的会话在 fork 之后不可用
+            print(f"WARN [ParallelSentimentAnalyzer]: Pre-fork mode needs the torch backend and fork support, using spawn (backend: {_BACKEND}).", file=sys.stderr)
+            return False
+        return True
+
+    def predict(self, texts, batch_size=32, max_tokens=_MAX_BATCH_TOKENS, use_cache=True):
+        texts = list(texts)
+        if not texts:
+            return []
+
+        cores = available_cores()
+        workers = self.workers or choose_workers(len(texts), n_cores=len(cores), threads_per_worker=self.threads_per_worker, batch_size=batch_size)
+        workers = min(workers, len(texts))
+        predict_kwargs = {"batch_size": batch_size, "max_tokens": max_tokens, "use_cache": use_cache}
+
+        if workers <= 1:
+            from .sentiment import _SentimentAnalyzer
+            return _SentimentAnalyzer().predict(texts, **predict_kwargs)
+
+        threads = max(1, min(self.threads_per_worker, len(cores) // workers))
+        print(f"DEBUG [ParallelSentimentAnalyzer]: Scoring {len(texts)} texts with {workers} workers x {threads} threads.", file=sys.stderr)
+
+        preload = self._can_preload()
+        if preload:
+            from .sentiment import _SentimentAnalyzer
+            _SentimentAnalyzer()
+        context = mp.get_context("fork" if preload else "spawn")
+        results = context.Queue()
+        bounds = _split(len(texts), workers)
+        processes = []
+        for index, (start, end) in enumerate(bounds):
+            shard_cores = cores[index * threads:(index + 1) * threads] if len(cores) >= workers * threads else []
+            process = context.Process(
+                target=_score_shard,
+                args=(index, texts[start:end], shard_cores, threads, predict_kwargs, results, preload),
+                daemon=True,
+            )
+            process.start()
+            processes.append(process)
+
+        # 先取结果再 join, 否则子进程可能卡在往队列里写大对象上
+        shards = [None] * workers
+        failures = []
+        pending = set(range(workers))
+
+        def collect(timeout: float) -> bool:
+            try:
+                index, scores, failure = results.get(timeout=timeout)
+            except queue.Empty:
+                return False
+            if failure is not None:
+                failures.append(f"shard {index}: {failure}")
+            shards[index] = scores
+            pending.discard(index)
+            return True
+
+        while pending:
+            if collect(_POLL_SECONDS):
+                continue
+            # 被 OOM killer 杀掉或在 torch 里段错误的 worker 不会再发送结果, 不能一直等下去
+            dead = [index for index in pending if processes[index].exitcode is not None]
+            if not dead:
+                continue
+            # worker 可能在退出前刚发送了结果, 先把队列里的取完
+            while collect(_POLL_SECONDS):
+                pass
+            for index in [index for index in dead if index in pending]:
+                start, end = bounds[index]
+                print(f"WARN [ParallelSentimentAnalyzer]: Worker {index} exited with code {processes[index].exitcode} "
+                      f"before returning, scoring its {end - start} texts in the parent process.", file=sys.stderr)
+                from .sentiment import _SentimentAnalyzer
+                shards[index] = _SentimentAnalyzer().predict(texts[start:end], **predict_kwargs)
+                pending.discard(index)
+        for process in processes:
+            process.join()
+
+        if failures:
+            raise RuntimeError("Parallel sentiment scoring failed - " + "; ".join(failures))
+        return [score for shard in shards for score in shard]
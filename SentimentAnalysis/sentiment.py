@@ -1,14 +1,16 @@
 import torch
+import csv
 import json
 import pandas as pd
-from transformers import BertTokenizer, BertModel
 from torch import nn
+import functools
 import warnings
 import os
 import sys
 import numpy as np
 import traceback
 from tqdm.auto import tqdm
+from .cache import _ScoreCache, file_fingerprint, file_stat_fingerprint
 
 
 warnings.filterwarnings('ignore')
@@ -16,8 +18,62 @@ warnings.filterwarnings('ignore')
 _MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
 _BERT_MODEL_PATH = os.path.join(_MODEL_DIR, "chinese_wwm_pytorch")
 _DNN_MODEL_PATH = os.path.join(_MODEL_DIR, "bert_dnn_10_weight_only.model")
-_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"DEBUG [sentiment.py]: Using device: {_DEVICE}", file=sys.stderr)
+# 推理后端: torch / onnx / onnx-int8, 见 onnx_backend.py
+_BACKEND = os.environ.get("SENTIMENT_BACKEND", "torch")
+# torch 后端的权重加载方式: mmap(内存映射, 见 weights.py) / pretrained(from_pretrained 读入私有内存)
+_WEIGHTS_FORMAT = os.environ.get("SENTIMENT_WEIGHTS", "mmap")
+
+# 分数缓存: 设置环境变量 SENTIMENT_SCORE_CACHE=0 可以关闭
+_SCORE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "score_cache.sqlite3")
+_SCORE_CACHE_MAX_ENTRIES = 2_000_000
+_SCORE_CACHE_ENABLED = os.environ.get("SENTIMENT_SCORE_CACHE", "1") != "0"
+# CLS 向量存储, 只在 predict(store_embeddings=True) 时打开, 见 embedding_store.py
+_EMBEDDING_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "embeddings")
+
+_MAX_SEQ_LENGTH = 512
+# 按长度分桶时每个批次(pad 之后)的 token 上限, 相当于 16 条满长文本
+_MAX_BATCH_TOKENS = 8192
+
+# 逐条结果 CSV 的列与表头
+_RESULT_CSV_COLUMNS = ['content', 'sentiment_score']
+_RESULT_CSV_HEADER = ['分析的语句', '分析结果（情感倾向，数字表示）']
+_RESULT_COLUMNS = ['search_for', 'count', 'mean', 'positive_ratio']
+_POSITIVE_THRESHOLD = 0.5
+
+
+def _make_token_budget_batches(lengths: list[int], *, max_tokens: int, max_batch_size: int | None = None) -> list[list[int]]:
+    """按长度从短到长排序, 贪心地把下标装进批次, 使每批 (条数 x 批内最大长度) 不超过 max_tokens
+
+    Args:
+        lengths (list[int]): 每条文本分词后的长度
+        max_tokens (int): 每个批次 pad 之后的 token 上限, 单条超长文本会独占一个批次
+        max_batch_size (int | None): 每个批次的最大条数. Defaults to None.
+
+    Returns:
+        list[list[int]]: 批次列表, 每个批次是 lengths 中的下标
+    """
+    batches = []
+    batch = []
+    for index in sorted(range(len(lengths)), key=lengths.__getitem__):
+        # 升序遍历, 当前文本就是加入后批内最长的那条
+        too_many_tokens = (len(batch) + 1) * lengths[index] > max_tokens
+        too_many_texts = max_batch_size is not None and len(batch) >= max_batch_size
+        if batch and (too_many_tokens or too_many_texts):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _padding_ratio(lengths: list[int], batches: list[list[int]]) -> float:
+    """pad 出来的 token 占全部计算 token 的比例"""
+    total = sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+    if total == 0:
+        return 0.0
+    return 1 - sum(lengths) / total
+
 
 class _Net(nn.Module):
     def __init__(self, input_size):
@@ -29,26 +85,134 @@ class _Net(nn.Module):
         return self.sigmoid(self.fc(x))
 
 def _parse_data(df_input: pd.DataFrame) -> pd.DataFrame:
-    df = df_input.copy()
-    print(f"DEBUG [_parse_data]: Received DataFrame shape: {df.shape}", file=sys.stderr)
-    print(f"DEBUG [_parse_data]: Received columns: {df.columns.tolist()}", file=sys.stderr)
+    """取出打分与聚合需要的列(content, search_for), 不复制其余的列"""
+    print(f"DEBUG [_parse_data]: Received DataFrame shape: {df_input.shape}", file=sys.stderr)
+    print(f"DEBUG [_parse_data]: Received columns: {df_input.columns.tolist()}", file=sys.stderr)
 
-    if 'content_all' in df.columns:
+    df = pd.DataFrame(index=df_input.index)
+    if 'content_all' in df_input.columns:
         print("DEBUG [_parse_data]: Found 'content_all' column. Using it for 'content'.", file=sys.stderr)
-        df['content'] = df['content_all'].fillna('').astype(str)
-    elif 'content' in df.columns:
+        df['content'] = df_input['content_all'].fillna('').astype(str)
+    elif 'content' in df_input.columns:
         print("DEBUG [_parse_data]: Found 'content' column directly. Using it.", file=sys.stderr)
-        df['content'] = df['content'].fillna('').astype(str)
+        df['content'] = df_input['content'].fillna('').astype(str)
     else:
         print("WARN [_parse_data]: Neither 'content_all' nor 'content' column found in input DataFrame. Sentiment analysis will likely yield default results.", file=sys.stderr)
         df['content'] = ''
 
-    if 'search_for' not in df.columns:
+    if 'search_for' in df_input.columns:
+        df['search_for'] = df_input['search_for']
+    else:
         print("WARN [_parse_data]: 'search_for' column not found. Aggregation might not work as expected.", file=sys.stderr)
 
     print(f"DEBUG [_parse_data]: DataFrame columns after parsing: {df.columns.tolist()}", file=sys.stderr)
     return df
 
+# 参与分数缓存指纹的模型文件(都很小, 可以每次启动时计算哈希)
+_MODEL_SOURCES = [_DNN_MODEL_PATH, os.path.join(_BERT_MODEL_PATH, "config.json")]
+# BERT 权重太大, 用大小和修改时间参与指纹, 替换权重(例如微调后)时缓存的分数和向量都会失效
+_BERT_WEIGHTS_PATH = os.path.join(_BERT_MODEL_PATH, "pytorch_model.bin")
+
+
+@functools.lru_cache(maxsize=None)
+def _device() -> str:
+    """第一次真正需要时才探测 CUDA, 避免 import 阶段初始化 CUDA 运行时"""
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"DEBUG [sentiment.py]: Using device: {device}", file=sys.stderr)
+    return device
+
+
+def _load_tokenizer():
+    # transformers 的导入本身就要一两秒, 放到第一次加载模型时
+    from transformers import BertTokenizer
+    return BertTokenizer.from_pretrained(_BERT_MODEL_PATH)
+
+
+def _load_pretrained_weights():
+    """常规方式加载 BERT 与 _Net, 权重读进本进程的私有内存"""
+    from transformers import BertModel
+
+    bert = BertModel.from_pretrained(_BERT_MODEL_PATH)
+    head = _Net(input_size=768)
+    head.load_state_dict(
+        torch.load(_DNN_MODEL_PATH, map_location="cpu")
+    )
+    return bert, head
+
+
+def _load_torch_models():
+    """加载分词器、BERT 和 _Net 分类头, 返回 (tokenizer, bert, head)"""
+    tokenizer = _load_tokenizer()
+    bert = head = None
+    if _WEIGHTS_FORMAT == "mmap":
+        try:
+            from .weights import load_mmap_models
+            bert, head = load_mmap_models(
+                bert_model_path=_BERT_MODEL_PATH,
+                head_path=_DNN_MODEL_PATH,
+                build_head=lambda: _Net(input_size=768),
+                load_pretrained=_load_pretrained_weights,
+            )
+        except Exception as e:
+            print(f"WARN [_load_torch_models]: Memory-mapped weights unavailable, falling back to from_pretrained - {str(e)}", file=sys.stderr)
+    if bert is None:
+        bert, head = _load_pretrained_weights()
+
+    bert.to(_device())
+    bert.eval()
+    head.to(_device())
+    head.eval()
+    return tokenizer, bert, head
+
+
+def _open_score_cache():
+    if not _SCORE_CACHE_ENABLED:
+        return None
+    try:
+        os.makedirs(os.path.dirname(_SCORE_CACHE_PATH), exist_ok=True)
+        cache = _ScoreCache(
+            _SCORE_CACHE_PATH,
+            # int8 量化后的分数与 fp32 略有差异, 所以后端也是指纹的一部分
+            fingerprint=f"{_BACKEND}:{file_fingerprint(*_MODEL_SOURCES)}:{file_stat_fingerprint(_BERT_WEIGHTS_PATH)}",
+            max_entries=_SCORE_CACHE_MAX_ENTRIES,
+        )
+        print(f"DEBUG [_open_score_cache]: Score cache opened at {_SCORE_CACHE_PATH}", file=sys.stderr)
+        return cache
+    except Exception as e:
+        print(f"WARN [_open_score_cache]: Score cache disabled - {str(e)}", file=sys.stderr)
+        return None
+
+
+def _open_embedding_store():
+    from .embedding_store import _EmbeddingStore
+
+    os.makedirs(_EMBEDDING_STORE_DIR, exist_ok=True)
+    # 向量只取决于 BERT 与推理后端, 与分类头无关
+    store = _EmbeddingStore(
+        _EMBEDDING_STORE_DIR,
+        fingerprint=(f"{_BACKEND}:{file_fingerprint(os.path.join(_BERT_MODEL_PATH, 'config.json'))}"
+                     f":{file_stat_fingerprint(_BERT_WEIGHTS_PATH)}"),
+    )
+    print(f"DEBUG [_open_embedding_store]: Embedding store opened at {_EMBEDDING_STORE_DIR} ({len(store)} rows)", file=sys.stderr)
+    return store
+
+
+def _load_head(path: str = _DNN_MODEL_PATH) -> nn.Module:
+    """单独加载一个分类头(CPU), 用于从向量存储重新打分"""
+    head = _Net(input_size=768)
+    head.load_state_dict(torch.load(path, map_location="cpu"))
+    head.eval()
+    return head
+
+
+def _score_embeddings(head: nn.Module, embeddings: np.ndarray) -> np.ndarray:
+    """用分类头对 CLS 向量打分"""
+    device = next(head.parameters()).device
+    with torch.no_grad():
+        scores = head(torch.from_numpy(np.ascontiguousarray(embeddings, dtype=np.float32)).to(device))
+    return scores.float().cpu().flatten().numpy()
+
+
 class _SentimentAnalyzer:
     _instance = None
 
@@ -57,15 +221,26 @@ class _SentimentAnalyzer:
             print("DEBUG [_SentimentAnalyzer]: Initializing models...", file=sys.stderr)
             cls._instance = super(_SentimentAnalyzer, cls).__new__(cls)
             try:
-                cls._instance.tokenizer = BertTokenizer.from_pretrained(_BERT_MODEL_PATH)
-                cls._instance.bert = BertModel.from_pretrained(_BERT_MODEL_PATH).to(_DEVICE)
-                cls._instance.model = _Net(input_size=768)
-                cls._instance.model.load_state_dict(
-                    torch.load(_DNN_MODEL_PATH, map_location=_DEVICE)
-                )
-                cls._instance.model.to(_DEVICE)
-                cls._instance.model.eval()
-                print("DEBUG [_SentimentAnalyzer]: Models loaded successfully.", file=sys.stderr)
+                if _BACKEND == "torch":
+                    cls._instance.tokenizer, cls._instance.bert, cls._instance.model = _load_torch_models()
+                    cls._instance.runner = None
+                elif _BACKEND in ("onnx", "onnx-int8"):
+                    from .onnx_backend import _OnnxRunner, ensure_onnx_model
+                    # 已经导出过的话不需要再加载 PyTorch 版 BERT
+                    cls._instance.tokenizer = _load_tokenizer()
+                    cls._instance.bert = cls._instance.model = None
+                    onnx_path = ensure_onnx_model(
+                        quantize=_BACKEND == "onnx-int8",
+                        sources=[*_MODEL_SOURCES, _BERT_WEIGHTS_PATH],
+                        load_torch_models=_load_torch_models,
+                    )
+                    cls._instance.runner = _OnnxRunner(onnx_path)
+                else:
+                    raise ValueError(f"Unknown SENTIMENT_BACKEND '{_BACKEND}'")
+                print(f"DEBUG [_SentimentAnalyzer]: Models loaded successfully (backend: {_BACKEND}).", file=sys.stderr)
+                cls._instance.cache = _open_score_cache()
+                cls._instance.embedding_store = None
+                cls._instance.head = None
             except Exception as e:
                 print(f"ERROR [_SentimentAnalyzer]: Failed to load models - {str(e)}", file=sys.stderr)
                 print(traceback.format_exc(), file=sys.stderr)
@@ -73,17 +248,125 @@ class _SentimentAnalyzer:
                 raise RuntimeError(f"Failed to initialize SentimentAnalyzer models: {e}") from e
         return cls._instance
 
-    def predict(self, texts, batch_size=32):
+    def _forward(self, tokens):
+        """对已经分词并 pad 好的一个批次做前向计算, 返回 (每条文本的分数, CLS 向量)"""
+        if self.runner is not None:
+            cls_embeddings, scores = self.runner.run(tokens)
+            return scores.astype(float).tolist(), cls_embeddings
+
+        device = _device()
+        tokens = tokens.to(device)
+        if device == "cuda":
+            with torch.cuda.amp.autocast():
+                outputs = self.bert(**tokens)
+                cls_embeddings = outputs.last_hidden_state[:, 0]
+                preds = self.model(cls_embeddings)
+        else:
+            outputs = self.bert(**tokens)
+            cls_embeddings = outputs.last_hidden_state[:, 0]
+            preds = self.model(cls_embeddings)
+        return preds.float().cpu().flatten().tolist(), cls_embeddings.float().cpu().numpy()
+
+    def predict(self, texts, batch_size=32, max_tokens=_MAX_BATCH_TOKENS, use_cache=True, keys=None, store_embeddings=False):
+        """对文本列表打分, 返回与输入顺序一致的分数列表(空文本为 0.5)
+
+        max_tokens 不为 None 时按分词长度排序分桶, 每个批次 pad 之后的 token 总数不超过 max_tokens,
+        长度相近的文本放在一起可以大幅减少 padding 上浪费的计算; 为 None 时按到达顺序每 batch_size 条一批.
+        use_cache 为 True 且缓存可用时, 只有缓存未命中的文本才会交给 BERT.
+        store_embeddings 为 True 时使用 CLS 向量存储: 已存储的文档直接用分类头打分, 其余文档跑 BERT 后把向量存下来,
+        keys 是每条文本在存储中的键(例如 Mongo 的 _id), 为 None 时使用文本哈希.
+        """
         if not texts:
             print("DEBUG [predict]: Received empty list of texts. Returning empty list.", file=sys.stderr)
             return []
+        texts = _coerce_texts(texts)
         if all(not t for t in texts):
             print("DEBUG [predict]: All texts are empty. Returning default predictions.", file=sys.stderr)
             return [0.5] * len(texts)
-        
+
+        if store_embeddings:
+            predictions = self._predict_with_store(texts, keys, batch_size, max_tokens)
+        elif use_cache and self.cache is not None:
+            predictions = self._predict_cached(texts, batch_size, max_tokens)
+        else:
+            predictions = self._predict_uncached(texts, batch_size, max_tokens)
+        return [0.5 if p is None else p for p in predictions]
+
+    def _predict_uncached(self, texts, batch_size, max_tokens, embeddings=None):
+        """返回的列表中 None 表示该文本所在批次推理失败; embeddings 不为 None 时按下标填入每条文本的 CLS 向量"""
+        if max_tokens is None:
+            return self._predict_fixed(texts, batch_size, embeddings)
+        return self._predict_token_budget(texts, batch_size, max_tokens, embeddings)
+
+    def _predict_with_store(self, texts, keys, batch_size, max_tokens):
+        from .embedding_store import text_key
+
+        if self.embedding_store is None:
+            self.embedding_store = _open_embedding_store()
+        if self.head is None:
+            # onnx 后端没有 PyTorch 版分类头, 单独加载一个
+            self.head = self.model if self.model is not None else _load_head()
+
+        keys = [text_key(t) for t in texts] if keys is None else [str(k) for k in keys]
+        stored = self.embedding_store.lookup([k for k, t in zip(keys, texts) if t])
+
+        miss = {}
+        for key, text in zip(keys, texts):
+            if text and key not in stored and key not in miss:
+                miss[key] = text
+        print(f"DEBUG [predict]: Embedding store hits {len(stored)}, {len(miss)} documents to encode.", file=sys.stderr)
+
+        scores = {}
+        if stored:
+            stored_keys = list(stored)
+            stored_scores = _score_embeddings(self.head, self.embedding_store.read([stored[k] for k in stored_keys]))
+            scores.update(zip(stored_keys, stored_scores.tolist()))
+        if miss:
+            embeddings = [None] * len(miss)
+            new_scores = self._predict_uncached(list(miss.values()), batch_size, max_tokens, embeddings)
+            done = [i for i, e in enumerate(embeddings) if e is not None]
+            miss_keys = list(miss)
+            scores.update((miss_keys[i], new_scores[i]) for i in done)
+            try:
+                self.embedding_store.put_many([miss_keys[i] for i in done], np.stack([embeddings[i] for i in done]) if done else np.empty((0, 768)))
+            except Exception as e:
+                print(f"WARN [predict]: Failed to write embedding store - {str(e)}", file=sys.stderr)
+
+        return [scores.get(key) if text else 0.5 for key, text in zip(keys, texts)]
+
+    def _predict_cached(self, texts, batch_size, max_tokens):
+        keys = [self.cache.key(t) if t else None for t in texts]
+        try:
+            cached = self.cache.get_many([k for k in keys if k is not None])
+        except Exception as e:
+            print(f"WARN [predict]: Score cache lookup failed, scoring without cache - {str(e)}", file=sys.stderr)
+            return self._predict_uncached(texts, batch_size, max_tokens)
+
+        # 同一次调用里重复出现的文本(转发、复制粘贴评论)也只算一次
+        miss_texts = {}
+        for key, text in zip(keys, texts):
+            if key is not None and key not in cached and key not in miss_texts:
+                miss_texts[key] = text
+
+        n_valid = sum(k is not None for k in keys)
+        n_hits = sum(k in cached for k in keys if k is not None)
+        print(f"DEBUG [predict]: Score cache hits {n_hits}/{n_valid} ({n_hits / n_valid:.1%}), {len(miss_texts)} unique texts to score.", file=sys.stderr)
+
+        scores = dict(cached)
+        if miss_texts:
+            new_scores = self._predict_uncached(list(miss_texts.values()), batch_size, max_tokens)
+            fresh = {key: score for key, score in zip(miss_texts, new_scores) if score is not None}
+            scores.update(fresh)
+            try:
+                self.cache.put_many(fresh)
+            except Exception as e:
+                print(f"WARN [predict]: Failed to write score cache - {str(e)}", file=sys.stderr)
+
+        return [0.5 if key is None else scores.get(key) for key in keys]
+
+    def _predict_fixed(self, texts, batch_size, embeddings=None):
         predictions = []
-        self.model.eval()
-        
+
         with tqdm(total=len(texts), desc="Analysing Sentiments", unit="text", file=sys.stderr, ascii=True) as pbar:
             with torch.no_grad():
                 for i in range(0, len(texts), batch_size):
@@ -100,34 +383,152 @@ class _SentimentAnalyzer:
                             valid_batch,
                             padding=True,
                             truncation=True,
-                            max_length=512,
+                            max_length=_MAX_SEQ_LENGTH,
                             return_tensors="pt"
-                        ).to(_DEVICE)
-
-                        if _DEVICE == "cuda":
-                            with torch.cuda.amp.autocast():
-                                outputs = self.bert(**tokens)
-                                cls_embeddings = outputs.last_hidden_state[:, 0]
-                                preds = self.model(cls_embeddings)
-                        else: 
-                            outputs = self.bert(**tokens)
-                            cls_embeddings = outputs.last_hidden_state[:, 0]
-                            preds = self.model(cls_embeddings)
-
-                        pred_iter = iter(preds.cpu().flatten().tolist())
+                        )
+                        batch_scores, batch_embeddings = self._forward(tokens)
+                        pred_iter = iter(batch_scores)
                         batch_preds = [next(pred_iter) if t else 0.5 for t in batch]
                         predictions.extend(batch_preds)
+                        if embeddings is not None:
+                            valid_positions = [i + j for j, t in enumerate(batch) if t]
+                            for position, embedding in zip(valid_positions, batch_embeddings):
+                                embeddings[position] = embedding
 
                     except Exception as e:
                         print(f"ERROR [predict]: Error during batch prediction ({i}-{i+len(batch)-1}) - {str(e)}", file=sys.stderr)
                         print(traceback.format_exc(), file=sys.stderr)
-                        predictions.extend([0.5] * len(batch)) # 失败的批次也使用默认预测
+                        predictions.extend([None] * len(batch)) # 失败的批次最后使用默认预测, 且不会写入缓存
 
                     pbar.update(len(batch)) # 更新进度条，增加处理的文本数量
 
         return predictions
 
-def analysis_sentiment(input_data: pd.DataFrame, output_csv_path: str = 'sentiment_analysis_result.csv'):
+    def _predict_token_budget(self, texts, batch_size, max_tokens, embeddings=None):
+        predictions = [0.5 if not t else None for t in texts]
+        valid_indices = [i for i, t in enumerate(texts) if t]
+
+        # 只分词一次(不 pad), 之后每个批次再按批内最长的文本 pad
+        encodings, valid_indices = self._encode(texts, valid_indices)
+        lengths = [len(ids) for ids in encodings["input_ids"]]
+        batches = _make_token_budget_batches(lengths, max_tokens=max_tokens, max_batch_size=batch_size)
+        print(f"DEBUG [predict]: {len(valid_indices)} texts bucketed into {len(batches)} batches, padding ratio {_padding_ratio(lengths, batches):.2%}", file=sys.stderr)
+
+        with tqdm(total=len(texts), desc="Analysing Sentiments", unit="text", file=sys.stderr, ascii=True) as pbar:
+            pbar.update(len(texts) - len(valid_indices))
+            with torch.no_grad():
+                for batch in batches:
+                    try:
+                        tokens = self.tokenizer.pad(
+                            {key: [values[j] for j in batch] for key, values in encodings.items()},
+                            padding=True,
+                            return_tensors="pt",
+                        )
+                        batch_scores, batch_embeddings = self._forward(tokens)
+                        for j, pred in zip(batch, batch_scores):
+                            predictions[valid_indices[j]] = pred
+                        if embeddings is not None:
+                            for j, embedding in zip(batch, batch_embeddings):
+                                embeddings[valid_indices[j]] = embedding
+
+                    except Exception as e:
+                        print(f"ERROR [predict]: Error during bucketed batch prediction ({len(batch)} texts) - {str(e)}", file=sys.stderr)
+                        print(traceback.format_exc(), file=sys.stderr)
+
+                    pbar.update(len(batch))
+
+        return predictions
+
+    def _encode(self, texts, indices):
+        """对 texts 中 indices 位置的文本分词(不 pad); 整体分词失败时逐条分词, 跳过失败的文本(其分数为 None)
+
+        Returns:
+            tuple: (分词结果, 分词成功的下标)
+        """
+        try:
+            return self.tokenizer([texts[i] for i in indices], truncation=True, max_length=_MAX_SEQ_LENGTH), indices
+        except Exception as e:
+            print(f"WARN [predict]: Tokenizing all texts at once failed, retrying one by one - {str(e)}", file=sys.stderr)
+
+        encodings, kept = {}, []
+        for i in indices:
+            try:
+                encoding = self.tokenizer(texts[i], truncation=True, max_length=_MAX_SEQ_LENGTH)
+            except Exception as e:
+                print(f"WARN [predict]: Skipping text {i}, tokenizer failed - {str(e)}", file=sys.stderr)
+                continue
+            for key, value in encoding.items():
+                encodings.setdefault(key, []).append(value)
+            kept.append(i)
+        return encodings, kept
+
+def _coerce_texts(texts) -> list:
+    """predict 的输入可能来自 DataFrame 列: None / NaN 视为空文本(分数 0.5), 其他非 str 的值转成 str"""
+    return [t if isinstance(t, str) else "" if t is None or t != t else str(t) for t in texts]
+
+def _resolve_analyzer(analyzer, workers: int):
+    """analyzer 可以是常驻服务的客户端(见 server.RemoteSentimentAnalyzer), 默认在本进程加载模型"""
+    if analyzer is not None:
+        return analyzer
+    if workers != 1:
+        from .parallel import ParallelSentimentAnalyzer
+        return ParallelSentimentAnalyzer(workers or None)
+    return _SentimentAnalyzer()
+
+
+def _predict_kwargs(analyzer, keys, store_embeddings: bool) -> dict:
+    """向量存储只能在本进程的 _SentimentAnalyzer 上使用"""
+    if not store_embeddings:
+        return {}
+    if not isinstance(analyzer, _SentimentAnalyzer):
+        print("WARN [analysis_sentiment]: Embedding store only works with the in-process analyzer, ignoring store_embeddings.", file=sys.stderr)
+        return {}
+    return {"keys": keys, "store_embeddings": True}
+
+
+def rescore_from_store(head_path: str = _DNN_MODEL_PATH, *, keys=None, chunk_rows: int = 65536) -> dict:
+    """用(新训练的)分类头直接对 CLS 向量存储重新打分, 不需要运行 BERT
+
+    Args:
+        head_path (str): 分类头权重文件. Defaults to 当前使用的 _Net 权重.
+        keys (list | None): 只对这些键打分, 为 None 时对整个存储打分.
+        chunk_rows (int): 每次读入内存的行数.
+
+    Returns:
+        dict: 键 -> 分数, 不在存储中的键不会出现在结果里
+    """
+    store = _open_embedding_store()
+    head = _load_head(head_path)
+    scores = {}
+    if keys is None:
+        for chunk_keys, embeddings in store.iter_chunks(chunk_rows):
+            scores.update(zip(chunk_keys, _score_embeddings(head, embeddings).tolist()))
+        return scores
+
+    found = store.lookup([str(k) for k in keys])
+    found_keys = list(found)
+    for i in range(0, len(found_keys), chunk_rows):
+        chunk_keys = found_keys[i:i + chunk_rows]
+        embeddings = store.read([found[k] for k in chunk_keys])
+        scores.update(zip(chunk_keys, _score_embeddings(head, embeddings).tolist()))
+    return scores
+
+
+def analysis_sentiment(input_data: pd.DataFrame, output_csv_path: str = 'sentiment_analysis_result.csv', analyzer=None, workers: int = 1,
+                       store_embeddings: bool = False, positive_threshold: float = _POSITIVE_THRESHOLD):
+    """对 DataFrame 中的文本打分并按 search_for 聚合
+
+    Args:
+        input_data (pd.DataFrame): 待分析的数据.
+        output_csv_path (str): 逐条分数的输出路径, 为空时不保存.
+        analyzer: 实现了 predict(texts) 的打分器, 为 None 时按 workers 选择.
+        workers (int): 本地打分的进程数, 1 表示在本进程打分, 0 表示按核数与数据量自动选择(见 parallel.choose_workers).
+        store_embeddings (bool): 使用 CLS 向量存储, 有 _id 列时以 _id 为键, 否则以文本哈希为键.
+        positive_threshold (float): 分数高于该值计为正向, 用于 positive_ratio.
+
+    Returns:
+        pd.DataFrame: 聚合结果
+    """
     if not isinstance(input_data, pd.DataFrame):
         print("ERROR [analysis_sentiment]: Input data is not a Pandas DataFrame.", file=sys.stderr)
         return pd.DataFrame()
@@ -137,7 +538,7 @@ def analysis_sentiment(input_data: pd.DataFrame, output_csv_path: str = 'sentime
         return pd.DataFrame(columns=['search_for', 'count', 'mean', 'positive_ratio'])
 
     try:
-        analyzer = _SentimentAnalyzer()
+        analyzer = _resolve_analyzer(analyzer, workers)
         if analyzer is None:
              raise RuntimeError("SentimentAnalyzer instance is None, models likely failed to load.")
 
@@ -159,19 +560,14 @@ def analysis_sentiment(input_data: pd.DataFrame, output_csv_path: str = 'sentime
              else:
                  return pd.DataFrame(columns=['search_for', 'count', 'mean', 'positive_ratio'])
 
-        df['sentiment_score'] = analyzer.predict(texts)
+        keys = input_data['_id'].astype(str).tolist() if '_id' in input_data.columns else None
+        df['sentiment_score'] = analyzer.predict(texts, **_predict_kwargs(analyzer, keys, store_embeddings))
         print(f"DEBUG [analysis_sentiment]: Added 'sentiment_score' column. Shape: {df.shape}", file=sys.stderr)
 
         if output_csv_path:
             try:
-                results_to_save = df[['content', 'sentiment_score']].copy()
-                results_to_save.rename(columns={
-                    'content': '分析的语句',
-                    'sentiment_score': '分析结果（情感倾向，数字表示）'
-                }, inplace=True)
-
                 # Save to CSV
-                results_to_save.to_csv(output_csv_path, index=False, encoding='utf-8-sig') # Use utf-8-sig for Excel compatibility
+                df.to_csv(output_csv_path, columns=_RESULT_CSV_COLUMNS, header=_RESULT_CSV_HEADER, index=False, encoding='utf-8-sig') # Use utf-8-sig for Excel compatibility
                 print(f"INFO [analysis_sentiment]: Individual sentiment results saved to {output_csv_path}", file=sys.stderr)
             except Exception as e_csv:
                 print(f"ERROR [analysis_sentiment]: Failed to save individual results to CSV - {str(e_csv)}", file=sys.stderr)
@@ -179,10 +575,11 @@ def analysis_sentiment(input_data: pd.DataFrame, output_csv_path: str = 'sentime
 
         if 'search_for' in df.columns:
             print("DEBUG [analysis_sentiment]: Grouping results by 'search_for'...", file=sys.stderr)
+            df['is_positive'] = df['sentiment_score'] > positive_threshold
             results = df.groupby('search_for').agg(
                 count=('sentiment_score', 'size'),
                 mean=('sentiment_score', 'mean'),
-                positive_ratio=('sentiment_score', lambda x: (x > 0.5).mean() if not x.empty else np.nan)
+                positive_ratio=('is_positive', 'mean')
             ).reset_index()
             print(f"DEBUG [analysis_sentiment]: Aggregation complete. Result shape: {results.shape}", file=sys.stderr)
             results = results.sort_values(by='count', ascending=False)
@@ -191,7 +588,7 @@ def analysis_sentiment(input_data: pd.DataFrame, output_csv_path: str = 'sentime
             total_count = len(df)
             if total_count > 0:
                  mean_sentiment = df['sentiment_score'].mean()
-                 positive_ratio = (df['sentiment_score'] > 0.5).mean()
+                 positive_ratio = (df['sentiment_score'] > positive_threshold).mean()
                  results = pd.DataFrame([{
                      'search_for': 'Overall',
                      'count': total_count,
@@ -212,6 +609,115 @@ def analysis_sentiment(input_data: pd.DataFrame, output_csv_path: str = 'sentime
         print(traceback.format_exc(), file=sys.stderr)
         return pd.DataFrame(columns=['search_for', 'count', 'mean', 'positive_ratio'])
 
+
+class _StreamingAggregate:
+    """按 search_for 增量累计 count / sum / 正向条数, 内存只与关键词个数有关"""
+
+    def __init__(self, positive_threshold: float = _POSITIVE_THRESHOLD):
+        self.positive_threshold = positive_threshold
+        self._stats: dict[str, list] = {}
+
+    def update(self, keywords: list, scores: list[float]) -> None:
+        chunk = pd.DataFrame({'search_for': keywords, 'score': scores})
+        chunk['is_positive'] = chunk['score'] > self.positive_threshold
+        grouped = chunk.groupby('search_for', sort=False).agg(
+            count=('score', 'size'),
+            total=('score', 'sum'),
+            positive=('is_positive', 'sum'),
+        )
+        for keyword, count, total, positive in grouped.itertuples():
+            stats = self._stats.setdefault(keyword, [0, 0.0, 0])
+            stats[0] += int(count)
+            stats[1] += float(total)
+            stats[2] += int(positive)
+
+    def result(self) -> pd.DataFrame:
+        if not self._stats:
+            return pd.DataFrame(columns=_RESULT_COLUMNS)
+        results = pd.DataFrame(
+            [(keyword, count, total / count, positive / count) for keyword, (count, total, positive) in self._stats.items()],
+            columns=_RESULT_COLUMNS,
+        )
+        return results.sort_values(by='count', ascending=False, ignore_index=True)
+
+
+def _record_content(record: dict) -> str:
+    """与 _parse_data 相同的取值规则: 优先 content_all, 其次 content; Mongo 记录的正文在 json_data 中"""
+    json_data = record.get('json_data')
+    sources = (record, json_data) if isinstance(json_data, dict) else (record,)
+    for field in ('content_all', 'content'):
+        for source in sources:
+            value = source.get(field)
+            if value is not None and not (isinstance(value, float) and np.isnan(value)):
+                return str(value)
+    return ''
+
+
+def _chunk_columns(chunk) -> tuple[list[str], list, list | None]:
+    """从一块数据中取出 (文本, 关键词, 文档 _id), chunk 可以是记录列表或 DataFrame"""
+    if isinstance(chunk, pd.DataFrame):
+        parsed = _parse_data(chunk)
+        keywords = parsed['search_for'].tolist() if 'search_for' in parsed.columns else ['Overall'] * len(parsed)
+        keys = chunk['_id'].astype(str).tolist() if '_id' in chunk.columns else None
+        return parsed['content'].tolist(), keywords, keys
+    texts = [_record_content(record) for record in chunk]
+    keywords = [record.get('search_for') or 'Overall' for record in chunk]
+    keys = [str(record['_id']) for record in chunk] if all('_id' in record for record in chunk) else None
+    return texts, keywords, keys
+
+
+def analysis_sentiment_stream(chunks, output_csv_path: str = 'sentiment_analysis_result.csv', analyzer=None, workers: int = 1,
+                              store_embeddings: bool = False, positive_threshold: float = _POSITIVE_THRESHOLD) -> pd.DataFrame:
+    """流式版本的 analysis_sentiment: 逐块打分, 逐块把逐条结果追加到 CSV, 聚合量增量累计
+
+    内存占用只与块大小和关键词个数有关, 适合直接消费 MongoDBManager.sync_iter_record_chunks 的结果.
+
+    Args:
+        chunks (Iterable[list[dict] | pd.DataFrame]): 数据块, 记录中的 json_data 会被用来取正文.
+        output_csv_path (str): 逐条分数的输出路径, 为空时不保存.
+        analyzer: 实现了 predict(texts) 的打分器, 为 None 时按 workers 选择.
+        workers (int): 本地打分的进程数, 含义同 analysis_sentiment.
+        store_embeddings (bool): 使用 CLS 向量存储, 含义同 analysis_sentiment.
+        positive_threshold (float): 分数高于该值计为正向.
+
+    Returns:
+        pd.DataFrame: 聚合结果, 列与 analysis_sentiment 相同
+    """
+    try:
+        analyzer = _resolve_analyzer(analyzer, workers)
+        aggregate = _StreamingAggregate(positive_threshold)
+        csv_file = open(output_csv_path, 'w', newline='', encoding='utf-8-sig') if output_csv_path else None
+        total = 0
+        try:
+            writer = csv.writer(csv_file) if csv_file else None
+            if writer:
+                writer.writerow(_RESULT_CSV_HEADER)
+            for chunk in chunks:
+                texts, keywords, keys = _chunk_columns(chunk)
+                if not texts:
+                    continue
+                scores = analyzer.predict(texts, **_predict_kwargs(analyzer, keys, store_embeddings))
+                aggregate.update(keywords, scores)
+                if writer:
+                    writer.writerows(zip(texts, scores))
+                total += len(texts)
+                print(f"DEBUG [analysis_sentiment_stream]: Scored {total} texts so far.", file=sys.stderr)
+        finally:
+            if csv_file:
+                csv_file.close()
+
+        if output_csv_path:
+            print(f"INFO [analysis_sentiment_stream]: Individual sentiment results saved to {output_csv_path}", file=sys.stderr)
+        results = aggregate.result()
+        print(f"DEBUG [analysis_sentiment_stream]: Analysis finished successfully. {total} texts, {len(results)} keywords.", file=sys.stderr)
+        return results
+
+    except Exception as e:
+        print(f"ERROR [analysis_sentiment_stream]: An error occurred during sentiment analysis - {str(e)}", file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+        return pd.DataFrame(columns=_RESULT_COLUMNS)
+
+
 if __name__ == "__main__":
     print("Testing sentiment.py functions...")
     data = {
@@ -0,0 +1,232 @@
+"""常驻情感分析服务
+
+模型只在服务启动时加载一次, 之后通过本地 TCP 连接接收请求. 协议是按行分隔的 JSON:
+
+    请求: {"id": 1, "method": "predict", "params": {"texts": ["...", "..."]}}
+    响应: {"id": 1, "result": [0.93, 0.12]}   或   {"id": 1, "error": "..."}
+
+并发到达的多个请求会被合并成一个微批次(micro-batch)交给 _SentimentAnalyzer.predict,
+凑满 max_batch_texts 条文本或等待超过 max_wait_ms 就立即执行, 结果再按请求拆分返回.
+
+启动方式(在能 import SentimentAnalysis 的目录下):
+    python -m SentimentAnalysis.server --host 127.0.0.1 --port 8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+_DEFAULT_HOST = "127.0.0.1"
+_DEFAULT_PORT = 8765
+_DEFAULT_MAX_BATCH_TEXTS = 256
+_DEFAULT_MAX_WAIT_MS = 20
+# 单行请求上限, 大集合一次性提交时不能被 asyncio 默认的 64KB 截断
+_STREAM_LIMIT = 256 * 1024 * 1024
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """把 "host:port" 或 "port" 解析成 (host, port)"""
+    host, _, port = address.strip().rpartition(":")
+    return (host or _DEFAULT_HOST), int(port)
+
+
+class _MicroBatcher:
+    """把并发请求合并成共享批次的调度器
+
+    所有请求进入同一个队列, 调度协程取出第一个请求后继续收集, 直到凑满 max_batch_texts
+    条文本或到达 max_wait 截止时间. 模型推理放在单线程 executor 中执行, 不阻塞事件循环,
+    也保证同一时刻只有一个批次在使用模型.
+    """
+
+    def __init__(self, analyzer, *, max_batch_texts: int = _DEFAULT_MAX_BATCH_TEXTS, max_wait_ms: float = _DEFAULT_MAX_WAIT_MS):
+        self.analyzer = analyzer
+        self.max_batch_texts = max_batch_texts
+        self.max_wait = max_wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment-infer")
+
+    async def submit(self, texts: list[str]) -> list[float]:
+        """提交一个请求的文本, 等待属于它自己的那部分分数"""
+        if not texts:
+            return []
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        pending = [await self.queue.get()]
+        n_texts = len(pending[0][0])
+        deadline = loop.time() + self.max_wait
+
+        while n_texts < self.max_batch_texts:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            n_texts += len(item[0])
+        return pending
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = await self._collect()
+            merged = [text for texts, _ in pending for text in texts]
+            print(f"DEBUG [_MicroBatcher]: Merged {len(pending)} request(s) into a batch of {len(merged)} texts.", file=sys.stderr)
+
+            try:
+                scores = await loop.run_in_executor(self.executor, self.analyzer.predict, merged)
+            except Exception as e:
+                print(f"ERROR [_MicroBatcher]: Batch prediction failed - {str(e)}", file=sys.stderr)
+                print(traceback.format_exc(), file=sys.stderr)
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for texts, future in pending:
+                if not future.done():
+                    future.set_result(scores[offset:offset + len(texts)])
+                offset += len(texts)
+
+
+class _SentimentServer:
+    def __init__(self, batcher: _MicroBatcher):
+        self.batcher = batcher
+
+    async def _handle_request(self, line: bytes, writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            method = request.get("method")
+            params = request.get("params") or {}
+
+            if method == "predict":
+                texts = ["" if t is None else str(t) for t in params.get("texts", [])]
+                response = {"id": request_id, "result": await self.batcher.submit(texts)}
+            elif method == "ping":
+                response = {"id": request_id, "result": "pong"}
+            else:
+                response = {"id": request_id, "error": f"Unknown method '{method}'"}
+        except Exception as e:
+            response = {"id": request_id, "error": str(e)}
+
+        async with write_lock:
+            writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # 同一连接上也可以流水线式地发送多个请求, 每个请求单独成为一个任务参与合批
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self._handle_request(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+
+async def serve(host: str = _DEFAULT_HOST, port: int = _DEFAULT_PORT, *, max_batch_texts: int = _DEFAULT_MAX_BATCH_TEXTS, max_wait_ms: float = _DEFAULT_MAX_WAIT_MS, analyzer=None):
+    """加载模型并启动服务, 直到进程被终止
+
+    Args:
+        host (str): 监听地址. Defaults to "127.0.0.1".
+        port (int): 监听端口. Defaults to 8765.
+        max_batch_texts (int): 一个微批次最多合并的文本数. Defaults to 256.
+        max_wait_ms (float): 第一个请求到达后最多等待多少毫秒再执行. Defaults to 20.
+        analyzer: 提供 predict(texts) 的模型对象, 为 None 时加载 _SentimentAnalyzer.
+    """
+    if analyzer is None:
+        from .sentiment import _SentimentAnalyzer
+        analyzer = _SentimentAnalyzer()
+
+    batcher = _MicroBatcher(analyzer, max_batch_texts=max_batch_texts, max_wait_ms=max_wait_ms)
+    server = _SentimentServer(batcher)
+    batch_task = asyncio.create_task(batcher.run())
+
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port, limit=_STREAM_LIMIT)
+    print(f"INFO [serve]: Sentiment server listening on {host}:{port} (max_batch_texts={max_batch_texts}, max_wait_ms={max_wait_ms})", file=sys.stderr)
+    try:
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+class RemoteSentimentAnalyzer:
+    """常驻服务的客户端, 接口与 _SentimentAnalyzer.predict 一致, 可以直接传给 analysis_sentiment"""
+
+    def __init__(self, host: str = _DEFAULT_HOST, port: int = _DEFAULT_PORT, *, timeout: float | None = None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._request_id = 0
+
+    @classmethod
+    def from_env(cls, env_var: str = "SENTIMENT_SERVER") -> "RemoteSentimentAnalyzer | None":
+        """根据环境变量(如 SENTIMENT_SERVER=127.0.0.1:8765)构建客户端, 服务不可用时返回 None"""
+        address = os.environ.get(env_var)
+        if not address:
+            return None
+        host, port = parse_address(address)
+        client = cls(host, port)
+        return client if client.ping() else None
+
+    def _call(self, method: str, params: dict, *, timeout: float | None = None):
+        self._request_id += 1
+        request = {"id": self._request_id, "method": method, "params": params}
+        with socket.create_connection((self.host, self.port), timeout=timeout) as sock:
+            sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as f:
+                line = f.readline()
+
+        if not line:
+            raise ConnectionError("Sentiment server closed the connection without a response.")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"Sentiment server failed: {response['error']}")
+        return response["result"]
+
+    def ping(self) -> bool:
+        try:
+            return self._call("ping", {}, timeout=1) == "pong"
+        except (OSError, ValueError, RuntimeError):
+            return False
+
+    def predict(self, texts, batch_size=None):
+        texts = list(texts)
+        if not texts:
+            return []
+        return self._call("predict", {"texts": texts}, timeout=self.timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻情感分析服务")
+    parser.add_argument("--host", default=_DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=_DEFAULT_PORT)
+    parser.add_argument("--max-batch-texts", type=int, default=_DEFAULT_MAX_BATCH_TEXTS)
+    parser.add_argument("--max-wait-ms", type=float, default=_DEFAULT_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, max_batch_texts=args.max_batch_texts, max_wait_ms=args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
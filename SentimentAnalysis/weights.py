@@ -0,0 +1,106 @@
+"""可内存映射的模型权重
+
+BertModel.from_pretrained 和 torch.load 会把约 400MB 权重读进每个进程的私有内存. 这里第一次加载时把
+BERT 和 _Net 的 state_dict 转存到 model/mmap 目录, 之后用 torch.load(mmap=True) 映射文件,
+再在 meta 设备上构建模型并 load_state_dict(assign=True) 直接引用映射出来的张量:
+
+- 冷启动只需要建立映射, 不需要读取和拷贝全部权重, 也不需要随机初始化一遍参数;
+- 权重页面由页缓存提供, 多个进程(包括 fork 出来的 worker)共享同一份物理内存.
+
+没有选 safetensors: 它在 CPU 上加载时会把张量拷贝到进程私有内存, 达不到多进程共享的目的.
+"""
+import os
+import sys
+
+import torch
+from torch import nn
+
+from .cache import is_stale
+
+_MMAP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "mmap")
+
+
+def mmap_checkpoint_path(name: str) -> str:
+    return os.path.join(_MMAP_DIR, f"{name}.pt")
+
+
+def save_mmap_checkpoint(module: nn.Module, path: str) -> str:
+    """保存 state_dict 以及不在 state_dict 里的 buffer(persistent=False, 例如 BERT 的 position_ids)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    state_dict = {name: tensor.detach().cpu().contiguous() for name, tensor in module.state_dict().items()}
+    extra_buffers = {
+        name: tensor.detach().cpu().contiguous()
+        for name, tensor in module.named_buffers()
+        if name not in state_dict
+    }
+    tmp_path = f"{path}.tmp"
+    torch.save({"state_dict": state_dict, "buffers": extra_buffers}, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"DEBUG [save_mmap_checkpoint]: Saved {len(state_dict)} tensors to {path}", file=sys.stderr)
+    return path
+
+
+def load_mmap_checkpoint(module: nn.Module, path: str) -> nn.Module:
+    """把映射出来的张量直接挂到 module 上, module 一般是在 meta 设备上构建的空壳
+
+    Args:
+        module (nn.Module): 结构与保存时一致的模型.
+        path (str): save_mmap_checkpoint 保存的文件.
+
+    Returns:
+        nn.Module: module 本身
+    """
+    checkpoint = torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+    module.load_state_dict(checkpoint["state_dict"], assign=True)
+    for name, tensor in checkpoint["buffers"].items():
+        owner_name, _, buffer_name = name.rpartition(".")
+        owner = module.get_submodule(owner_name) if owner_name else module
+        owner.register_buffer(buffer_name, tensor, persistent=False)
+
+    missing = [name for name, tensor in [*module.named_parameters(), *module.named_buffers()] if tensor.is_meta]
+    if missing:
+        raise RuntimeError(f"Tensors not materialized from {path}: {missing[:5]}")
+    return module
+
+
+def load_mmap_models(*, bert_model_path: str, head_path: str, build_head, load_pretrained):
+    """返回 (bert, head), 权重来自内存映射文件; 映射文件缺失或比源模型旧时先用常规方式加载并转存
+
+    Args:
+        bert_model_path (str): BERT 预训练模型目录.
+        head_path (str): _Net 权重文件.
+        build_head (Callable): 构建未加载权重的 _Net.
+        load_pretrained (Callable): 常规方式加载, 返回 (bert, head), 只在需要转存时调用.
+    """
+    from transformers import BertConfig, BertModel
+
+    bert_path = mmap_checkpoint_path("bert")
+    head_mmap_path = mmap_checkpoint_path("head")
+    bert_sources = [os.path.join(bert_model_path, name) for name in ("config.json", "pytorch_model.bin", "model.safetensors")]
+    if is_stale(bert_path, *bert_sources) or is_stale(head_mmap_path, head_path):
+        bert, head = load_pretrained()
+        save_mmap_checkpoint(bert, bert_path)
+        save_mmap_checkpoint(head, head_mmap_path)
+        del bert, head
+
+    config = BertConfig.from_pretrained(bert_model_path)
+    with torch.device("meta"):
+        bert = BertModel(config)
+        head = build_head()
+    load_mmap_checkpoint(bert, bert_path)
+    load_mmap_checkpoint(head, head_mmap_path)
+    return bert, head
+
+
+def private_memory_mb() -> float | None:
+    """当前进程私有内存(Private_Clean + Private_Dirty), 只在 Linux 上可用"""
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    total_kb = 0
+    for line in lines:
+        if line.startswith(("Private_Clean:", "Private_Dirty:")):
+            total_kb += int(line.split()[1])
+    return total_kb / 1024
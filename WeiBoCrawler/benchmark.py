@@ -0,0 +1,543 @@
+"""爬虫性能基准
+
+    python -m WeiBoCrawler.benchmark fetch 关键词 [--pages 5] [--out benchmark_pages]
+    python -m WeiBoCrawler.benchmark parse benchmark_pages [--repeat 20]
+    python -m WeiBoCrawler.benchmark offload benchmark_pages [--list-requests 200] [--modes inline,thread,process]
+    python -m WeiBoCrawler.benchmark time [--rows 100000]
+
+fetch 用 config.toml 中的 cookies 下载若干页搜索结果并原样保存(最后打印连接复用和各阶段耗时), parse 在保存的页面上对比
+parse_list_html 与逐字段的 parsel 实现: 先检查两者输出完全一致, 再分别计时.
+offload 用 httpx.MockTransport 模拟网络延迟, 在解析列表页的同时不断发出轻量请求(相当于同一事件循环里的
+评论 / 详细页下载), 对比解析放在事件循环 / 线程池 / 进程池中时两类请求的吞吐和事件循环的最大延迟.
+time 对比 process_time_str 与原来逐个 re.search 的实现在常见时间写法上的耗时, 以及整列解析的 process_time_series.
+"""
+import argparse
+import asyncio
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from typing import List, Optional
+
+import parsel
+
+from .parse.parse_list_html import parse_list_html
+from .util import custom_validate_call, process_time_str
+
+
+def load_pages(paths: list[str]) -> list[tuple[str, bytes]]:
+    """读取保存的搜索页, 目录会展开成其中的 *.html"""
+    pages = []
+    for path in map(Path, paths):
+        files = sorted(path.glob("*.html")) if path.is_dir() else [path]
+        pages.extend((str(file), file.read_bytes()) for file in files)
+    return pages
+
+
+def fetch_pages(search_for: str, *, pages: int, out: str) -> list[Path]:
+    """下载 1..pages 页搜索结果并保存为 out/page_{i}.html"""
+    from .request import get_list_response
+    from .request.transport import get_client
+
+    out_dir = Path(out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    saved = []
+    client = get_client()
+    for page_index in range(1, pages + 1):
+        response = get_list_response(search_for, page_index, client=client)
+        response.raise_for_status()
+        path = out_dir / f"page_{page_index}.html"
+        path.write_bytes(response.content)
+        saved.append(path)
+    return saved
+
+
+# 改写前逐字段的 parsel 实现, parse 基准用它检查输出一致并对比耗时
+@custom_validate_call
+def get_mid(select: parsel.Selector) -> Optional[str]:
+    """获取微博的mid
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[str]: 微博的mid
+    """
+    mid = select.xpath("//div[@mid]/@mid").get()
+    return mid
+
+
+@custom_validate_call
+def get_uid(select: parsel.Selector) -> Optional[str]:
+    """获取微博的uid
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[str]: 微博的uid
+    """
+    uid = select.xpath("//a[@nick-name]/@href").get()
+    if uid is None:
+        return None
+    else:
+        uid = re.search(r"/(\d+)/?", uid).group(1)
+        return uid
+
+@custom_validate_call
+def get_mblogid(select: parsel.Selector) -> Optional[str]:
+    """获取微博的mblogid
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[str]: 微博的mblogid
+    """
+    mblogid = select.xpath('//div[@class="from"]/a[1]/@href').get()
+    if mblogid is None:
+        return None
+    else:
+        mblogid = re.search(r"/(\w+)\?", mblogid).group(1)
+        return mblogid
+
+
+@custom_validate_call
+def get_personal_name(select: parsel.Selector) -> Optional[str]:
+    """获取微博的个人名称
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[str]: 微博的个人名称
+    """
+    personal_name = select.xpath("//a[@nick-name]/@nick-name").get()
+    return personal_name
+
+@custom_validate_call
+def get_personal_href(select: parsel.Selector) -> Optional[str]:
+    """获取微博的个人主页
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[str]: 个人主页的 URL
+    """
+    personal_href = select.xpath("//a[@nick-name]/@href").get()
+    if personal_href is None:
+        return None
+    else:
+        return "https:" + personal_href
+
+
+def get_weibo_href(select: parsel.Selector) -> Optional[str]:
+    """获取微博的链接
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[str]: 微博的链接
+    """
+    weibo_href = select.xpath('//div[@class="from"]/a[1]/@href').get()
+    if weibo_href is None:
+        return None
+    else:
+        return "https:" + weibo_href
+
+
+@custom_validate_call
+def get_publish_time(select: parsel.Selector) -> Optional[str]:
+    """获取微博的发布时间
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[datetime]: 微博的发布时间
+    """
+    publish_time_str = select.xpath('//div[@class="from"]/a[1]/text()').get()
+    if publish_time_str is None:
+        return publish_time_str
+    else:
+        publish_time = process_time_str(publish_time_str).strftime("%Y-%m-%d %H:%M:%S")
+        return publish_time
+
+@custom_validate_call
+def get_content_from(select:parsel.Selector) -> Optional[str]:
+    """获取微博的发送设备
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[str]: 微博的发送设备
+    """
+    content_from = select.xpath('//div[@class="from"]/a[2]/text()').get()
+    return content_from
+
+@custom_validate_call
+def get_content_all(select:parsel.Selector) -> Optional[str]:
+    """获取微博的内容
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[str]: 微博的内容
+    """
+    content_all = select.xpath('string(//p[@node-type="feed_list_content_full"])').get()
+    content_all = re.sub(r"\n[ \t]+", "\n", content_all)
+    content_all = re.sub(r"(?<!\n)\n(?!\n)", "", content_all)
+    content_all = re.sub(r"[ \t]*收起d[ \t]*", "", content_all)
+
+    content_show = select.xpath('string(//p[@node-type="feed_list_content"])').get()
+    content_show = re.sub(r"\n[ \t]+", "\n", content_show)
+    content_show = re.sub(r"(?<!\n)\n(?!\n)", "", content_show)
+    
+    content_final = content_all if content_all else content_show
+    content_final = content_final.replace("\u200b", "").strip()
+    content_final = re.sub(r"[ \t]*\n+[ \t]*", "\n\n", content_final)
+
+    return content_final
+
+@custom_validate_call
+def get_retweet_num(select: parsel.Selector) -> Optional[int]:
+    """获取微博的转发数量
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[int]: 微博的转发数量
+    """
+    retweet_num = select.xpath('string(//div[@class="card-act"]/ul[1]/li[1])').get()
+    if retweet_num:
+        retweet_num = re.findall(r"\d+", retweet_num)
+        return int(retweet_num[0]) if retweet_num else 0
+    else:
+        return None
+        
+    
+@custom_validate_call
+def get_comment_num(select:parsel.Selector) -> Optional[int]:
+    """获取微博的评论数量
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[int]: 微博的评论数量
+    """
+    comment_num = select.xpath('string(//div[@class="card-act"]/ul[1]/li[2])').get()
+    if comment_num:
+        comment_num = re.findall(r"\d+", comment_num)
+        return int(comment_num[0]) if comment_num else 0
+    else:
+        return None
+
+@custom_validate_call
+def get_star_num(select: parsel.Selector) -> Optional[int]:
+    """获取微博的点赞数量
+
+    Args:
+        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
+
+    Returns:
+        Optional[int]: 微博的点赞数量
+    """
+    star_num = select.xpath('string(//div[@class="card-act"]/ul[1]/li[3])').get()
+    if star_num:
+        star_num = re.findall(r"\d+", star_num)
+        return int(star_num[0]) if star_num else 0
+    else:
+        return None
+    
+
+def _parse_list_html_legacy(html: str) -> List[dict]:
+    """改写前的 parse_list_html: 每个字段单独用 parsel 查询一次, 只作为对照
+
+    Args:
+        html (str): 爬虫获取到的 html 文本
+
+    Returns:
+        List[dict]: 整理后的 List[dict]
+    """
+    select = parsel.Selector(html)
+    check_div_mpage = select.css("div.m-page").get()
+    if check_div_mpage is None:
+        return []
+    else:
+        div_list = select.xpath('//*[@id="pl_feedlist_index"]//div[@action-type="feed_list_item"]').getall()
+        lst = []
+        for div_string in div_list:
+            select = parsel.Selector(div_string)
+            item = {
+                "mid": get_mid(select),
+                "uid": get_uid(select),
+                "mblogid": get_mblogid(select),
+                "personal_name": get_personal_name(select),
+                "personal_href": get_personal_href(select),
+                "weibo_href": get_weibo_href(select),
+                "publish_time": get_publish_time(select),
+                "content_from": get_content_from(select),
+                "content_all": get_content_all(select),
+                "retweet_num": get_retweet_num(select),
+                "comment_num": get_comment_num(select),
+                "star_num": get_star_num(select),
+            }
+            lst.append(item)
+        return lst
+
+
+def bench_parse(pages: list[tuple[str, bytes]], *, repeat: int = 20) -> dict:
+    """对比两种解析实现的输出和耗时
+
+    Args:
+        pages (list[tuple[str, bytes]]): (文件名, 页面内容).
+        repeat (int): 每种实现把全部页面解析的轮数.
+
+    Returns:
+        dict: 条数, 输出不一致的页面, 以及两种实现每页的平均耗时(毫秒)
+    """
+    texts = [content.decode("utf-8") for _, content in pages]
+    mismatched = [name for (name, content), text in zip(pages, texts)
+                  if parse_list_html(content) != _parse_list_html_legacy(text)]
+    items = sum(len(parse_list_html(content)) for _, content in pages)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            _parse_list_html_legacy(text)
+    parsel_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, content in pages:
+            parse_list_html(content)
+    lxml_seconds = time.perf_counter() - start
+
+    runs = repeat * len(pages)
+    return {
+        "pages": len(pages),
+        "items": items,
+        "mismatched": mismatched,
+        "parsel_ms": parsel_seconds / runs * 1000,
+        "lxml_ms": lxml_seconds / runs * 1000,
+    }
+
+
+async def _bench_offload_mode(pages: list[bytes], *, mode: str, list_requests: int, list_concurrency: int,
+                              probe_concurrency: int, latency: float, workers: int) -> dict:
+    import httpx
+    from .pack.offload import ParseOffloader
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if request.url.path == "/list":
+            return httpx.Response(200, content=pages[int(request.url.params["page"]) % len(pages)])
+        return httpx.Response(200, json={"ok": 1})
+
+    offloader = ParseOffloader("benchmark", mode=mode, workers=workers)
+    # 进程池启动不计入耗时
+    await offloader.run(parse_list_html, pages[0])
+
+    done = asyncio.Event()
+    counts = {"items": 0, "probes": 0}
+    max_lag = 0.0
+
+    async def list_worker(queue: asyncio.Queue, client: httpx.AsyncClient):
+        while not queue.empty():
+            page = queue.get_nowait()
+            response = await client.get("http://bench/list", params={"page": page})
+            counts["items"] += len(await offloader.run(parse_list_html, response.content))
+
+    async def probe_worker(client: httpx.AsyncClient):
+        while not done.is_set():
+            (await client.get("http://bench/probe")).json()
+            counts["probes"] += 1
+
+    async def lag_monitor():
+        nonlocal max_lag
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.01)
+
+    queue = asyncio.Queue()
+    for page in range(list_requests):
+        queue.put_nowait(page)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler), limits=limits) as client:
+        start = time.perf_counter()
+        background = [asyncio.create_task(probe_worker(client)) for _ in range(probe_concurrency)]
+        background.append(asyncio.create_task(lag_monitor()))
+        await asyncio.gather(*(list_worker(queue, client) for _ in range(list_concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*background)
+
+    return {
+        "seconds": elapsed,
+        "items": counts["items"],
+        "list_per_sec": list_requests / elapsed,
+        "probe_per_sec": counts["probes"] / elapsed,
+        "max_lag_ms": max_lag * 1000,
+    }
+
+
+def bench_offload(pages: list[bytes], *, modes: list[str], list_requests: int = 200, list_concurrency: int = 8,
+                  probe_concurrency: int = 16, latency: float = 0.02, workers: int = 0) -> dict:
+    """对比解析放在不同位置时的请求吞吐
+
+    Args:
+        pages (list[bytes]): 保存的搜索页.
+        modes (list[str]): 要对比的解析方式, inline / thread / process.
+        list_requests (int): 列表页请求数.
+        list_concurrency (int): 列表页并发数.
+        probe_concurrency (int): 同时进行的轻量请求数.
+        latency (float): 模拟的每个请求的网络延迟(秒).
+        workers (int): 池子大小, 0 表示 CPU 核数.
+
+    Returns:
+        dict: 每种方式的耗时, 列表页吞吐, 轻量请求吞吐和事件循环最大延迟
+    """
+    return {
+        mode: asyncio.run(_bench_offload_mode(pages, mode=mode, list_requests=list_requests, list_concurrency=list_concurrency,
+                                              probe_concurrency=probe_concurrency, latency=latency, workers=workers))
+        for mode in modes
+    }
+
+
+# 常见的微博时间写法, 时间解析基准按这个比例循环
+TIME_SAMPLES = ["刚刚", "5分钟前", "37分钟前", "2小时前", "今天 10:05", "昨天 23:59",
+                "12月24日 23:23", "3月1日 08:00", "2023年12月24日 23:23", "2022年1月2日 07:30"]
+
+
+def _process_time_str_legacy(time_str: str) -> datetime:
+    """改写前的 process_time_str, 只作为对照"""
+    datetime_now = datetime.now()
+    year = re.search(r"(\d{4})年", time_str).group(1) if "年" in time_str else datetime_now.year
+    month = re.search(r"(\d{1,2})月", time_str).group(1) if "月" in time_str else datetime_now.month
+    day = re.search(r"(\d{1,2})日", time_str).group(1) if "日" in time_str else datetime_now.day
+    if ":" in time_str:
+        hour = re.search(r"(\d{1,2}):", time_str).group(1)
+        minute = re.search(r":(\d{1,2})", time_str).group(1)
+    else:
+        hour, minute = datetime_now.hour, datetime_now.minute
+    datetime_now = datetime(int(year), int(month), int(day), int(hour), int(minute))
+    if "分钟前" in time_str:
+        datetime_now = datetime_now - timedelta(minutes=int(re.search(r"(\d+)分钟前", time_str).group(1)))
+    if "小时前" in time_str:
+        datetime_now = datetime_now - timedelta(hours=int(re.search(r"(\d+)小时前", time_str).group(1)))
+    return datetime_now
+
+
+def bench_time(*, rows: int = 100_000) -> dict:
+    """时间解析的耗时, 单位为每条微秒
+
+    Returns:
+        dict: legacy(原实现), uncached(新实现, 不经过缓存), cached(新实现, 同一基准时间), series(整列)
+    """
+    import pandas as pd
+    from .util.process import _parse_time_str, frozen_now, process_time_series, process_time_str
+
+    texts = [TIME_SAMPLES[i % len(TIME_SAMPLES)] for i in range(rows)]
+    report = {}
+
+    start = time.perf_counter()
+    for text in texts:
+        _process_time_str_legacy(text)
+    report["legacy"] = time.perf_counter() - start
+
+    now = datetime.now().replace(second=0, microsecond=0)
+    parse_uncached = _parse_time_str.__wrapped__
+    start = time.perf_counter()
+    for text in texts:
+        parse_uncached(text, now)
+    report["uncached"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with frozen_now(now):
+        for text in texts:
+            process_time_str(text)
+    report["cached"] = time.perf_counter() - start
+
+    series = pd.Series(texts)
+    start = time.perf_counter()
+    process_time_series(series, now)
+    report["series"] = time.perf_counter() - start
+
+    return {name: seconds / rows * 1e6 for name, seconds in report.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爬虫性能基准")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch = subparsers.add_parser("fetch", help="下载并保存搜索页, 供 parse 使用")
+    fetch.add_argument("search_for")
+    fetch.add_argument("--pages", type=int, default=5)
+    fetch.add_argument("--out", default="benchmark_pages")
+
+    parse = subparsers.add_parser("parse", help="parse_list_html vs 逐字段 parsel 解析")
+    parse.add_argument("paths", nargs="+", help="保存的搜索页或所在目录")
+    parse.add_argument("--repeat", type=int, default=20)
+
+    offload = subparsers.add_parser("offload", help="解析放在事件循环 / 线程池 / 进程池中时的请求吞吐")
+    offload.add_argument("paths", nargs="+", help="保存的搜索页或所在目录")
+    offload.add_argument("--modes", default="inline,thread,process")
+    offload.add_argument("--list-requests", type=int, default=200)
+    offload.add_argument("--list-concurrency", type=int, default=8)
+    offload.add_argument("--probe-concurrency", type=int, default=16)
+    offload.add_argument("--latency", type=float, default=0.02, help="模拟的网络延迟(秒)")
+    offload.add_argument("--workers", type=int, default=0)
+
+    timing = subparsers.add_parser("time", help="process_time_str vs 原实现")
+    timing.add_argument("--rows", type=int, default=100_000)
+
+    args = parser.parse_args()
+
+    if args.command == "fetch":
+        from .request.transport import transport_stats
+        for path in fetch_pages(args.search_for, pages=args.pages, out=args.out):
+            print(path)
+        print(transport_stats.report())
+    elif args.command == "parse":
+        pages = load_pages(args.paths)
+        if not pages:
+            print("no pages found", file=sys.stderr)
+            return 1
+        report = bench_parse(pages, repeat=args.repeat)
+        print(f"pages={report['pages']}  items={report['items']}  repeat={args.repeat}")
+        print(f"identical output: {not report['mismatched']}")
+        for name in report["mismatched"]:
+            print(f"  mismatch: {name}")
+        print(f"per page: parsel={report['parsel_ms']:.2f}ms  lxml={report['lxml_ms']:.2f}ms  "
+              f"speedup={report['parsel_ms'] / report['lxml_ms']:.2f}x")
+        return 1 if report["mismatched"] else 0
+    elif args.command == "offload":
+        pages = [content for _, content in load_pages(args.paths)]
+        if not pages:
+            print("no pages found", file=sys.stderr)
+            return 1
+        report = bench_offload(pages, modes=args.modes.split(","), list_requests=args.list_requests,
+                               list_concurrency=args.list_concurrency, probe_concurrency=args.probe_concurrency,
+                               latency=args.latency, workers=args.workers)
+        print(f"list_requests={args.list_requests}  latency={args.latency * 1000:.0f}ms  probes={args.probe_concurrency}")
+        for mode, stats in report.items():
+            print(f"{mode:>8}: {stats['seconds']:.2f}s  list/sec={stats['list_per_sec']:.1f}  "
+                  f"probe/sec={stats['probe_per_sec']:.1f}  max_loop_lag={stats['max_lag_ms']:.1f}ms")
+    elif args.command == "time":
+        report = bench_time(rows=args.rows)
+        print(f"rows={args.rows}  formats={len(TIME_SAMPLES)}")
+        for name, micros in report.items():
+            print(f"{name:>9}: {micros:.2f}us/row  speedup={report['legacy'] / micros:.1f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
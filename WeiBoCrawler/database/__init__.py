@@ -1,4 +1,5 @@
-from .mongo import MongoDBManager, BodyRecord, Comment1Record, Comment2Record, RecordFrom
+from .mongo import MongoDBManager, BodyRecord, Comment1Record, Comment2Record, RecordFrom, RECORD_INDEXES, build_record_query, winning_index
+from .writer import AsyncBatchWriter, get_batch_writer
 from ..util import database_config
 
 # MongoDB 配置（需要确保 database_config 中包含以下配置）
@@ -11,7 +12,8 @@ db_name = database_config.db_name      # 数据库名称（如：my_database）
 db = MongoDBManager(
     sync_uri=mongo_uri,     # 同步连接字符串
     async_uri=mongo_uri,    # 异步连接字符串（与同步相同）
-    db_name=db_name         # 数据库名称
+    db_name=db_name,        # 数据库名称
+    unique_keys=database_config.upsert  # 只有 upsert 写入时唯一键索引才是唯一索引
 )
 
-__all__ = ["db", "BodyRecord", "Comment1Record", "Comment2Record", "RecordFrom"]
+__all__ = ["db", "BodyRecord", "Comment1Record", "Comment2Record", "RecordFrom", "RECORD_INDEXES", "build_record_query", "winning_index", "AsyncBatchWriter", "get_batch_writer"]
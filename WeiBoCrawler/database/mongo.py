@@ -1,21 +1,221 @@
 # mongo.py
-from typing import Any, Union
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Iterator, Optional, Union
+from functools import cached_property
+from pydantic import BaseModel, ConfigDict
 from .mongo_record import BodyRecord, Comment1Record, Comment2Record, RecordFrom, PyObjectId
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from pymongo import MongoClient
 import logging
 
 
+logger = logging.getLogger(__name__)
+
+
+# 断点续爬状态所在的集合, 每个文档以字符串 _id 标识一个列表页搜索或一条微博的评论分页
+CRAWL_STATE_COLLECTION = "crawl_state"
+
+
+class IndexSpec(BaseModel):
+    """集合上的一个索引
+
+    Attributes:
+        keys (tuple[str, ...]): 按顺序的升序字段
+        unique (bool): 是否唯一索引
+    """
+    keys: tuple[str, ...]
+    unique: bool = False
+
+    @property
+    def name(self) -> str:
+        return ("uniq_" if self.unique else "idx_") + "_".join(self.keys)
+
+
+_COMMENT_INDEXES = [
+    IndexSpec(keys=("f_mid", "mid", "search_for"), unique=True),   # 按父微博查评论, 同时用于 upsert 去重
+    IndexSpec(keys=("mid",)),
+    IndexSpec(keys=("search_for", "create_time")),
+    IndexSpec(keys=("create_time",)),
+]
+
+# 各记录类型的索引声明, 集合第一次被使用时创建
+RECORD_INDEXES: dict[type, list[IndexSpec]] = {
+    BodyRecord: [
+        # 同一条微博在不同关键词下、或分别来自列表页和详细页接口时是不同的记录
+        IndexSpec(keys=("mid", "search_for", "record_from"), unique=True),
+        IndexSpec(keys=("search_for", "create_time")),
+        IndexSpec(keys=("create_time",)),
+    ],
+    Comment1Record: _COMMENT_INDEXES,
+    Comment2Record: _COMMENT_INDEXES,
+}
+
+
+def record_type_of(doc: dict) -> type:
+    """根据文档字段判断记录类型"""
+    if "f_mid" in doc:
+        return Comment1Record if "comment2_ids" in doc else Comment2Record
+    return BodyRecord
+
+
+# 判断记录类型时只需要这些字段
+_TYPE_PROJECTION = {"f_mid": 1, "comment2_ids": 1}
+
+
+def build_record_query(*, mid: int | None = None, f_mid: int | None = None, search_for: str | None = None,
+                       time_start: datetime | None = None, time_end: datetime | None = None) -> dict:
+    """构造能用上 RECORD_INDEXES 的查询条件, 参数为 None 时不作限制
+
+    Args:
+        mid (int | None): 微博或评论的 mid.
+        f_mid (int | None): 评论所属的父 mid.
+        search_for (str | None): 搜索关键词.
+        time_start (datetime | None): create_time 下界(包含).
+        time_end (datetime | None): create_time 上界(不包含).
+
+    Returns:
+        dict: 查询条件
+    """
+    query = {}
+    if f_mid is not None:
+        query["f_mid"] = f_mid
+    if mid is not None:
+        query["mid"] = mid
+    if search_for is not None:
+        query["search_for"] = search_for
+    if time_start is not None or time_end is not None:
+        query["create_time"] = {}
+        if time_start is not None:
+            query["create_time"]["$gte"] = time_start
+        if time_end is not None:
+            query["create_time"]["$lt"] = time_end
+    return query
+
+
+def winning_index(plan: dict) -> str | None:
+    """返回 explain 的 winningPlan 中使用的索引名, 全表扫描时为 None"""
+    if "indexName" in plan:
+        return plan["indexName"]
+    for child in [plan.get("inputStage"), *plan.get("inputStages", [])]:
+        if child:
+            name = winning_index(child)
+            if name is not None:
+                return name
+    return None
+
+
+# upsert 时不覆盖的字段: 首次写入时间和关联的评论 id
+_INSERT_ONLY_FIELDS = ("_id", "create_time", "comment1_ids", "comment2_ids")
+
+
+class UpsertResult(BaseModel):
+    """批量 upsert 的结果
+
+    Attributes:
+        ids (list[Optional[PyObjectId]]): 与输入文档一一对应的 _id, 写入失败的为 None
+        inserted (int): 新插入的文档数
+        updated (int): 命中已有文档并更新的文档数
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    ids: list[Optional[Any]]
+    inserted: int = 0
+    updated: int = 0
+
+
+def _unique_key_fields(doc: dict) -> tuple[str, ...]:
+    """评论以 (f_mid, mid, search_for) 唯一, 微博以 (mid, search_for, record_from) 唯一"""
+    return ("f_mid", "mid", "search_for") if "f_mid" in doc else ("mid", "search_for", "record_from")
+
+
+def _unique_key(doc: dict, fields: tuple[str, ...]) -> tuple:
+    """文档的唯一键, RecordFrom 等枚举取其值, 与从 Mongo 读回的文档一致"""
+    return tuple((field, value.value if isinstance(value, Enum) else value)
+                 for field, value in ((field, doc.get(field)) for field in fields))
+
+
+def _upsert_plan(records: list[dict]):
+    """把文档转换成 UpdateOne 操作, 同一批中键相同的文档只保留最后一个
+
+    Returns:
+        tuple: (操作列表, 每个文档对应的操作下标, 每个操作的唯一键过滤条件)
+    """
+    from pymongo import UpdateOne
+
+    op_index_by_key = {}
+    filters, docs = [], []
+    positions = []
+    for record in records:
+        key = _unique_key(record, _unique_key_fields(record))
+        if key not in op_index_by_key:
+            op_index_by_key[key] = len(filters)
+            filters.append(dict(key))
+            docs.append(record)
+        else:
+            docs[op_index_by_key[key]] = record
+        positions.append(op_index_by_key[key])
+
+    operations = []
+    for key_filter, doc in zip(filters, docs):
+        set_fields = {k: v for k, v in doc.items() if k not in _INSERT_ONLY_FIELDS}
+        insert_fields = {k: doc[k] for k in _INSERT_ONLY_FIELDS if k in doc}
+        update = {"$set": set_fields}
+        if insert_fields:
+            update["$setOnInsert"] = insert_fields
+        operations.append(UpdateOne(key_filter, update, upsert=True))
+    return operations, positions, filters
+
+
+def _upsert_outcome(bulk_api_result: dict, n_operations: int) -> tuple[dict, set, set]:
+    """从 bulk_write 结果中取出 (新插入的 下标->_id, 命中已有文档的下标, 失败的下标)"""
+    upserted = {item["index"]: item["_id"] for item in bulk_api_result.get("upserted", [])}
+    failed = {error["index"] for error in bulk_api_result.get("writeErrors", [])}
+    matched = {i for i in range(n_operations) if i not in upserted and i not in failed}
+    return upserted, matched, failed
+
+
+def _matched_query(filters: list[dict], matched: set) -> dict:
+    return {"$or": [filters[i] for i in sorted(matched)]}
+
+
+def _assemble_upsert_result(positions: list[int], upserted: dict, matched_ids: dict, filters: list[dict], n_matched: int) -> UpsertResult:
+    op_ids = dict(upserted)
+    for i, key_filter in enumerate(filters):
+        key = tuple(key_filter.items())
+        if key in matched_ids:
+            op_ids[i] = matched_ids[key]
+    return UpsertResult(ids=[op_ids.get(i) for i in positions], inserted=len(upserted), updated=n_matched)
+
 
 class MongoDBManager:
-    def __init__(self, sync_uri: str, async_uri: str, db_name: str):
-        # 同步客户端
-        self.sync_client = MongoClient(sync_uri)
-        self.sync_db = self.sync_client[db_name]
-        
-        # 异步客户端
-        self.async_client = AsyncIOMotorClient(async_uri)
-        self.async_db = self.async_client[db_name]
+    def __init__(self, sync_uri: str, async_uri: str, db_name: str, *, unique_keys: bool = True):
+        # 客户端在第一次访问时才创建, import 阶段不建立连接, 也不导入 pymongo / motor
+        self.sync_uri = sync_uri
+        self.async_uri = async_uri
+        self.db_name = db_name
+        # 关闭 upsert 时唯一键索引不能是唯一索引, 否则重复抓取的 insert_many 会失败
+        self.unique_keys = unique_keys
+        # 已经确保过索引的集合
+        self._indexed: set[str] = set()
+
+    # 同步客户端
+    @cached_property
+    def sync_client(self):
+        from pymongo import MongoClient
+        return MongoClient(self.sync_uri)
+
+    @cached_property
+    def sync_db(self):
+        return self.sync_client[self.db_name]
+
+    # 异步客户端
+    @cached_property
+    def async_client(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(self.async_uri)
+
+    @cached_property
+    def async_db(self):
+        return self.async_client[self.db_name]
 
     # 同步操作
     def get_sync_collection(self, collection_name: str):
@@ -28,14 +228,199 @@ class MongoDBManager:
         return [name for name in names if not name.startswith("system.")]
 
     def sync_add_records(self, collection_name: str, records: list[dict]) -> list[PyObjectId]:
+        if records:
+            self.sync_ensure_indexes(collection_name, records[0])
         collection = self.get_sync_collection(collection_name)
         result = collection.insert_many(records)
         return result.inserted_ids
 
+    def _index_specs(self, collection_name: str, sample: dict | None) -> list[IndexSpec]:
+        """集合需要创建的索引, 已经处理过或还不知道记录类型时为空"""
+        if collection_name in self._indexed or collection_name == CRAWL_STATE_COLLECTION or sample is None:
+            return []
+        self._indexed.add(collection_name)
+        specs = RECORD_INDEXES[record_type_of(sample)]
+        if not self.unique_keys:
+            specs = [spec.model_copy(update={"unique": False}) for spec in specs]
+        return specs
+
+    def sync_ensure_indexes(self, collection_name: str, sample: dict | None = None) -> None:
+        """按记录类型创建 RECORD_INDEXES 中声明的索引, 每个集合只处理一次
+
+        Args:
+            collection_name (str): 集合名称.
+            sample (dict | None): 集合中的一条文档, 用于判断记录类型; 为 None 时从集合中取一条.
+        """
+        if collection_name in self._indexed:
+            return
+        from pymongo.errors import OperationFailure
+
+        collection = self.get_sync_collection(collection_name)
+        if sample is None:
+            sample = collection.find_one({}, _TYPE_PROJECTION)
+        specs = self._index_specs(collection_name, sample)
+        for spec in specs:
+            try:
+                collection.create_index([(key, 1) for key in spec.keys], name=spec.name, unique=spec.unique)
+            except OperationFailure as e:
+                # 集合中已有重复数据时无法建唯一索引, upsert 仍然会避免产生新的重复
+                logger.warning(f"集合 {collection_name} 创建索引 {spec.name} 失败: {e}")
+
+    def sync_upsert_records(self, collection_name: str, records: list[dict]) -> UpsertResult:
+        """按唯一键(见 _unique_key_fields) 批量 upsert, 已存在的文档更新, 不存在的插入
+
+        Args:
+            collection_name (str): 集合名称.
+            records (list[dict]): 文档.
+
+        Returns:
+            UpsertResult: 与 records 对应的 _id, 以及插入和更新的数量
+        """
+        from pymongo.errors import BulkWriteError
+
+        if not records:
+            return UpsertResult(ids=[])
+        self.sync_ensure_indexes(collection_name, records[0])
+        collection = self.get_sync_collection(collection_name)
+        operations, positions, filters = _upsert_plan(records)
+        try:
+            bulk_api_result = collection.bulk_write(operations, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            bulk_api_result = e.details
+            logger.error(f"批量 upsert {collection_name} 部分失败: {len(bulk_api_result.get('writeErrors', []))}/{len(operations)}")
+        upserted, matched, _ = _upsert_outcome(bulk_api_result, len(operations))
+        matched_ids = {}
+        if matched:
+            fields = _unique_key_fields(records[0])
+            for doc in collection.find(_matched_query(filters, matched), {field: 1 for field in fields}):
+                matched_ids[_unique_key(doc, fields)] = doc["_id"]
+        return _assemble_upsert_result(positions, upserted, matched_ids, filters, len(matched))
+
     def sync_get_records_by_ids(self, collection_name: str, ids: list[PyObjectId]) -> list[dict]:
         collection = self.get_sync_collection(collection_name)
         return list(collection.find({"_id": {"$in": ids}}))
 
+    def sync_iter_records_by_ids(self, collection_name: str, ids: list[PyObjectId], *, projection: dict | None = None,
+                                 chunk_size: int = 1000) -> Iterator[list[dict]]:
+        """按 _id 分块查询记录, 每块一个 $in 查询, 惰性地逐块返回
+
+        Args:
+            collection_name (str): 集合名称.
+            ids (list[PyObjectId]): 记录的 _id, 一般是 get_*_data 的返回值.
+            projection (dict | None): 只返回需要的字段, 例如 {"json_data": 1, "_id": 0}.
+            chunk_size (int): 每个 $in 查询的 id 数, 同时作为游标的 batch_size.
+
+        Yields:
+            list[dict]: 一块记录
+        """
+        collection = self.get_sync_collection(collection_name)
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            records = list(collection.find({"_id": {"$in": chunk}}, projection, batch_size=chunk_size))
+            if records:
+                yield records
+
+    def sync_iter_json_data(self, collection_name: str, ids: list[PyObjectId], *, chunk_size: int = 1000) -> Iterator[dict]:
+        """逐条返回记录的 json_data, 只查询 json_data 字段, 可以直接传给 process_*_documents"""
+        for records in self.sync_iter_records_by_ids(collection_name, ids, projection={"json_data": 1, "_id": 0}, chunk_size=chunk_size):
+            for record in records:
+                yield record["json_data"]
+
+    def sync_iter_record_chunks(self, collection_name: str, *, chunk_size: int = 1000, query: dict | None = None, projection: dict | None = None, limit: int = 0):
+        """按块遍历集合中的记录, 任意时刻内存里只有一块
+
+        Args:
+            collection_name (str): 集合名称.
+            chunk_size (int): 每块的记录数, 同时作为游标的 batch_size.
+            query (dict | None): 查询条件.
+            projection (dict | None): 只返回需要的字段.
+            limit (int): 最多返回的记录数, 0 表示不限制.
+
+        Yields:
+            list[dict]: 一块记录
+        """
+        cursor = self.get_sync_collection(collection_name).find(query or {}, projection, batch_size=chunk_size)
+        if limit > 0:
+            cursor = cursor.limit(limit)
+        chunk = []
+        for record in cursor:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+    def sync_find_records(self, collection_name: str, query: dict, *, projection: dict | None = None,
+                          sort: list[tuple[str, int]] | None = None, limit: int = 0) -> list[dict]:
+        """确保索引后查询, 下面的 sync_find_by_* 都通过这里
+
+        Args:
+            collection_name (str): 集合名称.
+            query (dict): 查询条件, 一般由 build_record_query 构造.
+            projection (dict | None): 只返回需要的字段.
+            sort (list[tuple[str, int]] | None): 排序.
+            limit (int): 最多返回的记录数, 0 表示不限制.
+
+        Returns:
+            list[dict]: 记录
+        """
+        self.sync_ensure_indexes(collection_name)
+        cursor = self.get_sync_collection(collection_name).find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit > 0:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def sync_find_by_mid(self, collection_name: str, mid: int, *, projection: dict | None = None) -> dict | None:
+        """按 mid 查一条微博或评论"""
+        records = self.sync_find_records(collection_name, build_record_query(mid=mid), projection=projection, limit=1)
+        return records[0] if records else None
+
+    def sync_find_by_parent(self, collection_name: str, f_mid: int, *, projection: dict | None = None, limit: int = 0) -> list[dict]:
+        """查某条微博(或一级评论)下的评论, 按 mid 排序"""
+        return self.sync_find_records(collection_name, build_record_query(f_mid=f_mid), projection=projection,
+                                      sort=[("mid", 1)], limit=limit)
+
+    def sync_find_by_time_range(self, collection_name: str, time_start: datetime | None = None, time_end: datetime | None = None, *,
+                                search_for: str | None = None, projection: dict | None = None, limit: int = 0) -> list[dict]:
+        """查 create_time 在 [time_start, time_end) 内的记录, 可以同时限定搜索关键词, 按 create_time 排序"""
+        query = build_record_query(search_for=search_for, time_start=time_start, time_end=time_end)
+        return self.sync_find_records(collection_name, query, projection=projection, sort=[("create_time", 1)], limit=limit)
+
+    def sync_find_by_keyword(self, collection_name: str, search_for: str, *, projection: dict | None = None, limit: int = 0) -> list[dict]:
+        """查某个搜索关键词抓到的记录"""
+        return self.sync_find_records(collection_name, build_record_query(search_for=search_for), projection=projection, limit=limit)
+
+    def sync_explain(self, collection_name: str, query: dict, *, sort: list[tuple[str, int]] | None = None) -> dict:
+        """返回查询的 winningPlan, 配合 winning_index 检查查询是否用上了索引"""
+        self.sync_ensure_indexes(collection_name)
+        cursor = self.get_sync_collection(collection_name).find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor.explain()["queryPlanner"]["winningPlan"]
+
+    def sync_get_crawl_state(self, state_id: str) -> dict | None:
+        return self.get_sync_collection(CRAWL_STATE_COLLECTION).find_one({"_id": state_id})
+
+    def sync_set_crawl_state(self, state_id: str, state: dict) -> None:
+        self.get_sync_collection(CRAWL_STATE_COLLECTION).update_one(
+            {"_id": state_id}, {"$set": {**state, "updated_at": datetime.now()}}, upsert=True
+        )
+
+    def sync_add_to_crawl_state(self, state_id: str, field: str, value: Any) -> None:
+        """把 value 加入断点状态中的集合字段(例如已完成的列表页码)"""
+        self.get_sync_collection(CRAWL_STATE_COLLECTION).update_one(
+            {"_id": state_id}, {"$addToSet": {field: value}, "$set": {"updated_at": datetime.now()}}, upsert=True
+        )
+
+    def sync_delete_crawl_states(self, state_ids: list[str]) -> int:
+        """删除断点状态, 下载正常结束后调用"""
+        if not state_ids:
+            return 0
+        return self.get_sync_collection(CRAWL_STATE_COLLECTION).delete_many({"_id": {"$in": state_ids}}).deleted_count
 
     def sync_update_record(self, model: str, record_id: PyObjectId, update_data: dict) -> int:
         collection = getattr(self, f"{model}_collection")
@@ -59,15 +444,84 @@ class MongoDBManager:
         return [name for name in names if not name.startswith("system.")]
     
 
-    async def async_add_records(self, collection_name: str, records: list[dict]) -> list[PyObjectId]:
+    async def async_add_records(self, collection_name: str, records: list[dict], *, ordered: bool = True) -> list[PyObjectId]:
+        if records:
+            await self.async_ensure_indexes(collection_name, records[0])
         collection = self.get_async_collection(collection_name)
-        result = await collection.insert_many(records)
+        result = await collection.insert_many(records, ordered=ordered)
         return result.inserted_ids
 
+    async def async_ensure_indexes(self, collection_name: str, sample: dict | None = None) -> None:
+        """按记录类型创建索引(异步), 见 sync_ensure_indexes"""
+        if collection_name in self._indexed:
+            return
+        from pymongo.errors import OperationFailure
+
+        collection = self.get_async_collection(collection_name)
+        if sample is None:
+            sample = await collection.find_one({}, _TYPE_PROJECTION)
+        specs = self._index_specs(collection_name, sample)
+        for spec in specs:
+            try:
+                await collection.create_index([(key, 1) for key in spec.keys], name=spec.name, unique=spec.unique)
+            except OperationFailure as e:
+                logger.warning(f"集合 {collection_name} 创建索引 {spec.name} 失败: {e}")
+
+    async def async_upsert_records(self, collection_name: str, records: list[dict]) -> UpsertResult:
+        """按唯一键批量 upsert(异步), 见 sync_upsert_records"""
+        from pymongo.errors import BulkWriteError
+
+        if not records:
+            return UpsertResult(ids=[])
+        await self.async_ensure_indexes(collection_name, records[0])
+        collection = self.get_async_collection(collection_name)
+        operations, positions, filters = _upsert_plan(records)
+        try:
+            bulk_api_result = (await collection.bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            bulk_api_result = e.details
+            logger.error(f"批量 upsert {collection_name} 部分失败: {len(bulk_api_result.get('writeErrors', []))}/{len(operations)}")
+        upserted, matched, _ = _upsert_outcome(bulk_api_result, len(operations))
+        matched_ids = {}
+        if matched:
+            fields = _unique_key_fields(records[0])
+            async for doc in collection.find(_matched_query(filters, matched), {field: 1 for field in fields}):
+                matched_ids[_unique_key(doc, fields)] = doc["_id"]
+        return _assemble_upsert_result(positions, upserted, matched_ids, filters, len(matched))
+
     async def async_get_records_by_ids(self, collection_name: str, ids: list[PyObjectId]) -> list[dict]:
         collection = self.get_async_collection(collection_name)
         return await collection.find({"_id": {"$in": ids}}).to_list(None)
 
+    async def async_iter_records_by_ids(self, collection_name: str, ids: list[PyObjectId], *, projection: dict | None = None,
+                                        chunk_size: int = 1000) -> AsyncIterator[list[dict]]:
+        """按 _id 分块查询记录(异步), 见 sync_iter_records_by_ids"""
+        collection = self.get_async_collection(collection_name)
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            records = await collection.find({"_id": {"$in": chunk}}, projection, batch_size=chunk_size).to_list(None)
+            if records:
+                yield records
+
+    async def async_get_crawl_state(self, state_id: str) -> dict | None:
+        return await self.get_async_collection(CRAWL_STATE_COLLECTION).find_one({"_id": state_id})
+
+    async def async_set_crawl_state(self, state_id: str, state: dict) -> None:
+        await self.get_async_collection(CRAWL_STATE_COLLECTION).update_one(
+            {"_id": state_id}, {"$set": {**state, "updated_at": datetime.now()}}, upsert=True
+        )
+
+    async def async_add_to_crawl_state(self, state_id: str, field: str, value: Any) -> None:
+        await self.get_async_collection(CRAWL_STATE_COLLECTION).update_one(
+            {"_id": state_id}, {"$addToSet": {field: value}, "$set": {"updated_at": datetime.now()}}, upsert=True
+        )
+
+    async def async_delete_crawl_states(self, state_ids: list[str]) -> int:
+        if not state_ids:
+            return 0
+        result = await self.get_async_collection(CRAWL_STATE_COLLECTION).delete_many({"_id": {"$in": state_ids}})
+        return result.deleted_count
+
     async def async_update_record(self, model: str, record_id: PyObjectId, update_data: dict) -> int:
         collection = getattr(self, f"async_{model}_collection")
         result = await collection.update_one({"_id": record_id}, {"$set": update_data})
@@ -97,4 +551,5 @@ class MongoDBManager:
         collection = getattr(self, f"async_{comment_type}_collection")
         return await collection.find({"_id": {"$in": comment_ids}}).to_list(None)
 
-__all__ = [BodyRecord, Comment1Record, Comment2Record, RecordFrom, MongoDBManager]
+__all__ = [BodyRecord, Comment1Record, Comment2Record, RecordFrom, MongoDBManager, UpsertResult, IndexSpec, RECORD_INDEXES,
+           build_record_query, record_type_of, winning_index]
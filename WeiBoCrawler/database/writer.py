@@ -0,0 +1,210 @@
+# writer.py
+import asyncio
+import logging
+import time
+import weakref
+from typing import Callable, Optional
+
+from ..util import database_config
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    """一个集合中等待写入的文档, 以及每段文档写入后要回调的函数"""
+
+    def __init__(self):
+        self.docs: list[dict] = []
+        self.segments: list[tuple[int, Optional[Callable[[list], None]], asyncio.Future]] = []
+
+    def add(self, docs: list[dict], on_inserted: Optional[Callable[[list], None]], written: asyncio.Future) -> None:
+        self.docs.extend(docs)
+        self.segments.append((len(docs), on_inserted, written))
+
+
+class AsyncBatchWriter:
+    """异步写后(write-behind)批量写入, 同一事件循环中的所有下载器共用一个
+
+    add 只把文档放进缓冲区就返回; 某个集合攒够 max_batch 条或距上次写入超过 max_delay 秒时, 用一次
+    insert_many(ordered=False) 写入(upsert=True 时改为按唯一键批量 upsert). 缓冲区和正在写入的文档总数超过 max_pending 时 add 等待, Mongo 变慢时
+    下载端随之减速, 内存不会无限增长. 写入完成后把 inserted_ids 按段回调给各自的调用方.
+
+    Attributes:
+        max_batch (int): 单次 insert_many 的最大文档数
+        max_delay (float): 文档在缓冲区中最多停留的秒数
+        max_pending (int): 缓冲区加正在写入的文档数上限
+        upsert (bool): 是否按唯一键批量 upsert
+        flushes (int): 已完成的写入次数
+        documents (int): 已写入的文档数
+        failed (int): 写入失败的文档数
+        inserted (int): upsert 时新插入的文档数
+        updated (int): upsert 时更新已有文档的文档数
+        total_latency (float): 写入累计耗时(秒)
+        max_latency (float): 单次写入最大耗时(秒)
+    """
+
+    def __init__(self, db, *, max_batch: int = 500, max_delay: float = 0.5, max_pending: int = 5000, upsert: bool = False):
+        self.db = db
+        self.upsert = upsert
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._buffers: dict[str, _Pending] = {}
+        self._pending = 0
+        self._space = asyncio.Condition()
+        self._flushing: set[asyncio.Task] = set()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._timer: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.documents = 0
+        self.failed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    async def add(self, collection_name: str, docs: list[dict], *, on_inserted: Optional[Callable[[list], None]] = None) -> asyncio.Future:
+        """把文档放入缓冲区
+
+        Args:
+            collection_name (str): 集合名称.
+            docs (list[dict]): 需要写入的文档.
+            on_inserted (Optional[Callable[[list], None]]): 写入后以这批文档的 inserted_ids 调用.
+
+        Returns:
+            asyncio.Future: 这批文档写入后完成, 结果为是否全部写入成功
+        """
+        written = asyncio.get_running_loop().create_future()
+        if not docs:
+            written.set_result(True)
+            return written
+        if self._pending >= self.max_pending:
+            # 缓冲区已满, 不再等定时器, 立即写入
+            for name in list(self._buffers):
+                self._start_flush(name)
+        async with self._space:
+            await self._space.wait_for(lambda: self._pending < self.max_pending)
+            self._pending += len(docs)
+
+        self._buffers.setdefault(collection_name, _Pending()).add(docs, on_inserted, written)
+        if len(self._buffers[collection_name].docs) >= self.max_batch:
+            self._start_flush(collection_name)
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_periodically())
+        return written
+
+    def _start_flush(self, collection_name: str) -> None:
+        pending = self._buffers.pop(collection_name, None)
+        if pending is None or not pending.docs:
+            return
+        task = asyncio.create_task(self._write(collection_name, pending))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _write(self, collection_name: str, pending: _Pending) -> None:
+        # 同一集合按顺序写入
+        async with self._locks.setdefault(collection_name, asyncio.Lock()):
+            start = time.perf_counter()
+            if self.upsert:
+                ids = await self._upsert(collection_name, pending.docs)
+            else:
+                ids = await self._insert(collection_name, pending.docs)
+            latency = time.perf_counter() - start
+
+        self.flushes += 1
+        self.documents += sum(_id is not None for _id in ids)
+        self.failed += sum(_id is None for _id in ids)
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+        offset = 0
+        for size, on_inserted, written in pending.segments:
+            segment = ids[offset:offset + size]
+            if on_inserted is not None:
+                on_inserted([_id for _id in segment if _id is not None])
+            written.set_result(all(_id is not None for _id in segment))
+            offset += size
+
+        async with self._space:
+            self._pending -= len(pending.docs)
+            self._space.notify_all()
+
+    async def _insert(self, collection_name: str, docs: list[dict]) -> list:
+        """写入并返回每个文档的 _id, 失败的为 None"""
+        from bson import ObjectId
+        from pymongo.errors import BulkWriteError
+
+        # 先在本地生成 _id, 部分失败时也能知道哪些文档写入了
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+        try:
+            await self.db.async_add_records(collection_name=collection_name, records=docs, ordered=False)
+            return [doc["_id"] for doc in docs]
+        except BulkWriteError as e:
+            # ordered=False 时出错的文档不影响其他文档
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            logger.error(f"批量写入 {collection_name} 部分失败: {len(failed)}/{len(docs)}")
+            return [None if i in failed else doc["_id"] for i, doc in enumerate(docs)]
+        except Exception as e:
+            logger.error(f"批量写入 {collection_name} 失败: {str(e)}")
+            return [None] * len(docs)
+
+    async def _upsert(self, collection_name: str, docs: list[dict]) -> list:
+        """按唯一键 upsert 并返回每个文档的 _id(更新时为已有文档的 _id), 失败的为 None"""
+        from bson import ObjectId
+
+        # 只在插入新文档时使用本地生成的 _id
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+        try:
+            result = await self.db.async_upsert_records(collection_name=collection_name, records=docs)
+        except Exception as e:
+            logger.error(f"批量 upsert {collection_name} 失败: {str(e)}")
+            return [None] * len(docs)
+        self.inserted += result.inserted
+        self.updated += result.updated
+        return result.ids
+
+    async def _flush_periodically(self) -> None:
+        while self._buffers:
+            await asyncio.sleep(self.max_delay)
+            for collection_name in list(self._buffers):
+                self._start_flush(collection_name)
+
+    async def flush(self) -> None:
+        """写入缓冲区中的全部文档并等待所有写入完成"""
+        for collection_name in list(self._buffers):
+            self._start_flush(collection_name)
+        while self._flushing:
+            await asyncio.gather(*list(self._flushing))
+
+    async def close(self) -> None:
+        """下载结束时调用: 写完剩余文档, 停止定时写入, 并记录写入耗时"""
+        await self.flush()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.flushes:
+            logger.info(self.report())
+
+    def report(self) -> str:
+        average = self.total_latency / self.flushes * 1000 if self.flushes else 0.0
+        upserted = f"(新增 {self.inserted} 条, 更新 {self.updated} 条)" if self.upsert else ""
+        return (f"批量写入 {self.flushes} 次, 写入 {self.documents} 条{upserted}, 失败 {self.failed} 条, "
+                f"平均耗时 {average:.1f}ms, 最大耗时 {self.max_latency * 1000:.1f}ms")
+
+
+_writers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncBatchWriter]" = weakref.WeakKeyDictionary()
+
+
+def get_batch_writer(db) -> AsyncBatchWriter:
+    """获取当前事件循环的批量写入器; download() 每次用 asyncio.run 新建事件循环, 所以按循环区分"""
+    loop = asyncio.get_running_loop()
+    if loop not in _writers:
+        _writers[loop] = AsyncBatchWriter(db, upsert=database_config.upsert)
+    return _writers[loop]
+
+
+__all__ = ["AsyncBatchWriter", "get_batch_writer"]
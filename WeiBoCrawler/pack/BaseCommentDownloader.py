@@ -0,0 +1,327 @@
+import asyncio
+from abc import abstractmethod
+from itertools import count
+from typing import Any, List, Optional, Union
+
+import httpx
+from ..database import get_batch_writer
+from ..parse import process_comment_resp, parse_comment_content
+from ..util import CustomProgress, logging, retry_timeout_decorator, retry_timeout_decorator_asyncio
+from ..request.transport import get_client, shared_async_client
+from .BaseDownloader import BaseDownloader, CommentID
+
+
+logger = logging.getLogger(__name__)
+
+# 优先队列中的任务类型, 探测(请求第一页)排在翻页之前, 这样尽早知道每条微博的评论总数
+_PROBE = 0
+_PAGINATE = 1
+
+
+class BaseCommentDownloader(BaseDownloader):
+    """评论下载器基类, 一级评论和二级评论共用
+
+    一条微博的评论只能按 max_id 顺序翻页, 评论最多的微博决定了整体耗时. 所以先请求每条微博的第一页拿到 total_number,
+    再按剩余评论数从多到少分配给 worker; worker 空闲时立即领取下一个任务(探测或翻页), 不会等待其他 worker.
+
+    每条微博的翻页进度保存在 crawl_state 中, resume=True 时从中断的运行留下的断点继续;
+    正常结束后断点被删除, 之后再次下载同一条微博会重新请求, 取到新增的评论.
+    """
+
+    def __init__(self, *, uid: Union[List[str], str], mid: Union[List[str], str], table_name: str, concurrency: int = 100, max_failed_times: int = 20, resume: bool = False) -> None:
+        """根据 uid 和 mid 下载评论数据，并保存在数据库的 mid 表中, 数据库位置在 database_config 中
+
+        Args:
+            uid (Union[List[str], str]): 用户 ID
+            mid (Union[List[str], str]): 信息 ID
+            table_name (str): 存储的位置(数据表名)
+            concurrency (int, optional): 异步 worker 数, 在途请求数另受接口限流器约束. Defaults to 100.
+            max_failed_times (int, optional): 最大失败次数. Defaults to 20.
+            resume (bool, optional): 是否从上次中断的 max_id 继续, 跳过中断前已经取完的微博. Defaults to False.
+
+        Raises:
+            ValueError: uid and mid must be both str or list and the length of uid and mid must be equal.
+        """
+        super().__init__(table_name=table_name, concurrency=concurrency, resume=resume)
+
+        if isinstance(uid, str) and isinstance(mid, str):
+            self.ids = [CommentID(uid=uid, mid=mid)]
+        elif isinstance(uid, list) and isinstance(mid, list) and len(uid) == len(mid):
+            self.ids = [CommentID(uid=u, mid=m) for u, m in zip(uid, mid)]
+        else:
+            raise ValueError("uid and mid must be both str or list and the length of uid and mid must be equal")
+
+        self.max_failed_times = max_failed_times
+
+    @abstractmethod
+    def _get_comments_response(self, param: CommentID, *, client: httpx.Client, max_id: Optional[str] = None) -> httpx.Response:
+        """请求一页评论"""
+        ...
+
+    @abstractmethod
+    async def _get_comments_response_asyncio(self, param: CommentID, *, client: httpx.AsyncClient, max_id: Optional[str] = None) -> httpx.Response:
+        """请求一页评论(异步)"""
+        ...
+
+    def _get_request_description(self) -> str:
+        """获取进度条描述
+
+        Returns:
+            str: 进度条描述
+        """
+        return "download..."
+
+    def _get_request_params(self) -> list:
+        """获取请求参数列表
+
+        Returns:
+            list: 请求参数列表
+        """
+        return self.ids
+
+    def _process_response(self, response: httpx.Response, *, param: Any) -> None:
+        """处理请求并存储数据
+
+        Args:
+            response (httpx.Response): 需要处理的请求
+            param (Any): 请求参数
+        """
+        resp_info, items = process_comment_resp(response)
+
+        for item in items:
+            item["f_mid"] = param.mid
+            item["f_uid"] = param.uid
+
+        records = self._process_items(items)
+        self._save_to_database(records)
+        return resp_info
+
+    async def _process_response_asyncio(self, response: httpx.Response, *, param: Any) -> None:
+        """处理请求并存储数据
+
+        Args:
+            response (httpx.Response): 需要处理的请求
+            param (Any): 请求参数
+        """
+        resp_info, _ = await self._process_page_asyncio(response, param=param)
+        return resp_info
+
+    async def _process_page_asyncio(self, response: httpx.Response, *, param: Any) -> tuple:
+        """处理一页评论, 返回 (resp_info, 这页记录写入完成的 Future)"""
+        resp_info, items = await self._parse_asyncio(parse_comment_content, response.content)
+
+        for item in items:
+            item["f_mid"] = param.mid
+            item["f_uid"] = param.uid
+
+        records = self._process_items(items)
+        written = await self._save_to_database_asyncio(records)
+        return resp_info, written
+
+    @staticmethod
+    def _thread_key(param: CommentID) -> str:
+        return f"{param.uid}:{param.mid}"
+
+    @staticmethod
+    def _remaining(state: dict) -> int:
+        return max(0, state["total_number"] - state["count_data_number"])
+
+    @retry_timeout_decorator_asyncio
+    async def _probe_thread_asyncio(self, param: CommentID, *, client: httpx.AsyncClient) -> Optional[dict]:
+        """读取断点, 没有断点时请求并保存第一页
+
+        Returns:
+            Optional[dict]: 翻页状态(max_id, total_number, count_data_number), 被中断的运行中已经取完或第一页失败时返回 None
+        """
+        key = self._thread_key(param)
+        state = await self._load_checkpoint_asyncio(key)
+        if state is not None and state.get("done"):
+            return None
+        if state is not None and state.get("max_id") is not None:
+            return {"max_id": state["max_id"], "total_number": state["total_number"], "count_data_number": state["count_data_number"]}
+
+        async with self._request_slot():
+            response = await self._get_comments_response_asyncio(param, client=client)
+        if not self._check_response(response):
+            return None
+        resp_info, written = await self._process_page_asyncio(response, param=param)
+        state = {"max_id": resp_info.max_id, "total_number": resp_info.total_number, "count_data_number": resp_info.data_number}
+        self._save_checkpoint_after(written, key, **state, done=self._remaining(state) == 0)
+        # 第一页就没有数据时记一次失败, 与原来的翻页逻辑一致
+        state["failed_times"] = 0 if resp_info.data_number != 0 else 1
+        return state
+
+    @retry_timeout_decorator_asyncio
+    async def _paginate_thread_asyncio(self, param: CommentID, state: dict, *, client: httpx.AsyncClient, progress: CustomProgress) -> None:
+        """从 state 开始顺序翻页直到取完或连续失败 max_failed_times 次
+
+        state 随翻页原地更新, 超时重试时从最新位置继续.
+        """
+        key = self._thread_key(param)
+        state.setdefault("failed_times", 0)
+        task = progress.add_task(completed=state["count_data_number"], total=state["total_number"], description=f"{param.mid}: failed_times - {state['failed_times']}")
+        try:
+            while (state["failed_times"] < self.max_failed_times) and (state["count_data_number"] < state["total_number"]):
+                async with self._request_slot():
+                    response = await self._get_comments_response_asyncio(param, client=client, max_id=state["max_id"])
+                if self._check_response(response):
+                    resp_info, written = await self._process_page_asyncio(response, param=param)
+                    state["max_id"] = resp_info.max_id
+                    state["count_data_number"] += resp_info.data_number
+                    state["failed_times"] = 0 if resp_info.data_number != 0 else state["failed_times"] + 1
+                    # 记录写入之后再更新断点, 中断时最多重复保存几页, 不会漏页
+                    self._save_checkpoint_after(written, key, max_id=state["max_id"], total_number=state["total_number"],
+                                                count_data_number=state["count_data_number"], done=self._remaining(state) == 0)
+
+                    progress.update(task, completed=state["count_data_number"], total=state["total_number"], description=f"{param.mid}: failed_times - {state['failed_times']}")
+                else:
+                    state["failed_times"] += 1
+        finally:
+            progress.remove_task(task)
+
+    async def _download_single_asyncio(self, *, param: Any, client: httpx.AsyncClient, progress: CustomProgress, overall_task: int):
+        """下载单个请求(异步), 探测后立即翻页, 流水线等逐条提交的场景使用
+
+        Args:
+            param (Any): 请求参数
+            client (httpx.AsyncClient): 请求客户端
+            progress (CustomProgress): 进度条
+            overall_task (int): 进度条任务ID
+        """
+        state = await self._probe_thread_asyncio(param, client=client)
+        if state is not None and self._remaining(state) > 0:
+            await self._paginate_thread_asyncio(param, state, client=client, progress=progress)
+        progress.update(overall_task, advance=1, description=f"{param.mid}")
+
+    async def _comment_worker(self, *, client: httpx.AsyncClient, progress: CustomProgress, overall_task: int, order: count):
+        while True:
+            kind, _, _, param, state = await self._queue.get()
+            try:
+                if kind == _PROBE:
+                    state = await self._probe_thread_asyncio(param, client=client)
+                    if state is not None and self._remaining(state) > 0:
+                        # 剩余评论数越多越先翻页
+                        self._queue.put_nowait((_PAGINATE, -self._remaining(state), next(order), param, state))
+                        continue
+                else:
+                    await self._paginate_thread_asyncio(param, state, client=client, progress=progress)
+                progress.update(overall_task, advance=1, description=f"{param.mid}")
+            except Exception as e:
+                logger.error(f"下载 {param} 失败: {e!r}")
+                progress.update(overall_task, advance=1, description=f"{param.mid}")
+            finally:
+                self._queue.task_done()
+
+    async def _download_asyncio(self):
+        """异步下载数据: 先探测全部微博, 再按剩余评论数从多到少翻页
+
+        """
+        params = self._get_request_params()
+        order = count()
+        self._queue = asyncio.PriorityQueue()
+        for param in params:
+            self._queue.put_nowait((_PROBE, 0, next(order), param, None))
+
+        with CustomProgress() as progress:
+            overall_task = progress.add_task(
+                description=self._get_request_description(), total=len(params)
+            )
+            async with shared_async_client() as client:
+                workers = [
+                    asyncio.create_task(self._comment_worker(client=client, progress=progress, overall_task=overall_task, order=order))
+                    for _ in range(min(self.concurrency, len(params)))
+                ]
+                # 探测任务会产生翻页任务, 所以等队列清空而不是等 worker 退出
+                await self._queue.join()
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        await get_batch_writer(self.db).close()
+        await self._drain_checkpoints()
+        await self._clear_checkpoints_asyncio()
+        logger.info(f"{self.endpoint} 接口下载完成, 当前并发上限 {self.limiter.limit:.1f}")
+        self._log_network_report()
+
+    @retry_timeout_decorator
+    def _probe_thread(self, param: CommentID, *, client: httpx.Client) -> Optional[dict]:
+        """读取断点, 没有断点时请求并保存第一页(同步)"""
+        key = self._thread_key(param)
+        state = self._load_checkpoint(key)
+        if state is not None and state.get("done"):
+            return None
+        if state is not None and state.get("max_id") is not None:
+            return {"max_id": state["max_id"], "total_number": state["total_number"], "count_data_number": state["count_data_number"]}
+
+        response = self._get_comments_response(param, client=client)
+        if not self._check_response(response):
+            return None
+        resp_info = self._process_response(response, param=param)
+        state = {"max_id": resp_info.max_id, "total_number": resp_info.total_number, "count_data_number": resp_info.data_number}
+        self._save_checkpoint(key, **state, done=self._remaining(state) == 0)
+        state["failed_times"] = 0 if resp_info.data_number != 0 else 1
+        return state
+
+    @retry_timeout_decorator
+    def _paginate_thread(self, param: CommentID, state: dict, *, client: httpx.Client, progress: CustomProgress) -> None:
+        """从 state 开始顺序翻页(同步)"""
+        key = self._thread_key(param)
+        state.setdefault("failed_times", 0)
+        task = progress.add_task(completed=state["count_data_number"], total=state["total_number"], description=f"{param.mid}: failed_times - {state['failed_times']}")
+        try:
+            while (state["failed_times"] < self.max_failed_times) and (state["count_data_number"] < state["total_number"]):
+                response = self._get_comments_response(param, client=client, max_id=state["max_id"])
+                if self._check_response(response):
+                    resp_info = self._process_response(response, param=param)
+                    state["max_id"] = resp_info.max_id
+                    state["count_data_number"] += resp_info.data_number
+                    state["failed_times"] = 0 if resp_info.data_number != 0 else state["failed_times"] + 1
+                    self._save_checkpoint(key, max_id=state["max_id"], total_number=state["total_number"],
+                                          count_data_number=state["count_data_number"], done=self._remaining(state) == 0)
+
+                    progress.update(task, completed=state["count_data_number"], total=state["total_number"], description=f"{param.mid}: failed_times - {state['failed_times']}")
+                else:
+                    state["failed_times"] += 1
+        finally:
+            progress.remove_task(task)
+
+    def _download_single_sync(self, *, param: Any, client: httpx.Client, progress: CustomProgress, overall_task: int):
+        """下载单个请求(同步)
+
+        Args:
+            param (Any): 请求参数
+            client (httpx.Client): 请求客户端
+            progress (CustomProgress): 进度条
+            overall_task (int): 进度条任务ID
+        """
+        state = self._probe_thread(param, client=client)
+        if state is not None and self._remaining(state) > 0:
+            self._paginate_thread(param, state, client=client, progress=progress)
+        progress.update(overall_task, advance=1, description=f"{param.mid}")
+
+    def _download_sync(self):
+        """同步下载数据: 先探测全部微博, 再按剩余评论数从多到少翻页
+
+        """
+        params = self._get_request_params()
+        with CustomProgress() as progress:
+            overall_task = progress.add_task(
+                description=self._get_request_description(), total=len(params)
+            )
+            client = get_client()
+            pending = []
+            for param in params:
+                state = self._probe_thread(param, client=client)
+                if state is not None and self._remaining(state) > 0:
+                    pending.append((param, state))
+                else:
+                    progress.update(overall_task, advance=1, description=f"{param.mid}")
+
+            pending.sort(key=lambda item: self._remaining(item[1]), reverse=True)
+            for param, state in pending:
+                self._paginate_thread(param, state, client=client, progress=progress)
+                progress.update(overall_task, advance=1, description=f"{param.mid}")
+        self._clear_checkpoints()
+        self._log_network_report()
+
+
+__all__ = ["BaseCommentDownloader"]
@@ -1,11 +1,17 @@
 import asyncio
 from abc import ABC, abstractmethod
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Iterable
 
 import httpx
 from pydantic import BaseModel
-from ..database import db, BodyRecord, Comment1Record, Comment2Record, RecordFrom
-from ..util import CustomProgress, cookies_config, log_function_params, logging
+from ..database import db, get_batch_writer, BodyRecord, Comment1Record, Comment2Record, RecordFrom
+from ..util import CustomProgress, database_config, frozen_now, log_function_params, logging
+from ..request.rate_limit import report_response
+from ..request.transport import get_client, shared_async_client, transport_stats
+from ..request.cache import get_response_cache
+from .scheduler import get_limiter
+from .offload import get_parse_offloader
 
 
 logger = logging.getLogger(__name__)
@@ -16,12 +22,54 @@ class CommentID(BaseModel):
 
 
 class BaseDownloader(ABC):
-    def __init__(self, *, table_name: str, concurrency: int = 100):
+    """下载器基类
+
+    异步下载时由 concurrency 个 worker 从队列中取请求参数, 真正发出的请求数再受接口限流器约束:
+    同一接口(endpoint)的所有下载器共享一个 AIMDLimiter, 上限随错误率自适应调整.
+
+    Attributes:
+        endpoint (str): 请求的接口, list / body / buildComments, 决定使用哪个限流器
+        checkpoint_name (str): 断点状态 _id 的前缀, 区分不同下载器
+        resume (bool): 是否从 crawl_state 中的断点继续, 为 False 时忽略并覆盖已有断点.
+            下载正常结束后删除本次用到的断点, 只有中断的运行会留下断点
+        in_flight (int): 本下载器当前在途请求数
+        queue_depth (int): 队列中尚未被 worker 取走的请求参数个数
+    """
+    endpoint: str
+    checkpoint_name: str
+
+    def __init__(self, *, table_name: str, concurrency: int = 100, resume: bool = False):
         self.table_name = table_name
-        self.semaphore = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.resume = resume
+        self.limiter = get_limiter(self.endpoint)
+        self.in_flight = 0
+        self._queue = None
+        self._checkpoint_tasks: dict[str, asyncio.Task] = {}
+        self._checkpoint_failed: set[str] = set()
+        # 本次运行读到或写过的断点, 正常结束后删除
+        self._checkpoint_keys: set[str] = set()
         self.db = db
         self.res_ids = []
 
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @asynccontextmanager
+    async def _request_slot(self):
+        """占用接口限流器的一个名额发出请求"""
+        async with self.limiter.slot():
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    async def _parse_asyncio(self, func: Callable, *args, **kwargs) -> Any:
+        """按 [parse_offload] 配置在事件循环中或线程池 / 进程池中调用解析函数, 参数和返回值都要能 pickle"""
+        return await get_parse_offloader(self.endpoint).run(func, *args, **kwargs)
+
     @abstractmethod
     def _get_request_description(self) -> str:
         """获取进度条描述
@@ -88,14 +136,23 @@ class BaseDownloader(ABC):
     def _save_to_database(self, items: list[BodyRecord | Comment1Record | Comment2Record]) -> None:
         """同步保存"""
         docs = [item.model_dump(by_alias=True, exclude={'id'}) for item in items]
+        if database_config.upsert:
+            result = self.db.sync_upsert_records(collection_name=self.table_name, records=docs)
+            logger.info(f"{self.table_name} 新增 {result.inserted} 条, 更新 {result.updated} 条")
+            self.res_ids.extend(_id for _id in result.ids if _id is not None)
+            return
         res_ids = self.db.sync_add_records(
             collection_name=self.table_name,  # 直接传递集合名称
             records=docs
         )
         self.res_ids.extend(res_ids)
 
-    async def _save_to_database_asyncio(self, items: list[BodyRecord | Comment1Record | Comment2Record]) -> None:
-        """异步保存"""
+    async def _save_to_database_asyncio(self, items: list[BodyRecord | Comment1Record | Comment2Record]) -> asyncio.Future | None:
+        """异步保存, 实际写入由 AsyncBatchWriter 批量完成, download 结束前全部写完
+
+        Returns:
+            asyncio.Future | None: 这批记录写入后完成, 结果为是否全部写入成功; 没有可保存的记录时为 None
+        """
         if not items:
             logger.warning("保存时发现空items列表")
             return
@@ -111,55 +168,215 @@ class BaseDownloader(ABC):
             logger.warning("转换后的文档列表为空")
             return
         
+        # 交给批量写入器, 不在翻页循环里等待 Mongo; 写入后 inserted_ids 回调到 res_ids
+        return await get_batch_writer(self.db).add(self.table_name, docs, on_inserted=self.res_ids.extend)
+
+    # 断点续爬, 状态保存在 crawl_state 集合中; 读写失败只记录日志, 不影响下载.
+    # 断点只用于继续被中断的运行: 下载正常结束后删除, 下一次运行重新请求全部内容
+    def _checkpoint_id(self, key: str) -> str:
+        return f"{self.checkpoint_name}:{self.table_name}:{key}"
+
+    def _load_checkpoint(self, key: str) -> dict | None:
+        if not self.resume:
+            return None
+        self._checkpoint_keys.add(key)
         try:
-            res_ids = await self.db.async_add_records(
-                collection_name=self.table_name,
-                records=docs
-            )
-            self.res_ids.extend(res_ids)
+            return self.db.sync_get_crawl_state(self._checkpoint_id(key))
+        except Exception as e:
+            logger.error(f"读取断点失败: {str(e)}")
+            return None
+
+    async def _load_checkpoint_asyncio(self, key: str) -> dict | None:
+        if not self.resume:
+            return None
+        self._checkpoint_keys.add(key)
+        try:
+            return await self.db.async_get_crawl_state(self._checkpoint_id(key))
+        except Exception as e:
+            logger.error(f"读取断点失败: {str(e)}")
+            return None
+
+    def _clear_checkpoints(self, keys: Iterable[str] | None = None) -> None:
+        """删除断点, keys 为 None 时删除本次运行读到或写过的全部断点"""
+        keys = set(self._checkpoint_keys if keys is None else keys)
+        try:
+            self.db.sync_delete_crawl_states([self._checkpoint_id(key) for key in keys])
+        except Exception as e:
+            logger.error(f"删除断点失败: {str(e)}")
+        self._checkpoint_keys -= keys
+
+    async def _clear_checkpoints_asyncio(self) -> None:
+        """删除本次运行读到或写过的全部断点, 在 _drain_checkpoints 之后调用"""
+        keys = set(self._checkpoint_keys)
+        try:
+            await self.db.async_delete_crawl_states([self._checkpoint_id(key) for key in keys])
+        except Exception as e:
+            logger.error(f"删除断点失败: {str(e)}")
+        self._checkpoint_keys -= keys
+
+    def _save_checkpoint(self, key: str, **state) -> None:
+        self._checkpoint_keys.add(key)
+        try:
+            self.db.sync_set_crawl_state(self._checkpoint_id(key), state)
+        except Exception as e:
+            logger.error(f"保存断点失败: {str(e)}")
+
+    async def _save_checkpoint_asyncio(self, key: str, **state) -> None:
+        self._checkpoint_keys.add(key)
+        try:
+            await self.db.async_set_crawl_state(self._checkpoint_id(key), state)
+        except Exception as e:
+            logger.error(f"保存断点失败: {str(e)}")
+
+    def _save_checkpoint_after(self, written: asyncio.Future | None, key: str, **state) -> None:
+        """记录写入之后再保存断点, 不阻塞翻页"""
+        self._chain_checkpoint(written, key, lambda: self._save_checkpoint_asyncio(key, **state))
+
+    def _add_to_checkpoint_after(self, written: asyncio.Future | None, key: str, field: str, value: Any) -> None:
+        """记录写入之后再把 value 加入断点中的集合字段, 不阻塞下载"""
+        self._chain_checkpoint(written, key, lambda: self._add_to_checkpoint_asyncio(key, field, value))
+
+    def _chain_checkpoint(self, written: asyncio.Future | None, key: str, save: Callable[[], Awaitable[None]]) -> None:
+        """同一 key 的断点按顺序保存; 某一批记录写入失败后, 该 key 之后的断点都不再保存, 重新运行时从失败前的位置继续"""
+        previous = self._checkpoint_tasks.get(key)
+
+        async def run() -> bool:
+            if previous is not None:
+                await previous
+            if key in self._checkpoint_failed:
+                return False
+            if written is not None and not await written:
+                self._checkpoint_failed.add(key)
+                return False
+            await save()
+            return True
+
+        task = asyncio.create_task(run())
+        self._checkpoint_tasks[key] = task
+        task.add_done_callback(lambda _: self._checkpoint_tasks.get(key) is task and self._checkpoint_tasks.pop(key))
+
+    async def _drain_checkpoints(self) -> None:
+        """等待所有延后保存的断点写完, 在批量写入器 close 之后调用"""
+        while self._checkpoint_tasks:
+            await asyncio.gather(*list(self._checkpoint_tasks.values()))
+
+    def _add_to_checkpoint(self, key: str, field: str, value: Any) -> None:
+        self._checkpoint_keys.add(key)
+        try:
+            self.db.sync_add_to_crawl_state(self._checkpoint_id(key), field, value)
         except Exception as e:
-            logger.error(f"数据库插入失败: {str(e)}")
+            logger.error(f"保存断点失败: {str(e)}")
+
+    async def _add_to_checkpoint_asyncio(self, key: str, field: str, value: Any) -> None:
+        self._checkpoint_keys.add(key)
+        try:
+            await self.db.async_add_to_crawl_state(self._checkpoint_id(key), field, value)
+        except Exception as e:
+            logger.error(f"保存断点失败: {str(e)}")
+
+    def _get_request_url(self, param: Any) -> httpx.URL | None:
+        """请求参数对应的地址, 作为响应缓存的键; 为 None 时不使用缓存
+
+        Args:
+            param (Any): 请求参数
+
+        Returns:
+            httpx.URL | None: 请求地址
+        """
+        return None
+
+    def _get_cached_response(self, param: Any) -> httpx.Response | None:
+        """发出请求前先查响应缓存, [response_cache] 未启用或未命中时为 None"""
+        cache = get_response_cache()
+        if cache is None or self.endpoint not in cache.ttl:
+            return None
+        url = self._get_request_url(param)
+        return None if url is None else cache.get(self.endpoint, url)
+
+    def _cache_response(self, response: httpx.Response) -> None:
+        """把检查通过的响应保存到响应缓存"""
+        cache = get_response_cache()
+        if cache is not None:
+            cache.put(self.endpoint, response)
 
     @log_function_params(logger=logger)
     def _check_response(self, response: httpx.Response) -> bool:
-        """响应检查逻辑"""
+        """响应检查逻辑, 结果同时反馈给接口限流器和 host 令牌桶; 来自响应缓存的响应保存前已经检查过"""
+        if response.extensions.get("from_cache"):
+            return True
         if response.status_code != 200:
             logger.warning(f"响应状态码异常: {response.status_code}")
+            self._record_outcome(response, False)
             return False
         
         try:
             data = response.json()
             if data.get("ok") != 1:  # 假设接口返回 ok=1 表示成功
                 logger.warning(f"接口返回错误: {data.get('msg')}")
+                self._record_outcome(response, False)
                 return False
         except:
             pass
         
+        self._record_outcome(response, True)
         return True
 
+    def _record_outcome(self, response: httpx.Response, success: bool) -> None:
+        self.limiter.record(success)
+        report_response(response, success)
+
+
+    async def _worker(self, *, client: httpx.AsyncClient, progress: CustomProgress, overall_task: int):
+        """不断从队列中取请求参数下载, 直到队列为空"""
+        while True:
+            try:
+                param = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await self._download_single_asyncio(
+                    param=param,
+                    client=client,
+                    progress=progress,
+                    overall_task=overall_task,
+                )
+            except Exception as e:
+                logger.error(f"下载 {param} 失败: {e!r}")
+            finally:
+                self._queue.task_done()
 
     async def _download_asyncio(self):
-        """异步下载数据
+        """异步下载数据, 固定数量的 worker 从队列中取请求参数
 
         """
+        params = self._get_request_params()
+        self._queue = asyncio.Queue()
+        for param in params:
+            self._queue.put_nowait(param)
+
         with CustomProgress() as progress:
             overall_task = progress.add_task(
-                description=self._get_request_description(), total=len(self._get_request_params())
+                description=self._get_request_description(), total=len(params)
             )
-            async with httpx.AsyncClient(cookies=cookies_config.cookies) as client:
-                tasks = []
-                for param in self._get_request_params():
-                    async with self.semaphore:
-                        task = asyncio.create_task(
-                            self._download_single_asyncio(
-                                param=param,
-                                client=client,
-                                progress=progress,
-                                overall_task=overall_task,
-                            )
-                        )
-                        tasks.append(task)
-                await asyncio.gather(*tasks)
+            async with shared_async_client() as client:
+                workers = [
+                    asyncio.create_task(self._worker(client=client, progress=progress, overall_task=overall_task))
+                    for _ in range(min(self.concurrency, len(params)))
+                ]
+                await asyncio.gather(*workers)
+        await get_batch_writer(self.db).close()
+        await self._drain_checkpoints()
+        await self._clear_checkpoints_asyncio()
+        logger.info(f"{self.endpoint} 接口下载完成, 当前并发上限 {self.limiter.limit:.1f}")
+        self._log_network_report()
+
+    def _log_network_report(self) -> None:
+        """记录各 host 的连接复用情况、请求各阶段耗时以及响应缓存的命中情况"""
+        for line in transport_stats.report().splitlines():
+            logger.info(line)
+        cache = get_response_cache()
+        if cache is not None and self.endpoint in cache.ttl:
+            logger.info(cache.report())
 
     def _download_sync(self):
         """同步下载数据
@@ -169,9 +386,11 @@ class BaseDownloader(ABC):
             overall_task = progress.add_task(
                 description=self._get_request_description(), total=len(self._get_request_params())
             )
-            with httpx.Client(cookies=cookies_config.cookies) as client:
-                for params in self._get_request_params():
-                    self._download_single_sync(params, client, progress, overall_task)
+            client = get_client()
+            for param in self._get_request_params():
+                self._download_single_sync(param=param, client=client, progress=progress, overall_task=overall_task)
+        self._clear_checkpoints()
+        self._log_network_report()
 
     def download(self, asynchrony: bool = True) -> None:
         """整合异步下载和同步下载
@@ -182,14 +401,16 @@ class BaseDownloader(ABC):
         Args:
             asynchrony (bool, optional): 异步下载或者普通下载. Defaults to True.
         """
-        if asynchrony:
-            try:
-                loop = asyncio.get_running_loop()
-                loop.run_until_complete(self._download_asyncio())
-            except RuntimeError:
-                asyncio.run(self._download_asyncio())
-        else:
-            self._download_sync()
+        # 整次下载的相对时间(N分钟前, 昨天)以同一时刻为基准, asyncio.run 创建的任务会复制当前 context
+        with frozen_now():
+            if asynchrony:
+                try:
+                    loop = asyncio.get_running_loop()
+                    loop.run_until_complete(self._download_asyncio())
+                except RuntimeError:
+                    asyncio.run(self._download_asyncio())
+            else:
+                self._download_sync()
 
 
 __all__ = [BaseDownloader, BodyRecord, Comment1Record, Comment2Record, RecordFrom]
\ No newline at end of file
@@ -2,6 +2,7 @@ from .get_list_data import get_list_data
 from .get_body_data import get_body_data
 from .get_comment1_data import get_comment1_data
 from .get_comment2_data import get_comment2_data
+from .pipeline import CrawlPipeline, crawl_pipeline
 
 
 __all__ = [
@@ -9,4 +10,6 @@ __all__ = [
     "get_body_data",
     "get_comment1_data",
     "get_comment2_data",
+    "CrawlPipeline",
+    "crawl_pipeline",
 ]
\ No newline at end of file
@@ -1,19 +1,22 @@
 import httpx
 from typing import Any
 from ..util import CustomProgress, retry_timeout_decorator, retry_timeout_decorator_asyncio
-from ..parse import process_body_resp
+from ..parse import process_body_resp, parse_body_content
 from .BaseDownloader import BaseDownloader, BodyRecord, RecordFrom
 from ..request import get_body_response, get_body_response_asyncio
+from ..request.get_body_request import build_body_params
 
 
 class Downloader(BaseDownloader):
+    endpoint = "body"
+
     def __init__(self, id: list[str] | str, *, table_name: str, concurrency: int = 100):
         """下载 Body 页面数据, 并保存在数据库的 id 表中, 数据库位置在 database_config 中.
 
         Args:
             id (Union[List[str], str]): 微博详细页 id, 或者 id 列表.
             table_name (str): 存储的位置(数据表名)
-            concurrency (int, optional): 异步最大并发. Defaults to 100.
+            concurrency (int, optional): 异步 worker 数, 在途请求数另受接口限流器约束. Defaults to 100.
         """
         super().__init__(table_name=table_name, concurrency=concurrency)
 
@@ -38,6 +41,11 @@ class Downloader(BaseDownloader):
         """
         return self.ids
 
+    def _get_request_url(self, param: Any) -> httpx.URL:
+        """详细页 param 的接口地址, 作为响应缓存的键"""
+        url, params, _ = build_body_params(param)
+        return httpx.URL(url, params=params)
+
     def _process_items(self, items: list[dict]) -> list[BodyRecord]:
         """_summary_
 
@@ -79,7 +87,7 @@ class Downloader(BaseDownloader):
             response (httpx.Response): 需要处理的请求
             param (Any): 请求参数
         """
-        items = process_body_resp(response)
+        items = await self._parse_asyncio(parse_body_content, response.content)
         records = self._process_items(items)
         await self._save_to_database_asyncio(records)
 
@@ -93,11 +101,15 @@ class Downloader(BaseDownloader):
             progress (CustomProgress): 进度条
             overall_task (int): 进度条任务ID
         """
-        response = await get_body_response_asyncio(
-                            id=param,
-                            client=client)
+        response = self._get_cached_response(param)
+        if response is None:
+            async with self._request_slot():
+                response = await get_body_response_asyncio(
+                                    id=param,
+                                    client=client)
                         
         if self._check_response(response):
+            self._cache_response(response)
             await self._process_response_asyncio(response, param=param)
         
         progress.update(overall_task, advance=1, description=f"{param}")
@@ -112,10 +124,13 @@ class Downloader(BaseDownloader):
             progress (CustomProgress): 进度条
             overall_task (int): 进度条任务ID
         """
-        response = get_body_response(
-                            id=param,
-                            client=client)
+        response = self._get_cached_response(param)
+        if response is None:
+            response = get_body_response(
+                                id=param,
+                                client=client)
         if self._check_response(response):
+            self._cache_response(response)
             self._process_response(response, param=param)
         
         progress.update(overall_task, advance=1, description=f"{param}") 
@@ -1,15 +1,20 @@
+import asyncio
 import httpx
 from datetime import datetime
 from typing import Literal, Optional, Any
-from ..util import CustomProgress, retry_timeout_decorator, retry_timeout_decorator_asyncio
+from ..util import CustomProgress, reference_now, retry_timeout_decorator, retry_timeout_decorator_asyncio
 from ..request import get_list_response_asyncio, get_list_response
+from ..request.get_list_request import build_list_params
 from ..parse import parse_list_html
 from .BaseDownloader import BaseDownloader, BodyRecord, RecordFrom
 
 
 class Downloader(BaseDownloader):
+    endpoint = "list"
+    checkpoint_name = "list"
+
     def __init__(self, search_for: str, *, table_name: str, kind : Literal["综合", "实时", "高级"] = "综合", 
-                      advanced_kind: Literal["综合", "热度", "原创"] = "综合", time_start: Optional[datetime] = None, time_end:Optional[datetime]=None, concurrency: int = 100):
+                      advanced_kind: Literal["综合", "热度", "原创"] = "综合", time_start: Optional[datetime] = None, time_end:Optional[datetime]=None, concurrency: int = 100, resume: bool = False):
         """下载 List 页面数据, 并保存在数据库的 search_for 表中, 数据库位置在 database_config 中.
 
         Args:
@@ -19,15 +24,18 @@ class Downloader(BaseDownloader):
             advanced_kind (Literal[, optional): 筛选条件，可以是综合，热度，原创. Defaults to "综合".
             time_start (Optional[datetime], optional): 起始时间，最大颗粒度为小时. Defaults to Optional[datetime].
             time_end (Optional[datetime], optional): 结束时间，最大颗粒度为小时. Defaults to Optional[datetime].
-            concurrency (int, optional): 异步最大并发. Defaults to 100.
+            concurrency (int, optional): 异步 worker 数, 在途请求数另受接口限流器约束. Defaults to 100.
+            resume (bool, optional): 是否跳过被中断的上一次运行已经完成的页; 运行正常结束后断点会被删除. Defaults to False.
         """
-        super().__init__(table_name=table_name, concurrency=concurrency)
+        super().__init__(table_name=table_name, concurrency=concurrency, resume=resume)
 
         self.search_for = search_for
         self.kind = kind
         self.advanced_kind = advanced_kind
         self.time_start = time_start
         self.time_end = time_end
+        self._checkpoint_key = f"{search_for}|{kind}|{advanced_kind}|{time_start}|{time_end}"
+        self._pages: Optional[list[int]] = None
 
 
     def _get_request_description(self) -> str:
@@ -44,7 +52,23 @@ class Downloader(BaseDownloader):
         Returns:
             list: 请求参数列表
         """
-        return list(range(1, 51))
+        # 断点只读一次, 同步下载和流水线会多次调用这里
+        if self._pages is None:
+            if self.resume:
+                state = self._load_checkpoint(self._checkpoint_key)
+                completed_pages = set(state.get("completed_pages", [])) if state else set()
+            else:
+                # 不继续时删除旧断点, 否则本次完成的页会并入中断的那次运行留下的 completed_pages
+                self._clear_checkpoints([self._checkpoint_key])
+                completed_pages = set()
+            self._pages = [page for page in range(1, 51) if page not in completed_pages]
+        return self._pages
+
+    def _get_request_url(self, param: Any) -> httpx.URL:
+        """第 param 页的地址, 作为响应缓存的键"""
+        url, _ = build_list_params(self.search_for, param, kind=self.kind, advanced_kind=self.advanced_kind,
+                                   time_start=self.time_start, time_end=self.time_end)
+        return url
 
     # 适应mongodb的修改部分
     def _process_items(self, items: list[dict]) -> list[BodyRecord]:
@@ -72,20 +96,26 @@ class Downloader(BaseDownloader):
             response (httpx.Response): 需要处理的请求
             table_name (str): 存储的位置(数据表名)
         """
-        items = parse_list_html(response.text)
+        items = parse_list_html(response.content, encoding=response.encoding or "utf-8", now=reference_now())
         records = self._process_items(items)
         self._save_to_database(records)
 
-    async def _process_response_asyncio(self, response: httpx.Response, *, param: Any) -> None:
+    async def _process_response_asyncio(self, response: httpx.Response, *, param: Any) -> asyncio.Future | None:
         """处理请求并存储数据
 
         Args:
             response (httpx.Response): 需要处理的请求
             param (Any): 请求参数
+
+        Returns:
+            asyncio.Future | None: 记录写入完成的 Future
         """
-        items = parse_list_html(response.text)
+        # 解析可能在线程池 / 进程池中进行, 那里拿不到 frozen_now 的 ContextVar, 所以显式传入
+        items = await self._parse_asyncio(
+            parse_list_html, response.content, encoding=response.encoding or "utf-8", now=reference_now()
+        )
         records = self._process_items(items)
-        await self._save_to_database_asyncio(records)
+        return await self._save_to_database_asyncio(records)
 
     @retry_timeout_decorator_asyncio
     async def _download_single_asyncio(self, *, param:Any, client:httpx.Response, progress:CustomProgress, overall_task:int):
@@ -97,17 +127,22 @@ class Downloader(BaseDownloader):
             progress (CustomProgress): 进度条
             overall_task (int): 进度条任务ID
         """
-        response = await get_list_response_asyncio(
-                            search_for=self.search_for,
-                            kind=self.kind,
-                            advanced_kind=self.advanced_kind, 
-                            time_start=self.time_start, 
-                            time_end=self.time_end, 
-                            page_index=param,
-                            client=client)
+        response = self._get_cached_response(param)
+        if response is None:
+            async with self._request_slot():
+                response = await get_list_response_asyncio(
+                                    search_for=self.search_for,
+                                    kind=self.kind,
+                                    advanced_kind=self.advanced_kind, 
+                                    time_start=self.time_start, 
+                                    time_end=self.time_end, 
+                                    page_index=param,
+                                    client=client)
                         
         if self._check_response(response):
-            await self._process_response_asyncio(response, param=param)
+            self._cache_response(response)
+            written = await self._process_response_asyncio(response, param=param)
+            self._add_to_checkpoint_after(written, self._checkpoint_key, "completed_pages", param)
         
         progress.update(overall_task, advance=1, description=f"{param}...")
 
@@ -121,23 +156,27 @@ class Downloader(BaseDownloader):
             progress (CustomProgress): 进度条
             overall_task (int): 进度条任务ID
         """
-        response = get_list_response(
-                            search_for=self.search_for,
-                            kind=self.kind,
-                            advanced_kind=self.advanced_kind,
-                            time_start=self.time_start,
-                            time_end=self.time_end,
-                            page_index=param,
-                            client=client)
+        response = self._get_cached_response(param)
+        if response is None:
+            response = get_list_response(
+                                search_for=self.search_for,
+                                kind=self.kind,
+                                advanced_kind=self.advanced_kind,
+                                time_start=self.time_start,
+                                time_end=self.time_end,
+                                page_index=param,
+                                client=client)
         
         if self._check_response(response):
+            self._cache_response(response)
             self._process_response(response, param=param)
+            self._add_to_checkpoint(self._checkpoint_key, "completed_pages", param)
         
         progress.update(overall_task, advance=1, description=f"{param}") 
 
 
 def get_list_data(search_for: str, *,  table_name: str, asynchrony: bool = True, kind : Literal["综合", "实时", "高级"] = "综合", 
-                      advanced_kind: Literal["综合", "热度", "原创"] = "综合", time_start: Optional[datetime] = None, time_end:Optional[datetime]=None) -> list:
+                      advanced_kind: Literal["综合", "热度", "原创"] = "综合", time_start: Optional[datetime] = None, time_end:Optional[datetime]=None, resume: bool = False) -> list:
     """获取 List 页面数据
 
     Args:
@@ -148,10 +187,11 @@ def get_list_data(search_for: str, *,  table_name: str, asynchrony: bool = True,
         advanced_kind (Literal[, optional): 筛选条件，可以是综合，热度，原创. Defaults to "综合".
         time_start (Optional[datetime], optional): 起始时间，最大颗粒度为小时. Defaults to None.
         time_end (Optional[datetime], optional): 结束时间，最大颗粒度为小时. Defaults to None.
+        resume (bool, optional): 是否跳过被中断的上一次运行已经完成的页. Defaults to False.
     
     Returns:
         list: 存储在数据库中的 id 列表
     """
-    downloader = Downloader(search_for=search_for, table_name=table_name, kind=kind, advanced_kind=advanced_kind, time_start=time_start, time_end=time_end)
+    downloader = Downloader(search_for=search_for, table_name=table_name, kind=kind, advanced_kind=advanced_kind, time_start=time_start, time_end=time_end, resume=resume)
     downloader.download(asynchrony=asynchrony)
     return downloader.res_ids
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Literal
+
+from ..util import logging, parse_offload_config
+
+
+logger = logging.getLogger(__name__)
+
+_executors: dict[tuple[str, int], Executor] = {}
+
+
+def _get_executor(mode: Literal["thread", "process"], workers: int) -> Executor:
+    """同一进程内相同 (mode, workers) 的池子只创建一次, 跨 download() 的事件循环复用"""
+    key = (mode, workers)
+    if key not in _executors:
+        if mode == "process":
+            _executors[key] = ProcessPoolExecutor(max_workers=workers)
+        else:
+            _executors[key] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+        logger.info(f"解析使用{'进程' if mode == 'process' else '线程'}池, 大小 {workers}")
+    return _executors[key]
+
+
+class ParseOffloader:
+    """把 CPU 密集的解析交给线程池 / 进程池, 事件循环只等待结果
+
+    传给 run 的函数和参数要能 pickle(进程池), 所以下载器传入的是 response.content 这样的 bytes,
+    返回的是解析好的 dict 列表, 不传 httpx.Response. 同时交出去的任务数受 max_pending 限制,
+    池子忙不过来时调用方在这里等待, 不会把所有页面都堆进池子的队列.
+
+    Attributes:
+        name (str): 接口名称
+        mode (str): inline / thread / process
+        workers (int): 池子大小
+        max_pending (int): 同时交给池子的任务数上限
+    """
+
+    def __init__(self, name: str, *, mode: Literal["inline", "thread", "process"], workers: int = 0, max_pending: int = 0):
+        self.name = name
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        # Semaphore 只能在创建它的事件循环里使用, 同时存在多个循环(多次 asyncio.run, Streamlit 的多个会话)时各用各的
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+        return semaphore
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """按配置的方式调用 func(*args, **kwargs) 并返回结果"""
+        if self.mode == "inline":
+            return func(*args, **kwargs)
+        executor = _get_executor(self.mode, self.workers)
+        async with self._get_semaphore():
+            return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+_offloaders: dict[str, ParseOffloader] = {}
+
+
+def get_parse_offloader(endpoint: str) -> ParseOffloader:
+    """获取接口对应的解析卸载器, 同一接口在进程内只有一个"""
+    if endpoint not in _offloaders:
+        _offloaders[endpoint] = ParseOffloader(
+            endpoint,
+            mode=parse_offload_config.modes.get(endpoint, "inline"),
+            workers=parse_offload_config.workers,
+            max_pending=parse_offload_config.max_pending,
+        )
+    return _offloaders[endpoint]
+
+
+__all__ = ["ParseOffloader", "get_parse_offloader"]
@@ -0,0 +1,314 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Literal, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from ..database import db, get_batch_writer
+from ..util import CustomProgress, frozen_now, logging
+from ..request.transport import shared_async_client, transport_stats
+from ..request.cache import get_response_cache
+from .BaseDownloader import BaseDownloader, CommentID
+from .get_list_data import Downloader as ListDownloader
+from .get_body_data import Downloader as BodyDownloader
+from .get_comment1_data import Downloader as Comment1Downloader
+from .get_comment2_data import Downloader as Comment2Downloader
+
+
+logger = logging.getLogger(__name__)
+
+
+class StageStats(BaseModel):
+    """单个阶段的统计
+
+    Attributes:
+        name (str): 阶段名称
+        received (int): 进入该阶段队列的请求参数个数
+        processed (int): 已处理完的请求参数个数
+        records (int): 保存的记录数
+        started_at (float | None): 第一个请求参数开始处理的时间(time.monotonic)
+        first_record_at (float | None): 第一条记录保存的时间
+        finished_at (float | None): 阶段结束的时间
+    """
+    name: str
+    received: int = 0
+    processed: int = 0
+    records: int = 0
+    started_at: Optional[float] = None
+    first_record_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """每秒处理的请求参数个数"""
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class _Emitter:
+    """保存记录之后把记录交给 sink, sink 阻塞(下游队列已满)时当前 worker 跟着等待, 形成背压"""
+    sink: Optional[Callable[[list], Awaitable[None]]] = None
+    stats: Optional[StageStats] = None
+
+    async def _save_to_database_asyncio(self, items: list):
+        written = await super()._save_to_database_asyncio(items)
+        if self.stats is not None and items:
+            self.stats.records += len(items)
+            if self.stats.first_record_at is None:
+                self.stats.first_record_at = time.monotonic()
+        if self.sink is not None and items:
+            await self.sink(items)
+        return written
+
+
+class _ListStage(_Emitter, ListDownloader):
+    pass
+
+
+class _BodyStage(_Emitter, BodyDownloader):
+    pass
+
+
+class _Comment1Stage(_Emitter, Comment1Downloader):
+    pass
+
+
+class _Comment2Stage(_Emitter, Comment2Downloader):
+    pass
+
+
+class _Stage:
+    """一个流水线阶段: 有界队列 + 固定数量的 worker, worker 复用下载器的 _download_single_asyncio
+
+    Attributes:
+        downloader (BaseDownloader): 该阶段使用的下载器
+        queue (asyncio.Queue): 请求参数队列, 收到 None 时 worker 退出
+        workers (int): worker 数
+        stats (StageStats): 阶段统计
+    """
+
+    def __init__(self, name: str, downloader: BaseDownloader, *, workers: int, queue_size: int):
+        self.downloader = downloader
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = StageStats(name=name)
+        self.downloader.stats = self.stats
+        self._seen = set()
+        self._progress = None
+        self._task_id = None
+
+    async def put(self, param: Any, *, key: Any = None) -> None:
+        """放入请求参数, 同一个 key 只放入一次; 队列已满时等待"""
+        key = param if key is None else key
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self.stats.received += 1
+        if self._progress is not None:
+            self._progress.update(self._task_id, total=self.stats.received)
+        await self.queue.put(param)
+
+    async def close(self) -> None:
+        """上游结束后调用, 每个 worker 收到一个 None 后退出"""
+        for _ in range(self.workers):
+            await self.queue.put(None)
+
+    def attach_progress(self, progress) -> None:
+        self._progress = progress
+        self._task_id = progress.add_task(description=self.stats.name, total=self.stats.received)
+
+    async def run(self, *, client: httpx.AsyncClient, progress) -> None:
+        await asyncio.gather(*(self._worker(client=client, progress=progress) for _ in range(self.workers)))
+        self.stats.finished_at = time.monotonic()
+
+    async def _worker(self, *, client: httpx.AsyncClient, progress) -> None:
+        while True:
+            param = await self.queue.get()
+            if param is None:
+                return
+            if self.stats.started_at is None:
+                self.stats.started_at = time.monotonic()
+            try:
+                await self.downloader._download_single_asyncio(
+                    param=param,
+                    client=client,
+                    progress=progress,
+                    overall_task=self._task_id,
+                )
+            except Exception as e:
+                logger.error(f"{self.stats.name} 阶段处理 {param} 失败: {e!r}")
+            self.stats.processed += 1
+
+
+class CrawlPipeline:
+    """按关键词流水线式爬取: 列表页 -> 详细页 / 一级评论 -> 二级评论
+
+    列表页每保存一批记录, 其中的 mid 立即进入详细页和一级评论阶段; 一级评论中有回复的评论进入二级评论阶段.
+    各阶段之间是有界队列, 下游处理不过来时上游等待; 所有阶段共用一个 httpx.AsyncClient.
+
+    数据保存位置:
+        列表页: table_name
+        详细页: {table_name}_body
+        一级评论: {table_name}_comment1
+        二级评论: {table_name}_comment2
+
+    Attributes:
+        stages (dict[str, _Stage]): 各阶段, 键为 list / body / comment1 / comment2
+        started_at (float | None): 开始时间(time.monotonic)
+        finished_at (float | None): 结束时间
+    """
+
+    def __init__(self, search_for: str, *, table_name: str, kind: Literal["综合", "实时", "高级"] = "综合",
+                 advanced_kind: Literal["综合", "热度", "原创"] = "综合", time_start: Optional[datetime] = None, time_end: Optional[datetime] = None,
+                 with_body: bool = True, with_comment2: bool = True, workers: Optional[dict[str, int]] = None, queue_size: int = 100,
+                 resume: bool = False):
+        """
+        Args:
+            search_for (str): 需要搜索的内容，如果是话题，需要在 search_for 前后都加上 #
+            table_name (str): 存储的位置(数据表名), 其余阶段在此基础上加后缀
+            kind (Literal[, optional): 搜索类型可以是 综合，实时，高级. Defaults to "综合".
+            advanced_kind (Literal[, optional): 筛选条件，可以是综合，热度，原创. Defaults to "综合".
+            time_start (Optional[datetime], optional): 起始时间，最大颗粒度为小时. Defaults to None.
+            time_end (Optional[datetime], optional): 结束时间，最大颗粒度为小时. Defaults to None.
+            with_body (bool, optional): 是否下载详细页. Defaults to True.
+            with_comment2 (bool, optional): 是否下载二级评论. Defaults to True.
+            workers (Optional[dict[str, int]], optional): 各阶段 worker 数, 在途请求数另受接口限流器约束. Defaults to None.
+            queue_size (int, optional): 各阶段队列容量. Defaults to 100.
+            resume (bool, optional): 评论阶段是否跳过被中断的上一次运行已经取完的微博. Defaults to False.
+        """
+        workers = {"list": 10, "body": 16, "comment1": 16, "comment2": 16, **(workers or {})}
+        self.search_for = search_for
+        self.table_name = table_name
+        self.started_at = None
+        self.finished_at = None
+
+        # 列表页总是重新请求: 跳过的页不会再产出 mid; resume 时评论阶段各自按断点跳过中断前已完成的微博
+        list_downloader = _ListStage(search_for, table_name=table_name, kind=kind, advanced_kind=advanced_kind,
+                                     time_start=time_start, time_end=time_end, resume=False)
+        self.stages = {
+            "list": _Stage("list", list_downloader, workers=workers["list"], queue_size=0),
+            "comment1": _Stage("comment1", _Comment1Stage(uid=[], mid=[], table_name=f"{table_name}_comment1", resume=resume),
+                               workers=workers["comment1"], queue_size=queue_size),
+        }
+        if with_body:
+            self.stages["body"] = _Stage("body", _BodyStage([], table_name=f"{table_name}_body"),
+                                         workers=workers["body"], queue_size=queue_size)
+        if with_comment2:
+            self.stages["comment2"] = _Stage("comment2", _Comment2Stage(uid=[], mid=[], table_name=f"{table_name}_comment2", resume=resume),
+                                             workers=workers["comment2"], queue_size=queue_size)
+
+        list_downloader.sink = self._on_list_records
+        if with_comment2:
+            self.stages["comment1"].downloader.sink = self._on_comment1_records
+
+    async def _on_list_records(self, records: list) -> None:
+        for record in records:
+            mid, uid = str(record.mid), str(record.uid)
+            if "body" in self.stages:
+                await self.stages["body"].put(mid)
+            await self.stages["comment1"].put(CommentID(uid=uid, mid=mid), key=mid)
+
+    async def _on_comment1_records(self, records: list) -> None:
+        for record in records:
+            # 有回复的一级评论才需要请求二级评论, 二级评论接口的 uid 是微博作者的 uid
+            if record.json_data.get("total_number", 0) > 0:
+                mid = str(record.mid)
+                await self.stages["comment2"].put(CommentID(uid=str(record.f_uid), mid=mid), key=mid)
+
+    async def _run_after(self, stage: _Stage, upstreams: list[asyncio.Task], **kwargs) -> None:
+        """运行 stage, 上游全部结束后关闭 stage 的队列"""
+        async def close_when_done():
+            await asyncio.gather(*upstreams)
+            await stage.close()
+        await asyncio.gather(stage.run(**kwargs), close_when_done())
+
+    async def run_asyncio(self) -> dict[str, StageStats]:
+        self.started_at = time.monotonic()
+        list_stage = self.stages["list"]
+        list_params = list_stage.downloader._get_request_params()
+
+        # 各阶段的相对时间(N分钟前, 昨天)以流水线开始的时刻为基准, 之后创建的任务都继承这个时间
+        with frozen_now(), CustomProgress() as progress:
+            for stage in self.stages.values():
+                stage.attach_progress(progress)
+            async with shared_async_client() as client:
+                for param in list_params:
+                    await list_stage.put(param)
+                await list_stage.close()
+
+                kwargs = dict(client=client, progress=progress)
+                list_task = asyncio.create_task(list_stage.run(**kwargs))
+                tasks = [list_task]
+                comment1_task = asyncio.create_task(self._run_after(self.stages["comment1"], [list_task], **kwargs))
+                tasks.append(comment1_task)
+                if "body" in self.stages:
+                    tasks.append(asyncio.create_task(self._run_after(self.stages["body"], [list_task], **kwargs)))
+                if "comment2" in self.stages:
+                    tasks.append(asyncio.create_task(self._run_after(self.stages["comment2"], [comment1_task], **kwargs)))
+                await asyncio.gather(*tasks)
+            await get_batch_writer(db).close()
+            for stage in self.stages.values():
+                await stage.downloader._drain_checkpoints()
+                await stage.downloader._clear_checkpoints_asyncio()
+
+        self.finished_at = time.monotonic()
+        logger.info(f"流水线 {self.search_for} 完成, 共 {len(list_params)} 页列表, 用时 {self.finished_at - self.started_at:.1f}s")
+        for line in self.report().splitlines():
+            logger.info(line)
+        for line in transport_stats.report().splitlines():
+            logger.info(line)
+        cache = get_response_cache()
+        if cache is not None:
+            logger.info(cache.report())
+        return {name: stage.stats for name, stage in self.stages.items()}
+
+    def run(self) -> dict[str, StageStats]:
+        return asyncio.run(self.run_asyncio())
+
+    @property
+    def time_to_first_comment(self) -> Optional[float]:
+        first = self.stages["comment1"].stats.first_record_at
+        return None if first is None or self.started_at is None else first - self.started_at
+
+    def report(self) -> str:
+        """各阶段的吞吐量报告"""
+        lines = []
+        for name, stage in self.stages.items():
+            stats = stage.stats
+            lines.append(f"{name:<9} 请求 {stats.processed}/{stats.received}  记录 {stats.records}  "
+                         f"用时 {stats.elapsed:.1f}s  吞吐 {stats.throughput:.2f}/s")
+        if self.time_to_first_comment is not None:
+            lines.append(f"首条评论用时 {self.time_to_first_comment:.1f}s")
+        return "\n".join(lines)
+
+
+def crawl_pipeline(search_for: str, *, table_name: str, kind: Literal["综合", "实时", "高级"] = "综合",
+                   advanced_kind: Literal["综合", "热度", "原创"] = "综合", time_start: Optional[datetime] = None, time_end: Optional[datetime] = None,
+                   with_body: bool = True, with_comment2: bool = True, resume: bool = False) -> dict[str, StageStats]:
+    """按关键词流水线式爬取列表页、详细页、一级评论和二级评论
+
+    Args:
+        search_for (str): 需要搜索的内容，如果是话题，需要在 search_for 前后都加上 #
+        table_name (str): 存储的位置(数据表名), 详细页和评论分别存到加 _body / _comment1 / _comment2 后缀的表
+        kind (Literal[, optional): 搜索类型可以是 综合，实时，高级. Defaults to "综合".
+        advanced_kind (Literal[, optional): 筛选条件，可以是综合，热度，原创. Defaults to "综合".
+        time_start (Optional[datetime], optional): 起始时间，最大颗粒度为小时. Defaults to None.
+        time_end (Optional[datetime], optional): 结束时间，最大颗粒度为小时. Defaults to None.
+        with_body (bool, optional): 是否下载详细页. Defaults to True.
+        with_comment2 (bool, optional): 是否下载二级评论. Defaults to True.
+        resume (bool, optional): 是否继续被中断的上一次运行, 跳过其中已经取完评论的微博. Defaults to False.
+
+    Returns:
+        dict[str, StageStats]: 各阶段统计
+    """
+    pipeline = CrawlPipeline(search_for, table_name=table_name, kind=kind, advanced_kind=advanced_kind,
+                             time_start=time_start, time_end=time_end, with_body=with_body, with_comment2=with_comment2,
+                             resume=resume)
+    return pipeline.run()
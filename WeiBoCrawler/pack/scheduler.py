@@ -0,0 +1,117 @@
+import asyncio
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+
+from ..util import logging
+
+
+logger = logging.getLogger(__name__)
+
+# 各接口的 (初始并发, 最大并发), 同一进程内所有下载器共享
+ENDPOINT_LIMITS = {
+    "list": (4, 10),
+    "body": (8, 32),
+    "buildComments": (4, 16),
+}
+
+
+class _LoopSlots:
+    """一个事件循环中的在途请求数和等待名额用的 Condition"""
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.in_flight = 0
+
+
+class AIMDLimiter:
+    """按接口限制在途请求数, 并按错误率自适应调整(加性增、乘性减)
+
+    每次成功把上限增加 increase / limit, 相当于每一轮(limit 个请求)增加 increase;
+    最近 window 个请求的错误率超过 backoff_error_rate 时把上限乘以 decrease_factor.
+
+    上限在进程内共享; 在途请求数和等待用的 Condition 按事件循环分开保存. download() 每次用 asyncio.run
+    新建事件循环, Streamlit 的各个会话也在各自的线程里运行, 同时存在的多个循环各自按 limit 限制在途请求数.
+
+    Attributes:
+        name (str): 接口名称
+        limit (float): 当前并发上限
+        in_flight (int): 所有事件循环的在途请求数之和
+    """
+
+    def __init__(self, name: str, *, initial: int, maximum: int, minimum: int = 1, increase: float = 1.0,
+                 decrease_factor: float = 0.5, window: int = 20, min_samples: int = 5, backoff_error_rate: float = 0.2):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.min_samples = min_samples
+        self.backoff_error_rate = backoff_error_rate
+        self._outcomes = deque(maxlen=window)
+        # Condition 只能在创建它的事件循环里使用, 所以每个循环一份, 循环结束后随之回收
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopSlots]" = weakref.WeakKeyDictionary()
+
+    @property
+    def in_flight(self) -> int:
+        return sum(slots.in_flight for slots in list(self._slots.values()))
+
+    def _get_slots(self) -> "_LoopSlots":
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = _LoopSlots()
+        return slots
+
+    async def acquire(self) -> None:
+        slots = self._get_slots()
+        async with slots.condition:
+            await slots.condition.wait_for(lambda: slots.in_flight < int(self.limit))
+            slots.in_flight += 1
+
+    async def release(self) -> None:
+        slots = self._get_slots()
+        async with slots.condition:
+            slots.in_flight -= 1
+            slots.condition.notify_all()
+
+    def record(self, success: bool) -> None:
+        """记录一次请求的结果并调整上限"""
+        self._outcomes.append(success)
+        if success:
+            self.limit = min(self.maximum, self.limit + self.increase / max(1.0, self.limit))
+            return
+
+        error_rate = self._outcomes.count(False) / len(self._outcomes)
+        if len(self._outcomes) >= self.min_samples and error_rate >= self.backoff_error_rate:
+            old_limit = self.limit
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            self._outcomes.clear()
+            logger.warning(f"{self.name} 接口错误率 {error_rate:.0%}, 并发上限 {old_limit:.1f} -> {self.limit:.1f}")
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个请求名额, 请求抛出异常(超时等)时记为失败"""
+        await self.acquire()
+        try:
+            yield
+        except Exception:
+            self.record(False)
+            raise
+        finally:
+            await self.release()
+
+
+_limiters: dict[str, AIMDLimiter] = {}
+
+
+def get_limiter(endpoint: str) -> AIMDLimiter:
+    """获取接口对应的限流器, 同一接口在进程内只有一个"""
+    if endpoint not in _limiters:
+        initial, maximum = ENDPOINT_LIMITS[endpoint]
+        _limiters[endpoint] = AIMDLimiter(endpoint, initial=initial, maximum=maximum)
+    return _limiters[endpoint]
+
+
+__all__ = ["AIMDLimiter", "ENDPOINT_LIMITS", "get_limiter"]
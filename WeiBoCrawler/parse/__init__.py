@@ -1,6 +1,6 @@
 from .process_list import process_list_documents
-from .process_comment import process_comment_documents, process_comment_resp
-from .process_body import process_body_documents, process_body_resp
+from .process_comment import process_comment_documents, process_comment_resp, parse_comment_content
+from .process_body import process_body_documents, process_body_resp, parse_body_content
 from .parse_list_html import parse_list_html
 
 __all__ = [
@@ -11,5 +11,7 @@ __all__ = [
     "parse_list_html",
 
     "process_body_resp",
-    "process_comment_resp"
+    "process_comment_resp",
+    "parse_body_content",
+    "parse_comment_content",
 ]
\ No newline at end of file
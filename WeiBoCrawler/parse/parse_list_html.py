@@ -1,243 +1,126 @@
 import re
-import parsel
-from typing import Optional, List
-from ..util import custom_validate_call, process_time_str
-
-
-@custom_validate_call
-def get_mid(select: parsel.Selector) -> Optional[str]:
-    """获取微博的mid
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[str]: 微博的mid
-    """
-    mid = select.xpath("//div[@mid]/@mid").get()
-    return mid
-
-
-@custom_validate_call
-def get_uid(select: parsel.Selector) -> Optional[str]:
-    """获取微博的uid
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[str]: 微博的uid
-    """
-    uid = select.xpath("//a[@nick-name]/@href").get()
-    if uid is None:
-        return None
-    else:
-        uid = re.search(r"/(\d+)/?", uid).group(1)
-        return uid
-
-@custom_validate_call
-def get_mblogid(select: parsel.Selector) -> Optional[str]:
-    """获取微博的mblogid
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[str]: 微博的mblogid
-    """
-    mblogid = select.xpath('//div[@class="from"]/a[1]/@href').get()
-    if mblogid is None:
-        return None
-    else:
-        mblogid = re.search(r"/(\w+)\?", mblogid).group(1)
-        return mblogid
-
-
-@custom_validate_call
-def get_personal_name(select: parsel.Selector) -> Optional[str]:
-    """获取微博的个人名称
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[str]: 微博的个人名称
-    """
-    personal_name = select.xpath("//a[@nick-name]/@nick-name").get()
-    return personal_name
-
-@custom_validate_call
-def get_personal_href(select: parsel.Selector) -> Optional[str]:
-    """获取微博的个人主页
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[str]: 个人主页的 URL
-    """
-    personal_href = select.xpath("//a[@nick-name]/@href").get()
-    if personal_href is None:
+from lxml import etree
+from lxml.html import HTMLParser
+from pydantic import TypeAdapter
+from datetime import datetime
+from typing import Optional, List, Union
+from typing_extensions import TypedDict
+from ..util import frozen_now, process_time_str
+
+
+class ListItem(TypedDict):
+    mid: Optional[str]
+    uid: Optional[str]
+    mblogid: Optional[str]
+    personal_name: Optional[str]
+    personal_href: Optional[str]
+    weibo_href: Optional[str]
+    publish_time: Optional[str]
+    content_from: Optional[str]
+    content_all: Optional[str]
+    retweet_num: Optional[int]
+    comment_num: Optional[int]
+    star_num: Optional[int]
+
+
+# 整页只校验一次, 代替每个字段一次的 custom_validate_call
+_LIST_ITEMS = TypeAdapter(List[ListItem])
+
+
+def _xpath(path: str) -> etree.XPath:
+    return etree.XPath(path, smart_strings=False)
+
+
+# 预编译的 XPath, 除了前两个都相对于单条微博的节点求值, 与上面逐字段函数里的 XPath 一一对应
+_M_PAGE = _xpath('//div[contains(concat(" ", normalize-space(@class), " "), " m-page ")]')
+_FEED_ITEMS = _xpath('//*[@id="pl_feedlist_index"]//div[@action-type="feed_list_item"]')
+_MID = _xpath("descendant-or-self::div[@mid]/@mid")
+_NICK_HREF = _xpath(".//a[@nick-name]/@href")
+_NICK_NAME = _xpath(".//a[@nick-name]/@nick-name")
+_FROM_HREF = _xpath('.//div[@class="from"]/a[1]/@href')
+_FROM_TEXT = _xpath('.//div[@class="from"]/a[1]/text()')
+_FROM_DEVICE = _xpath('.//div[@class="from"]/a[2]/text()')
+_CONTENT_FULL = _xpath('string(.//p[@node-type="feed_list_content_full"])')
+_CONTENT = _xpath('string(.//p[@node-type="feed_list_content"])')
+_ACT_NUMS = [_xpath(f'string(.//div[@class="card-act"]/ul[1]/li[{i}])') for i in (1, 2, 3)]
+
+_UID_RE = re.compile(r"/(\d+)/?")
+_MBLOGID_RE = re.compile(r"/(\w+)\?")
+_DIGITS_RE = re.compile(r"\d+")
+_INDENT_RE = re.compile(r"\n[ \t]+")
+_SINGLE_NEWLINE_RE = re.compile(r"(?<!\n)\n(?!\n)")
+_FOLD_RE = re.compile(r"[ \t]*收起d[ \t]*")
+_PARAGRAPH_RE = re.compile(r"[ \t]*\n+[ \t]*")
+
+_parsers: dict[str, HTMLParser] = {}
+
+
+def _first(values: list) -> Optional[str]:
+    return values[0] if values else None
+
+
+def _count(text: str) -> Optional[int]:
+    if not text:
         return None
-    else:
-        return "https:" + personal_href
-
-
-def get_weibo_href(select: parsel.Selector) -> Optional[str]:
-    """获取微博的链接
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[str]: 微博的链接
-    """
-    weibo_href = select.xpath('//div[@class="from"]/a[1]/@href').get()
-    if weibo_href is None:
-        return None
-    else:
-        return "https:" + weibo_href
-
-
-@custom_validate_call
-def get_publish_time(select: parsel.Selector) -> Optional[str]:
-    """获取微博的发布时间
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[datetime]: 微博的发布时间
-    """
-    publish_time_str = select.xpath('//div[@class="from"]/a[1]/text()').get()
-    if publish_time_str is None:
-        return publish_time_str
-    else:
-        publish_time = process_time_str(publish_time_str).strftime("%Y-%m-%d %H:%M:%S")
-        return publish_time
-
-@custom_validate_call
-def get_content_from(select:parsel.Selector) -> Optional[str]:
-    """获取微博的发送设备
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[str]: 微博的发送设备
-    """
-    content_from = select.xpath('//div[@class="from"]/a[2]/text()').get()
-    return content_from
-
-@custom_validate_call
-def get_content_all(select:parsel.Selector) -> Optional[str]:
-    """获取微博的内容
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[str]: 微博的内容
-    """
-    content_all = select.xpath('string(//p[@node-type="feed_list_content_full"])').get()
-    content_all = re.sub(r"\n[ \t]+", "\n", content_all)
-    content_all = re.sub(r"(?<!\n)\n(?!\n)", "", content_all)
-    content_all = re.sub(r"[ \t]*收起d[ \t]*", "", content_all)
-
-    content_show = select.xpath('string(//p[@node-type="feed_list_content"])').get()
-    content_show = re.sub(r"\n[ \t]+", "\n", content_show)
-    content_show = re.sub(r"(?<!\n)\n(?!\n)", "", content_show)
-    
-    content_final = content_all if content_all else content_show
-    content_final = content_final.replace("\u200b", "").strip()
-    content_final = re.sub(r"[ \t]*\n+[ \t]*", "\n\n", content_final)
-
-    return content_final
-
-@custom_validate_call
-def get_retweet_num(select: parsel.Selector) -> Optional[int]:
-    """获取微博的转发数量
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[int]: 微博的转发数量
-    """
-    retweet_num = select.xpath('string(//div[@class="card-act"]/ul[1]/li[1])').get()
-    if retweet_num:
-        retweet_num = re.findall(r"\d+", retweet_num)
-        return int(retweet_num[0]) if retweet_num else 0
-    else:
-        return None
-        
-    
-@custom_validate_call
-def get_comment_num(select:parsel.Selector) -> Optional[int]:
-    """获取微博的评论数量
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[int]: 微博的评论数量
-    """
-    comment_num = select.xpath('string(//div[@class="card-act"]/ul[1]/li[2])').get()
-    if comment_num:
-        comment_num = re.findall(r"\d+", comment_num)
-        return int(comment_num[0]) if comment_num else 0
-    else:
-        return None
-
-@custom_validate_call
-def get_star_num(select: parsel.Selector) -> Optional[int]:
-    """获取微博的点赞数量
-
-    Args:
-        select (parsel.Selector): 经过 parsel 解析 html 后得到的 Selector 对象
-
-    Returns:
-        Optional[int]: 微博的点赞数量
-    """
-    star_num = select.xpath('string(//div[@class="card-act"]/ul[1]/li[3])').get()
-    if star_num:
-        star_num = re.findall(r"\d+", star_num)
-        return int(star_num[0]) if star_num else 0
-    else:
-        return None
-    
-
-def parse_list_html(html: str) -> List[dict]:
+    digits = _DIGITS_RE.search(text)
+    return int(digits.group()) if digits else 0
+
+
+def _content(node) -> str:
+    content_all = _CONTENT_FULL(node)
+    content_all = _INDENT_RE.sub("\n", content_all)
+    content_all = _SINGLE_NEWLINE_RE.sub("", content_all)
+    content_all = _FOLD_RE.sub("", content_all)
+    if not content_all:
+        content_all = _SINGLE_NEWLINE_RE.sub("", _INDENT_RE.sub("\n", _CONTENT(node)))
+    content_final = content_all.replace("\u200b", "").strip()
+    return _PARAGRAPH_RE.sub("\n\n", content_final)
+
+
+def _parse_item(node) -> dict:
+    nick_href = _first(_NICK_HREF(node))
+    from_href = _first(_FROM_HREF(node))
+    publish_time = _first(_FROM_TEXT(node))
+    return {
+        "mid": _first(_MID(node)),
+        "uid": _UID_RE.search(nick_href).group(1) if nick_href is not None else None,
+        "mblogid": _MBLOGID_RE.search(from_href).group(1) if from_href is not None else None,
+        "personal_name": _first(_NICK_NAME(node)),
+        "personal_href": "https:" + nick_href if nick_href is not None else None,
+        "weibo_href": "https:" + from_href if from_href is not None else None,
+        "publish_time": process_time_str(publish_time).strftime("%Y-%m-%d %H:%M:%S") if publish_time is not None else None,
+        "content_from": _first(_FROM_DEVICE(node)),
+        "content_all": _content(node),
+        "retweet_num": _count(_ACT_NUMS[0](node)),
+        "comment_num": _count(_ACT_NUMS[1](node)),
+        "star_num": _count(_ACT_NUMS[2](node)),
+    }
+
+
+def parse_list_html(html: Union[str, bytes], *, encoding: str = "utf-8", now: Optional[datetime] = None) -> List[dict]:
     """解析微博列表主体的html
 
+    整页只解析一次, 用预编译的相对 XPath 在每条微博的节点上取字段, 结果与改写前逐字段用 parsel 查询的实现 (见 benchmark._parse_list_html_legacy) 相同.
+
     Args:
-        html (str): 爬虫获取到的 html 文本
+        html (Union[str, bytes]): 爬虫获取到的 html 文本, 也可以直接传 response.content
+        encoding (str): html 为 bytes 时的编码. Defaults to "utf-8".
+        now (Optional[datetime]): 相对时间的基准, 为 None 时沿用外层 frozen_now 固定的时间. Defaults to None.
 
     Returns:
         List[dict]: 整理后的 List[dict]
     """
-    select = parsel.Selector(html)
-    check_div_mpage = select.css("div.m-page").get()
-    if check_div_mpage is None:
+    if not html:
+        return []
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+        encoding = "utf-8"
+    if encoding not in _parsers:
+        _parsers[encoding] = HTMLParser(encoding=encoding, huge_tree=True)
+    root = etree.fromstring(html, parser=_parsers[encoding])
+    if root is None or not _M_PAGE(root):
         return []
-    else:
-        div_list = select.xpath('//*[@id="pl_feedlist_index"]//div[@action-type="feed_list_item"]').getall()
-        lst = []
-        for div_string in div_list:
-            select = parsel.Selector(div_string)
-            item = {
-                "mid": get_mid(select),
-                "uid": get_uid(select),
-                "mblogid": get_mblogid(select),
-                "personal_name": get_personal_name(select),
-                "personal_href": get_personal_href(select),
-                "weibo_href": get_weibo_href(select),
-                "publish_time": get_publish_time(select),
-                "content_from": get_content_from(select),
-                "content_all": get_content_all(select),
-                "retweet_num": get_retweet_num(select),
-                "comment_num": get_comment_num(select),
-                "star_num": get_star_num(select),
-            }
-            lst.append(item)
-        return lst
\ No newline at end of file
+    # 相对时间以整次抓取固定的时刻为基准, 单独调用时至少同一页一致
+    with frozen_now(now):
+        items = [_parse_item(node) for node in _FEED_ITEMS(root)]
+    return _LIST_ITEMS.validate_python(items)
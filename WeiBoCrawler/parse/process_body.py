@@ -1,5 +1,13 @@
+import json
+from typing import Iterable
 import pandas as pd
-from ..util import process_base_document, process_base_documents
+from ..util import compile_transform, process_base_document, process_base_documents
+
+_RESP_PLAN = compile_transform({
+    "mid": "mid",
+    "uid": ["user", "idstr"],
+})
+
 
 def process_body_resp(resp):
     """处理详细页数据
@@ -11,16 +19,48 @@ def process_body_resp(resp):
     Returns:
         list[dict]: 响应的数据, 这里使用 list 包装一下(对齐其他的process请求).
     """
-    data = resp.json()
-    transform_dict = {
-            "mid": "mid",
-            "uid": ["user", "idstr"],
-    }
-    data.update(process_base_document(data, transform_dict))
+    return parse_body_content(resp.content)
+
+
+def parse_body_content(content: bytes) -> list[dict]:
+    """同 process_body_resp, 但只接收响应体, 可以交给进程池执行
+
+    Args:
+        content (bytes): 响应体.
+
+    Returns:
+        list[dict]: 响应的数据
+    """
+    data = json.loads(content)
+    data.update(process_base_document(data, _RESP_PLAN))
     return [data]
 
 
-def process_body_documents(documents: list[dict]) -> pd.DataFrame:
+_BODY_PLAN = compile_transform({
+    "mid": "mid",
+    "uid": ["user", "idstr"],
+    "mblogid": "mblogid",
+    "个人昵称": ["user", "screen_name"],
+
+    "用户性别": ["longText", "user", "gender"],
+
+    "用户定位": ["longText","user", "location"],
+    "用户粉丝": ["longText","user", "followers_count"],
+    "用户累计评论数": ["user", "status_total_counter", "comment_cnt"],
+    "用户累计转发数": ["user", "status_total_counter", "repost_cnt"],
+    "用户累计点赞数": ["user", "status_total_counter", "like_cnt"],
+    "用户累计评转赞": ["user", "status_total_counter", "total_cnt"],
+    "发布时间": "created_at",
+    "原生内容": "text",
+    "展示内容": "text_raw",
+    
+    "转发数量": "reposts_count",
+    "评论数量": "comments_count",
+    "点赞数量": "attitudes_count",
+    })
+
+
+def process_body_documents(documents: Iterable[dict]) -> pd.DataFrame:
     """将 documents 处理成 dataframe 的形式
     
     transform_dict = {
@@ -31,33 +71,10 @@ def process_body_documents(documents: list[dict]) -> pd.DataFrame:
         }
 
     Args:
-        documents (list[dict]): 文档列表
+        documents (Iterable[dict]): 文档列表, 也可以是 db.sync_iter_json_data 返回的生成器
         transform_dict (dict): 转换字典, key 是转化后的字段, value 是原始字段
 
     Returns:
         pd.DataFrame: (去重)处理后得到的表格
     """
-    transform_dict = {
-            "mid": "mid",
-            "uid": ["user", "idstr"],
-            "mblogid": "mblogid",
-            "个人昵称": ["user", "screen_name"],
-
-            "用户性别": ["longText", "user", "gender"],
-
-            "用户定位": ["longText","user", "location"],
-            "用户粉丝": ["longText","user", "followers_count"],
-            "用户累计评论数": ["user", "status_total_counter", "comment_cnt"],
-            "用户累计转发数": ["user", "status_total_counter", "repost_cnt"],
-            "用户累计点赞数": ["user", "status_total_counter", "like_cnt"],
-            "用户累计评转赞": ["user", "status_total_counter", "total_cnt"],
-            "发布时间": "created_at",
-            "原生内容": "text",
-            "展示内容": "text_raw",
-            
-            "转发数量": "reposts_count",
-            "评论数量": "comments_count",
-            "点赞数量": "attitudes_count",
-        }
-    df = process_base_documents(documents, transform_dict)
-    return df
\ No newline at end of file
+    return process_base_documents(documents, _BODY_PLAN)
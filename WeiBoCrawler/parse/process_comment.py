@@ -1,8 +1,9 @@
-from typing import Tuple
+import json
+from typing import Iterable, Tuple
 import httpx
 from pydantic import BaseModel
 import pandas as pd
-from ..util import process_base_documents, process_base_document
+from ..util import compile_transform, process_base_documents, process_base_document
 
 class CommmentResponseInfo(BaseModel):
     max_id: str
@@ -11,6 +12,12 @@ class CommmentResponseInfo(BaseModel):
 
 
 
+_RESP_PLAN = compile_transform({
+    "mid": "mid",
+    "uid": ["user", "idstr"],
+})
+
+
 def process_comment_resp(resp: httpx.Response) -> Tuple[CommmentResponseInfo, list]:
     """处理评论数据
 
@@ -27,19 +34,26 @@ def process_comment_resp(resp: httpx.Response) -> Tuple[CommmentResponseInfo, li
     Returns:
         Tuple[dict, list]: 前面是 请求的信息(后面要用到), 后面是数据
     """
-    data = resp.json()
+    return parse_comment_content(resp.content)
+
+
+def parse_comment_content(content: bytes) -> Tuple[CommmentResponseInfo, list]:
+    """同 process_comment_resp, 但只接收响应体, 可以交给进程池执行
+
+    Args:
+        content (bytes): 响应体.
+
+    Returns:
+        Tuple[CommmentResponseInfo, list]: 前面是 请求的信息(后面要用到), 后面是数据
+    """
+    data = json.loads(content)
     max_id = data.get("max_id", "")
     total_number = data.get("total_number", 0)
     data_number = len(data.get("data", []))
 
     data_list = data["data"]
 
-    transform_dict = {
-            "mid": "mid",
-            "uid": ["user", "idstr"],
-    }
-    
-    [data.update(process_base_document(data, transform_dict)) for data in data_list]
+    [data.update(process_base_document(data, _RESP_PLAN)) for data in data_list]
 
     resp_info = CommmentResponseInfo(max_id=str(max_id), total_number=int(total_number), data_number=data_number)
     return resp_info, data_list
@@ -48,7 +62,28 @@ def process_comment_resp(resp: httpx.Response) -> Tuple[CommmentResponseInfo, li
 
 
 
-def process_comment_documents(documents: list[dict]) -> pd.DataFrame:
+_COMMENT_PLAN = compile_transform({
+    "f_mid": "f_mid",
+    "f_uid": "f_uid",
+    "mid": "mid",
+    "uid": ["user", "id"],
+    "个人昵称": ["user", "screen_name"],
+    "用户性别": ["user", "gender"],
+    "用户定位": ["user", "location"],
+    "用户粉丝": ["user", "followers_count"],
+    "用户累计评论数": ["user", "status_total_counter", "comment_cnt"],
+    "用户累计转发数": ["user", "status_total_counter", "repost_cnt"],
+    "用户累计点赞数": ["user", "status_total_counter", "like_cnt"],
+    "用户累计评转赞": ["user", "status_total_counter", "total_cnt"],
+    "发布时间": "created_at",
+    "原生内容": "text",
+    "展示内容": "text_raw",
+    "评论数量": "total_number",
+    "点赞数量": "like_counts",
+})
+
+
+def process_comment_documents(documents: Iterable[dict]) -> pd.DataFrame:
     """将表处理成 dataframe 的形式
     
     transform_dict = {
@@ -59,30 +94,10 @@ def process_comment_documents(documents: list[dict]) -> pd.DataFrame:
         }
 
     Args:
-        table (Table): 需要处理的表
+        documents (Iterable[dict]): 文档列表, 也可以是 db.sync_iter_json_data 返回的生成器
         transform_dict (dict): 转换字典, key 是转化后的字段, value 是原始字段
 
     Returns:
         pd.DataFrame: (去重)处理后得到的表格
     """
-    transform_dict = {
-        "f_mid": "f_mid",
-        "f_uid": "f_uid",
-        "mid": "mid",
-        "uid": ["user", "id"],
-        "个人昵称": ["user", "screen_name"],
-        "用户性别": ["user", "gender"],
-        "用户定位": ["user", "location"],
-        "用户粉丝": ["user", "followers_count"],
-        "用户累计评论数": ["user", "status_total_counter", "comment_cnt"],
-        "用户累计转发数": ["user", "status_total_counter", "repost_cnt"],
-        "用户累计点赞数": ["user", "status_total_counter", "like_cnt"],
-        "用户累计评转赞": ["user", "status_total_counter", "total_cnt"],
-        "发布时间": "created_at",
-        "原生内容": "text",
-        "展示内容": "text_raw",
-        "评论数量": "total_number",
-        "点赞数量": "like_counts",
-    }
-    df = process_base_documents(documents, transform_dict)
-    return df
\ No newline at end of file
+    return process_base_documents(documents, _COMMENT_PLAN)
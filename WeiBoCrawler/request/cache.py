@@ -0,0 +1,242 @@
+import hashlib
+import importlib.util
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from ..util import logging, response_cache_config
+
+
+logger = logging.getLogger(__name__)
+
+# 安装 zstandard 时用 zstd 压缩响应体, 否则用 zlib; 每个响应体记录自己的压缩方式
+if importlib.util.find_spec("zstandard") is not None:
+    import zstandard
+    _CODEC = "zstd"
+else:
+    zstandard = None
+    _CODEC = "zlib"
+
+# 缓存的响应只保留解析需要的头, 响应体保存的是解压后的内容, 所以不保留 content-encoding
+_KEPT_HEADERS = ("content-type",)
+
+
+def normalize_url(url: httpx.URL | str, params: Optional[dict] = None) -> str:
+    """归一化请求地址: 合并 params, 查询参数按名称排序, 去掉 fragment
+
+    Args:
+        url (httpx.URL | str): build_list_params / build_body_params 得到的地址
+        params (Optional[dict]): 查询参数. Defaults to None.
+
+    Returns:
+        str: 归一化后的地址
+    """
+    url = httpx.URL(url, params=params) if params else httpx.URL(url)
+    return str(url.copy_with(params=sorted(url.params.multi_items()), fragment=None))
+
+
+class ResponseCache:
+    """基于 SQLite 的响应缓存, 以 "接口 + 归一化地址" 为键
+
+    响应体按内容哈希保存在 bodies 表中(内容相同的响应只存一份), 压缩后保存; entries 表记录每个地址对应的
+    响应体、状态码和保存时间. 查询时超过该接口 ttl 的条目视为未命中; 压缩后总大小超过 max_bytes 时
+    按最近使用时间(LRU)淘汰.
+
+    Attributes:
+        path (str): SQLite 文件路径
+        max_bytes (int): 压缩后响应体的总大小上限
+        ttl (dict[str, float]): 各接口缓存的有效秒数
+        hits (int): 命中次数
+        misses (int): 未命中次数(含过期)
+        stores (int): 写入次数
+    """
+
+    def __init__(self, path: str, *, max_bytes: int, ttl: dict[str, float], level: int = 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.level = level
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # 同步下载在主线程, 异步下载在事件循环线程, 所以允许跨线程使用连接, 由 _lock 串行化
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bodies ("
+            "digest TEXT PRIMARY KEY, codec TEXT NOT NULL, data BLOB NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, url TEXT NOT NULL, digest TEXT NOT NULL, "
+            "status INTEGER NOT NULL, headers TEXT NOT NULL, stored_at REAL NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_digest ON entries(digest)")
+        self._conn.commit()
+        (self._size,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()
+
+    @staticmethod
+    def key(endpoint: str, url: str) -> str:
+        return hashlib.blake2b(f"{endpoint}\0{url}".encode("utf-8"), digest_size=20).hexdigest()
+
+    def _compress(self, content: bytes) -> bytes:
+        if _CODEC == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compress(content)
+        return zlib.compress(content, min(self.level, 9))
+
+    @staticmethod
+    def _decompress(codec: str, data: bytes) -> Optional[bytes]:
+        if codec == "zlib":
+            return zlib.decompress(data)
+        if codec == "zstd" and zstandard is not None:
+            return zstandard.ZstdDecompressor().decompress(data)
+        return None
+
+    def get(self, endpoint: str, url: httpx.URL | str) -> Optional[httpx.Response]:
+        """查询缓存, 命中时返回重建的响应(extensions["from_cache"] 为 True), 并刷新最近使用时间
+
+        Args:
+            endpoint (str): 接口名称, list / body
+            url (httpx.URL | str): 请求地址
+
+        Returns:
+            Optional[httpx.Response]: 未命中或已过期时为 None
+        """
+        url = normalize_url(url)
+        key = self.key(endpoint, url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT e.status, e.headers, e.stored_at, b.codec, b.data FROM entries e "
+                "JOIN bodies b ON b.digest = e.digest WHERE e.key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or time.time() - row[2] > self.ttl.get(endpoint, 0):
+                self.misses += 1
+                return None
+            status, headers, _, codec, data = row
+            content = self._decompress(codec, data)
+            if content is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time_ns(), key))
+            self._conn.commit()
+            self.hits += 1
+        return httpx.Response(
+            status,
+            headers=json.loads(headers),
+            content=content,
+            request=httpx.Request("GET", url),
+            extensions={"from_cache": True},
+        )
+
+    def put(self, endpoint: str, response: httpx.Response) -> None:
+        """保存响应, 写入后超出上限的部分按 LRU 淘汰
+
+        Args:
+            endpoint (str): 接口名称, 不在 ttl 中的接口不保存
+            response (httpx.Response): 已经检查过的正常响应
+        """
+        if endpoint not in self.ttl or response.extensions.get("from_cache"):
+            return
+        url = normalize_url(response.request.url)
+        content = response.content
+        digest = hashlib.blake2b(content, digest_size=20).hexdigest()
+        headers = json.dumps({name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers})
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM bodies WHERE digest = ?", (digest,)).fetchone() is None:
+                data = self._compress(content)
+                self._conn.execute(
+                    "INSERT INTO bodies (digest, codec, data, size) VALUES (?, ?, ?, ?)",
+                    (digest, _CODEC, data, len(data)),
+                )
+                self._size += len(data)
+            key = self.key(endpoint, url)
+            previous = self._conn.execute("SELECT digest FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, endpoint, url, digest, status, headers, stored_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, url, digest, response.status_code, headers, time.time(), time.time_ns()),
+            )
+            if previous is not None and previous[0] != digest:
+                self._release([previous[0]])
+            self._evict()
+            self._conn.commit()
+            self.stores += 1
+
+    def _release(self, digests: list[str]) -> None:
+        """删除不再被任何条目引用的响应体(地址对应的内容更新或条目被淘汰后)"""
+        for digest in set(digests):
+            if self._conn.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone() is not None:
+                continue
+            row = self._conn.execute("SELECT size FROM bodies WHERE digest = ?", (digest,)).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM bodies WHERE digest = ?", (digest,))
+                self._size -= row[0]
+
+    def _delete_entries(self, rows: list[tuple[str, str]]) -> None:
+        """删除 (key, digest) 对应的条目, 并释放不再被引用的响应体"""
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+        self._release([digest for _, digest in rows])
+
+    def _evict(self) -> None:
+        """总大小超过 max_bytes 时, 从最久未使用的条目开始删除"""
+        while self._size > self.max_bytes:
+            rows = self._conn.execute("SELECT key, digest FROM entries ORDER BY last_used LIMIT 100").fetchall()
+            if not rows:
+                break
+            for row in rows:
+                self._delete_entries([row])
+                if self._size <= self.max_bytes:
+                    break
+
+    def clear_expired(self) -> int:
+        """删除已经过期的条目, 返回删除的条目数"""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for endpoint, ttl in self.ttl.items():
+                rows.extend(self._conn.execute(
+                    "SELECT key, digest FROM entries WHERE endpoint = ? AND stored_at < ?", (endpoint, now - ttl)
+                ).fetchall())
+            self._delete_entries(rows)
+            self._conn.commit()
+        return len(rows)
+
+    def report(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return (f"响应缓存命中 {self.hits} 次, 未命中 {self.misses} 次(命中率 {rate:.1f}%), "
+                f"写入 {self.stores} 次, 占用 {self._size / 1024 / 1024:.1f}MB")
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取进程内共享的响应缓存, [response_cache] 未启用时为 None"""
+    global _cache
+    if not response_cache_config.enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                response_cache_config.path,
+                max_bytes=response_cache_config.max_bytes,
+                ttl=response_cache_config.ttl,
+                level=response_cache_config.level,
+            )
+            logger.info(f"响应缓存 {response_cache_config.path}, 压缩方式 {_CODEC}")
+        return _cache
+
+
+__all__ = ["ResponseCache", "normalize_url", "get_response_cache"]
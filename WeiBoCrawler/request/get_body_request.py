@@ -1,5 +1,6 @@
 import httpx
 from .util import request_headers
+from .rate_limit import wait_for_token, wait_for_token_asyncio
 
 
 def build_body_params(id: str) -> tuple:
@@ -38,6 +39,7 @@ def get_body_response(id: str, *, client: httpx.Client) -> httpx.Response:
         httpx.Response: 返回的请求结果.
     """
     url, params, headers = build_body_params(id)
+    wait_for_token(url)
     response = client.get(url, params=params, headers=headers)
     return response
 
@@ -56,5 +58,6 @@ async def get_body_response_asyncio(id:str, *, client: httpx.AsyncClient) -> htt
         httpx.Response: 返回的请求结果.
     """
     url, params, headers = build_body_params(id)
+    await wait_for_token_asyncio(url)
     response = await client.get(url, params=params, headers=headers)
     return response
\ No newline at end of file
@@ -1,5 +1,6 @@
 import httpx
 from .util import request_headers
+from .rate_limit import wait_for_token, wait_for_token_asyncio
 from typing import Optional
 
 def build_comments_l1_params(uid: str, mid : str, *, max_id: Optional[str]=None) -> tuple:
@@ -81,6 +82,7 @@ def get_comments_l1_response(uid: str, mid : str, *, client: httpx.Client, max_i
         httpx.Response: 评论的响应
     """
     url, params, headers = build_comments_l1_params(uid, mid, max_id=max_id)       
+    wait_for_token(url)
     response = client.get(url, params=params, headers=headers)
     return response
 
@@ -98,6 +100,7 @@ async def get_comments_l1_response_asyncio(uid: str, mid : str, *, client: httpx
         httpx.Response: 评论的响应
     """
     url, params, headers = build_comments_l1_params(uid, mid, max_id=max_id)   
+    await wait_for_token_asyncio(url)
     response = await client.get(url, params=params, headers=headers)
     return response
 
@@ -115,6 +118,7 @@ def get_comments_l2_response(uid: str, mid : str, *, client: httpx.Client, max_i
         httpx.Response: 评论的响应
     """
     url, params, headers = build_comments_l2_params(uid, mid, max_id=max_id)
+    wait_for_token(url)
     response = client.get(url, params=params, headers=headers)
     return response
 
@@ -132,5 +136,6 @@ async def get_comments_l2_response_asyncio(uid: str, mid : str, *, client: httpx
         httpx.Response: 评论的响应
     """
     url, params, headers = build_comments_l2_params(uid, mid, max_id=max_id)
+    await wait_for_token_asyncio(url)
     response = await client.get(url, params=params, headers=headers)
     return response
\ No newline at end of file
@@ -1,5 +1,6 @@
 import httpx
 from .util import request_headers
+from .transport import build_client, get_client
 from PIL import Image
 from io import BytesIO
 import time
@@ -104,15 +105,16 @@ def get_login_final_response(client:httpx.Client, login_url:str) -> httpx.Respon
     return response
 
 
-def download_image(url:str, show:bool=False):
+def download_image(url:str, show:bool=False, client:httpx.Client | None=None):
     """下载并打开图片用来扫描
 
     Args:
         url (str): 二维码图片地址
         show (bool, optional): 是否显示图片. Defaults to False.
+        client (httpx.Client | None, optional): 会话客户端, 为 None 时使用共享客户端. Defaults to None.
     """
     try:
-        response = httpx.get(url)
+        response = (client or get_client()).get(url)
         response.raise_for_status()
         image_content = BytesIO(response.content)
         image = Image.open(image_content)
@@ -166,7 +168,8 @@ def get_qr_Info() -> list[Image.Image, httpx.Client, str, str]:
     Returns:
         list[Image.Image, httpx.Client, str, str]: 返回图片，会话客户端，登入验证 url，qr 的 id
     """
-    client = httpx.Client(follow_redirects=True)
+    # 登录用独立的 cookies, 不使用共享客户端
+    client = build_client(follow_redirects=True)
 
     login_signin_response = get_login_signin_response(client)
     login_signin_url = str(login_signin_response.url)
@@ -176,5 +179,5 @@ def get_qr_Info() -> list[Image.Image, httpx.Client, str, str]:
 
     qrid = qrcode_json_data.get("qrid")
     image_path = qrcode_json_data.get("image")
-    image = download_image(image_path)
+    image = download_image(image_path, client=client)
     return image, client, login_signin_url, qrid
\ No newline at end of file
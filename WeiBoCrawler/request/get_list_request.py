@@ -3,6 +3,7 @@ from copy import deepcopy
 from typing import Literal, Optional
 from datetime import datetime
 from .util import request_headers
+from .rate_limit import wait_for_token, wait_for_token_asyncio
 
 
 def build_list_params(search_for: str, page_index: int, *,  kind : Literal["综合", "实时", "高级"] = "综合", 
@@ -77,6 +78,7 @@ def get_list_response(search_for: str, page_index: int, *, client: httpx.Client,
         httpx.Response: 返回列表页响应
     """
     url, headers = build_list_params(search_for, page_index, kind=kind, advanced_kind=advanced_kind, time_start=time_start, time_end=time_end)
+    wait_for_token(url)
     response = client.get(url, headers=headers)
     return response
 
@@ -98,5 +100,6 @@ async def get_list_response_asyncio(search_for: str, page_index: int, *,  client
         httpx.Response: 返回列表页响应
     """
     url, headers = build_list_params(search_for, page_index, kind=kind, advanced_kind=advanced_kind, time_start=time_start, time_end=time_end)
+    await wait_for_token_asyncio(url)
     response = await client.get(url, headers=headers)
     return response
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from ..util import logging, rate_limit_config
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """令牌桶限速器, 同一 host 的同步/异步请求、所有下载器共享一个
+
+    acquire 时先预订一个令牌, 令牌不足则计算需要等待的时间再睡眠, 所以不依赖具体的事件循环,
+    线程和多次 asyncio.run 之间都可以共用.
+    失败响应使速率乘性下降(冷却期内只降一次), 之后每个成功响应逐步恢复到配置的速率.
+
+    Attributes:
+        host (str): 限速的 host
+        rate (float): 当前每秒令牌数
+        target_rate (float): 配置的速率, 恢复的上限
+        burst (int): 桶容量
+    """
+
+    def __init__(self, host: str, *, rate: float, burst: int):
+        self.host = host
+        self.rate = rate
+        self.target_rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._last_backoff = float("-inf")
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self) -> float:
+        """预订一个令牌, 返回需要等待的秒数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_asyncio(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def report(self, success: bool) -> None:
+        """根据响应结果调整速率"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if success:
+                self.rate = min(self.target_rate, self.rate + self.target_rate * rate_limit_config.recovery)
+                return
+            if now - self._last_backoff < rate_limit_config.cooldown:
+                return
+            old_rate = self.rate
+            self.rate = max(rate_limit_config.min_rate, self.rate * rate_limit_config.backoff_factor)
+            # 清空积攒的令牌, 退避立即生效而不是先把桶里的突发额度用完
+            self._tokens = min(self._tokens, 0.0)
+            self._last_backoff = now
+        logger.warning(f"{self.host} 出现失败响应, 请求速率 {old_rate:.2f}/s -> {self.rate:.2f}/s")
+
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_token_bucket(host: str) -> TokenBucket:
+    """获取 host 对应的令牌桶, 进程内唯一"""
+    with _buckets_lock:
+        if host not in _buckets:
+            limit = rate_limit_config.hosts.get(host, rate_limit_config.default)
+            _buckets[host] = TokenBucket(host, rate=limit.rate, burst=limit.burst)
+        return _buckets[host]
+
+
+def wait_for_token(url: httpx.URL | str) -> None:
+    """请求 url 之前调用, 按 host 限速"""
+    get_token_bucket(httpx.URL(url).host).acquire()
+
+
+async def wait_for_token_asyncio(url: httpx.URL | str) -> None:
+    """请求 url 之前调用, 按 host 限速(异步)"""
+    await get_token_bucket(httpx.URL(url).host).acquire_asyncio()
+
+
+def report_response(response: httpx.Response, success: bool) -> None:
+    """把响应检查的结果反馈给对应 host 的令牌桶"""
+    get_token_bucket(response.request.url.host).report(success)
+
+
+__all__ = ["TokenBucket", "get_token_bucket", "wait_for_token", "wait_for_token_asyncio", "report_response"]
@@ -0,0 +1,243 @@
+import asyncio
+import importlib.util
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+from ..util import cookies_config, logging, transport_config
+
+
+logger = logging.getLogger(__name__)
+
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+if transport_config.http2 and not _HTTP2_AVAILABLE:
+    logger.info("未安装 h2, 使用 HTTP/1.1, 需要 HTTP/2 时执行 pip install httpx[http2]")
+
+
+class RequestTiming:
+    """单个请求各阶段的耗时(秒), 由 httpcore 的 trace 扩展记录
+
+    复用 keep-alive 连接(或 HTTP/2 连接上的新 stream)时没有建连和 TLS 阶段, connect / tls 为 None.
+
+    Attributes:
+        host (str): 请求的 host
+        connect (Optional[float]): 建立 TCP 连接耗时
+        tls (Optional[float]): TLS 握手耗时
+        ttfb (Optional[float]): 从发送请求头到收到响应头的耗时
+        download (Optional[float]): 读取响应体的耗时
+        http_version (str): http11 / http2
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.connect: Optional[float] = None
+        self.tls: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.download: Optional[float] = None
+        self.http_version = ""
+        self._started: dict[str, float] = {}
+
+    @property
+    def reused(self) -> bool:
+        return self.connect is None
+
+    def on_event(self, name: str, info: dict) -> None:
+        """处理 "connection.connect_tcp.started", "http2.receive_response_body.complete" 这样的 trace 事件"""
+        now = time.perf_counter()
+        prefix, _, event = name.partition(".")
+        step, _, phase = event.rpartition(".")
+        if phase == "started":
+            self._started[step] = now
+            return
+        if phase != "complete" or step not in self._started:
+            return
+        if step == "connect_tcp":
+            self.connect = now - self._started[step]
+        elif step == "start_tls":
+            self.tls = now - self._started[step]
+        elif step == "receive_response_headers" and "send_request_headers" in self._started:
+            self.ttfb = now - self._started["send_request_headers"]
+            self.http_version = prefix
+        elif step == "receive_response_body":
+            self.download = now - self._started[step]
+            transport_stats.record(self)
+
+
+class _HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.reused = 0
+        self.http2 = 0
+        self.connect = 0.0
+        self.tls = 0.0
+        self.ttfb = 0.0
+        self.download = 0.0
+        self.max_ttfb = 0.0
+
+
+class TransportStats:
+    """按 host 汇总请求耗时, 进程内唯一(transport_stats), 同步 / 异步客户端共用"""
+
+    def __init__(self):
+        self._hosts: dict[str, _HostStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, timing: RequestTiming) -> None:
+        with self._lock:
+            stats = self._hosts.setdefault(timing.host, _HostStats())
+            stats.requests += 1
+            stats.reused += timing.reused
+            stats.http2 += timing.http_version == "http2"
+            stats.connect += timing.connect or 0.0
+            stats.tls += timing.tls or 0.0
+            stats.ttfb += timing.ttfb or 0.0
+            stats.download += timing.download or 0.0
+            stats.max_ttfb = max(stats.max_ttfb, timing.ttfb or 0.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hosts.clear()
+
+    def report(self) -> str:
+        """每个 host 一行: 请求数, 复用连接比例, 以及各阶段平均耗时(建连和 TLS 按新建的连接平均)"""
+        lines = []
+        with self._lock:
+            for host, stats in sorted(self._hosts.items()):
+                new = stats.requests - stats.reused
+                connect = stats.connect / new * 1000 if new else 0.0
+                tls = stats.tls / new * 1000 if new else 0.0
+                lines.append(
+                    f"{host}: 请求 {stats.requests} 次(复用连接 {stats.reused}, HTTP/2 {stats.http2}), "
+                    f"建连 {connect:.1f}ms, TLS {tls:.1f}ms, "
+                    f"首字节 {stats.ttfb / stats.requests * 1000:.1f}ms(最大 {stats.max_ttfb * 1000:.1f}ms), "
+                    f"下载 {stats.download / stats.requests * 1000:.1f}ms"
+                )
+        return "\n".join(lines)
+
+
+transport_stats = TransportStats()
+
+
+def get_request_timing(response: httpx.Response) -> Optional[RequestTiming]:
+    """获取响应对应请求的耗时, 未开启 timing 或请求不是由本模块创建的客户端发出时为 None"""
+    return response.request.extensions.get("timing")
+
+
+def _trace_request(request: httpx.Request) -> None:
+    timing = RequestTiming(request.url.host)
+    request.extensions["timing"] = timing
+    request.extensions["trace"] = timing.on_event
+
+
+async def _trace_request_asyncio(request: httpx.Request) -> None:
+    timing = RequestTiming(request.url.host)
+
+    async def trace(name: str, info: dict) -> None:
+        timing.on_event(name, info)
+
+    request.extensions["timing"] = timing
+    request.extensions["trace"] = trace
+
+
+def _client_kwargs(asynchrony: bool) -> dict:
+    """连接池参数和按 host 挂载的 HTTP/2 transport
+
+    Accept-Encoding 由 httpx 按已安装的解码器生成: 默认 gzip, deflate, 安装 brotli / zstandard 后加上 br / zstd.
+    """
+    transport_class = httpx.AsyncHTTPTransport if asynchrony else httpx.HTTPTransport
+    limits = httpx.Limits(
+        max_connections=transport_config.max_connections,
+        max_keepalive_connections=transport_config.max_keepalive_connections,
+        keepalive_expiry=transport_config.keepalive_expiry,
+    )
+    kwargs = dict(limits=limits, timeout=transport_config.timeout)
+    if transport_config.http2 and _HTTP2_AVAILABLE:
+        kwargs["mounts"] = {
+            f"https://{host}": transport_class(http2=True, limits=limits)
+            for host in transport_config.http2_hosts
+        }
+    if transport_config.timing:
+        kwargs["event_hooks"] = {"request": [_trace_request_asyncio if asynchrony else _trace_request]}
+    return kwargs
+
+
+def build_client(**kwargs) -> httpx.Client:
+    """按 [transport] 配置创建同步客户端, 调用方负责关闭; kwargs 传给 httpx.Client, 例如 cookies / follow_redirects"""
+    return httpx.Client(**{**_client_kwargs(asynchrony=False), **kwargs})
+
+
+def build_async_client(**kwargs) -> httpx.AsyncClient:
+    """按 [transport] 配置创建异步客户端, 调用方负责关闭; kwargs 传给 httpx.AsyncClient"""
+    return httpx.AsyncClient(**{**_client_kwargs(asynchrony=True), **kwargs})
+
+
+def _refresh_cookies(client: httpx.Client | httpx.AsyncClient, snapshot: dict) -> None:
+    """扫码登录后 cookies_config.cookies 会被原地更新, 共享客户端随之更新 cookies"""
+    if snapshot != cookies_config.cookies:
+        client.cookies.update(cookies_config.cookies)
+        snapshot.clear()
+        snapshot.update(cookies_config.cookies)
+
+
+_client: Optional[httpx.Client] = None
+_client_cookies: dict = {}
+_client_lock = threading.Lock()
+
+
+def get_client() -> httpx.Client:
+    """进程内共享的同步客户端, 所有同步下载器复用同一个连接池, 不要关闭它"""
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = build_client()
+            _client_cookies.clear()
+        _refresh_cookies(_client, _client_cookies)
+        return _client
+
+
+class _SharedAsyncClient:
+    def __init__(self):
+        self.client = build_async_client()
+        self.cookies: dict = {}
+        self.users = 0
+
+
+# httpx.AsyncClient 的连接绑定在创建它的事件循环上, download() 每次用 asyncio.run 新建事件循环, 所以按循环区分
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _SharedAsyncClient]" = weakref.WeakKeyDictionary()
+
+
+@asynccontextmanager
+async def shared_async_client():
+    """同一事件循环中同时运行的下载器(例如流水线的各个阶段)共用一个异步客户端和连接池,
+    最后一个使用者退出时关闭客户端
+
+    Yields:
+        httpx.AsyncClient: 共享的异步客户端
+    """
+    loop = asyncio.get_running_loop()
+    shared = _async_clients.get(loop)
+    if shared is None or shared.client.is_closed:
+        shared = _async_clients[loop] = _SharedAsyncClient()
+    _refresh_cookies(shared.client, shared.cookies)
+    shared.users += 1
+    try:
+        yield shared.client
+    finally:
+        shared.users -= 1
+        if shared.users == 0:
+            await shared.client.aclose()
+
+
+__all__ = [
+    "RequestTiming",
+    "TransportStats",
+    "transport_stats",
+    "get_request_timing",
+    "build_client",
+    "build_async_client",
+    "get_client",
+    "shared_async_client",
+]
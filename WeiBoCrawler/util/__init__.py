@@ -2,9 +2,32 @@ from .path import config_path
 from .log import logging
 from .database import database_config
 from .cookie import cookies_config
-from .decorator import log_function_params, retry_timeout_decorator, retry_timeout_decorator_asyncio, custom_validate_call
-from .custom import CustomProgress, RequestHeaders
-from .process import process_time_str, process_base_document, process_base_documents
+from .rate_limit import rate_limit_config
+from .offload import parse_offload_config
+from .transport import transport_config
+from .cache import response_cache_config
+from .lazy import lazy_exports
+
+# 以下名称依赖 httpx / rich / pandas, 第一次访问时才导入对应模块
+_LAZY_ATTRS = {
+    "log_function_params": ".decorator",
+    "retry_timeout_decorator": ".decorator",
+    "retry_timeout_decorator_asyncio": ".decorator",
+    "custom_validate_call": ".decorator",
+
+    "CustomProgress": ".custom",
+    "RequestHeaders": ".custom",
+
+    "process_time_str": ".process",
+    "process_time_series": ".process",
+    "frozen_now": ".process",
+    "reference_now": ".process",
+    "process_base_document": ".process",
+    "process_base_documents": ".process",
+    "drop_documents_duplicates": ".process",
+    "compile_transform": ".process",
+    "TransformPlan": ".process",
+}
 
 __all__ = [
     "logging",
@@ -13,6 +36,10 @@ __all__ = [
 
     "database_config", 
     "cookies_config",
+    "rate_limit_config",
+    "parse_offload_config",
+    "transport_config",
+    "response_cache_config",
     
     "log_function_params",
     "retry_timeout_decorator",
@@ -23,6 +50,15 @@ __all__ = [
     "RequestHeaders",
 
     "process_time_str",
+    "process_time_series",
+    "frozen_now",
+    "reference_now",
     "process_base_document",
     "process_base_documents",
-]
\ No newline at end of file
+    "drop_documents_duplicates",
+    "compile_transform",
+    "TransformPlan",
+]
+
+
+__getattr__, __dir__ = lazy_exports(globals(), _LAZY_ATTRS)
@@ -0,0 +1,33 @@
+import toml
+from pathlib import Path
+from pydantic import BaseModel, Field, field_validator
+from .path import module_path, config_path
+
+
+class ResponseCacheConfig(BaseModel):
+    """[response_cache]: 列表页 / 详细页响应的本地 SQLite 缓存, 默认关闭, 调试解析或重复抓取同一关键词时打开
+
+    Attributes:
+        enabled (bool): 是否启用, 启用后列表页 / 详细页下载前先查缓存
+        path (str): SQLite 文件路径, 相对路径相对于 WeiBoCrawler 目录
+        max_bytes (int): 压缩后响应体的总大小上限, 超过时按最近使用时间(LRU)淘汰
+        ttl (dict[str, float]): 各接口缓存的有效秒数, 不在其中的接口不缓存
+        level (int): 压缩级别
+    """
+    enabled: bool = False
+    path: str = "./cache/responses.db"
+    max_bytes: int = Field(default=256 * 1024 * 1024, ge=0)
+    ttl: dict[str, float] = {
+        "list": 600,
+        "body": 3600,
+    }
+    level: int = Field(default=3, ge=1)
+
+    @field_validator("path")
+    def modify_module_path(cls, value):
+        if Path(value).is_absolute():
+            return str(value)
+        return str(module_path / value)
+
+
+response_cache_config = ResponseCacheConfig.model_validate(toml.load(config_path).get("response_cache", {}))
@@ -12,6 +12,10 @@ class DatabaseConfig(BaseModel):
     mongo_uri: str
     db_name: str
 
+    # 按唯一键(微博: mid + search_for + record_from, 评论: f_mid + mid + search_for) upsert 写入并建唯一索引,
+    # 重复抓取不会产生重复文档; False 时直接 insert_many
+    upsert: bool = Field(default=False)
+
     @field_validator('path')
     def modify_module_path(cls, value):
         if value is None:  # 允许 path 为 None
@@ -0,0 +1,30 @@
+import importlib
+from typing import Callable
+
+
+def lazy_exports(namespace: dict, attrs: dict[str, str]) -> tuple[Callable[[str], object], Callable[[], list[str]]]:
+    """生成包的 __getattr__ / __dir__, 让 attrs 中的名称在第一次访问时才导入对应模块
+
+    用法(在包的 __init__.py 中):
+        __getattr__, __dir__ = lazy_exports(globals(), _LAZY_ATTRS)
+
+    Args:
+        namespace (dict): 包的 globals(), 导入后的值缓存在这里, 之后的访问不再经过 __getattr__
+        attrs (dict[str, str]): 名称 -> 模块, 模块可以是相对于该包的 ".process" 或者绝对的 "WeiBoCrawler.pack"
+
+    Returns:
+        tuple[Callable[[str], object], Callable[[], list[str]]]: 模块级的 __getattr__ 和 __dir__
+    """
+    package = namespace["__name__"]
+
+    def __getattr__(name: str) -> object:
+        if name in attrs:
+            value = getattr(importlib.import_module(attrs[name], package), name)
+            namespace[name] = value
+            return value
+        raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+    def __dir__() -> list[str]:
+        return sorted(set(namespace) | set(namespace.get("__all__", ())))
+
+    return __getattr__, __dir__
@@ -0,0 +1,27 @@
+import toml
+from typing import Literal
+from pydantic import BaseModel, Field
+from .path import config_path
+
+
+class ParseOffloadConfig(BaseModel):
+    """[parse_offload]: 异步下载时各接口响应在哪里解析, 避免解析 html 占住事件循环
+
+    Attributes:
+        modes (dict[str, Literal["inline", "thread", "process"]]): 各接口的解析方式, inline 在事件循环中直接解析,
+            thread / process 交给线程池 / 进程池. 列表页解析 html 最耗 CPU, 默认用线程池, 不阻塞事件循环;
+            桥接脚本每个请求都是新进程, 进程池(Windows 上是 spawn)启动和重新 import 的开销远超 50 页的解析,
+            所以 process 只建议长时间运行的抓取(例如流水线)在配置中打开. 其余接口只是解析 json, 默认直接解析
+        workers (int): 进程池 / 线程池的大小, 0 表示使用 CPU 核数
+        max_pending (int): 每个接口同时交给池子的解析任务数上限, 超过时等待, 0 表示 workers 的 2 倍
+    """
+    modes: dict[str, Literal["inline", "thread", "process"]] = {
+        "list": "thread",
+        "body": "inline",
+        "buildComments": "inline",
+    }
+    workers: int = Field(default=0, ge=0)
+    max_pending: int = Field(default=0, ge=0)
+
+
+parse_offload_config = ParseOffloadConfig.model_validate(toml.load(config_path).get("parse_offload", {}))
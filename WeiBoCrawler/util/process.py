@@ -1,69 +1,263 @@
+import json
 import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from operator import itemgetter
+from typing import Callable, Iterable, Optional, Union
 from datetime import datetime, timedelta
 import pandas as pd
 
 
-def process_time_str(time_str:str) -> datetime:
+# 一次匹配微博时间字段的所有写法: 刚刚 / N秒前 / N分钟前 / N小时前 / 今天 / 昨天 / 前天 / M月D日 / YYYY年M月D日, 后面可以跟 HH:MM
+_TIME_RE = re.compile(
+    r"(?=\d|刚刚|今天|昨天|前天)"
+    r"(?:(?P<ago>\d+)\s*(?P<unit>秒|分钟|小时)前"
+    r"|(?P<relative>刚刚|今天|昨天|前天)"
+    r"|(?:(?P<year>\d{4})年)?(?P<month>\d{1,2})月(?P<day>\d{1,2})日)?"
+    r"\s*(?:(?P<hour>\d{1,2}):(?P<minute>\d{1,2}))?"
+)
+_AGO_UNITS = {"分钟": "minutes", "小时": "hours"}
+_RELATIVE_DAYS = {"刚刚": 0, "今天": 0, "昨天": 1, "前天": 2}
+
+_reference_now: ContextVar[Optional[datetime]] = ContextVar("reference_now", default=None)
+
+
+@contextmanager
+def frozen_now(now: Optional[datetime] = None):
+    """在 with 块内把 process_time_str 的"当前时间"固定为 now,
+    同一批数据中的相对时间(N分钟前, 昨天)以同一时刻为基准, 也能命中缓存
+
+    now 为 None 时沿用外层已经固定的时间, 外层没有固定时取进入时的时间; 所以下载器在整次抓取外面固定一次,
+    各页解析时的 frozen_now() 都继承这个时间.
+
+    Args:
+        now (Optional[datetime]): 基准时间. Defaults to None.
+    """
+    now = now or _reference_now.get() or datetime.now()
+    token = _reference_now.set(now.replace(second=0, microsecond=0))
+    try:
+        yield
+    finally:
+        _reference_now.reset(token)
+
+
+def reference_now() -> Optional[datetime]:
+    """当前 frozen_now 固定的时间, 没有固定时为 None
+
+    ContextVar 不会传到线程池 / 进程池里, 把解析交给池子时用它取出时间再作为参数传过去.
+    """
+    return _reference_now.get()
+
+
+@lru_cache(maxsize=4096)
+def _parse_time_str(time_str: str, now: datetime) -> datetime:
+    match = _TIME_RE.search(time_str)
+    if match is None:
+        return now
+
+    if match["ago"] is not None:
+        if match["unit"] == "秒":
+            # 结果精确到分钟, N秒前按当前分钟算
+            return now
+        return now - timedelta(**{_AGO_UNITS[match["unit"]]: int(match["ago"])})
+
+    if match["month"] is not None:
+        year = int(match["year"]) if match["year"] is not None else now.year
+        result = now.replace(year=year, month=int(match["month"]), day=int(match["day"]))
+    else:
+        result = now - timedelta(days=_RELATIVE_DAYS.get(match["relative"], 0))
+
+    if match["hour"] is not None:
+        result = result.replace(hour=int(match["hour"]), minute=int(match["minute"]))
+    return result
+
+
+def process_time_str(time_str:str, now: Optional[datetime] = None) -> datetime:
     """这段代码是用来解析微博的时间字段的
          1. 处理 年、月、日、时、分
-         2. 处理 分钟前，小时前，这里不处理秒前
+         2. 处理 刚刚, 秒前, 分钟前, 小时前, 今天, 昨天, 前天
+
+    缺少的部分取当前时间, 结果精确到分钟. 当前时间依次取参数 now, frozen_now 固定的时间, datetime.now();
+    相同的 (字段, 当前分钟) 只解析一次.
 
     Args:
         time_str (str): 微博时间字段
+        now (Optional[datetime]): 当前时间. Defaults to None.
 
     Returns:
         datatime: 返回时间字段
     """
-    datetime_now = datetime.now()
-
-    if "年" in time_str:
-        year = re.search(r"(\d{4})年", time_str).group(1)
-    else:
-        year = datetime_now.year
-    if "月" in time_str:
-        month = re.search(r"(\d{1,2})月", time_str).group(1)
-    else:
-        month = datetime_now.month
-    if "日" in time_str:
-        day = re.search(r"(\d{1,2})日", time_str).group(1)
-    else:
-        day = datetime_now.day
-    if ":" in time_str:
-        hour = re.search(r"(\d{1,2}):", time_str).group(1)
-        minute = re.search(r":(\d{1,2})", time_str).group(1)
+    if now is None:
+        # frozen_now 中保存的已经是精确到分钟的时间
+        now = _reference_now.get() or datetime.now().replace(second=0, microsecond=0)
     else:
-        hour = datetime_now.hour
-        minute = datetime_now.minute
+        now = now.replace(second=0, microsecond=0)
+    return _parse_time_str(time_str, now)
 
-    datetime_now = datetime(int(year), int(month), int(day), int(hour), int(minute))
 
-    if "分钟前" in time_str:
-        minute_before = re.search(r"(\d+)分钟前", time_str).group(1)
-        datetime_now = datetime_now - timedelta(minutes=int(minute_before))
-    if "小时前" in time_str:
-        hour_before = re.search(r"(\d+)小时前", time_str).group(1)
-        datetime_now = datetime_now - timedelta(hours=int(hour_before))
+def process_time_series(series: pd.Series, now: Optional[datetime] = None) -> pd.Series:
+    """process_time_str 的向量化版本, 整列只解析不重复的值, 空值得到 NaT
 
-    return datetime_now
+    Args:
+        series (pd.Series): 微博时间字段组成的列
+        now (Optional[datetime]): 当前时间, 整列共用. Defaults to None.
+
+    Returns:
+        pd.Series: datetime64 类型的列, 索引与 series 相同
+    """
+    now = now or _reference_now.get() or datetime.now()
+    codes, uniques = pd.factorize(series)
+    parsed = pd.DatetimeIndex([process_time_str(value, now) for value in uniques])
+    return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT), index=series.index, name=series.name)
 
 
 
-def drop_documents_duplicates(documents: list[dict]) -> None:
-    """dict 列表去重
-    这里暂时使用最简单的列表去重法, 后续可以考虑使用 hash 去重等方法优化..
+def drop_documents_duplicates(documents: Iterable[dict], key: Optional[str] = None) -> list[dict]:
+    """dict 列表去重, 保留第一次出现的文档
+
+    按 key 字段的值去重, 没有 key 时按整个文档(排序键后的 json)去重; 用集合判断是否出现过, 整体 O(n).
 
     Args:
-        list[dict]: 去重后的表
+        documents (Iterable[dict]): 文档列表
+        key (Optional[str]): 去重依据的字段, 例如 "mid". 该字段为 None 的文档都会保留. Defaults to None.
+
+    Returns:
+        list[dict]: 去重后的文档列表
     """
-    unique_document = []
+    seen = set()
+    unique_documents = []
     for document in documents:
-        if document not in unique_document:
-            unique_document.append(document)
-    
-    return unique_document
+        if key is None:
+            marker = json.dumps(document, sort_keys=True, ensure_ascii=False, default=str)
+        else:
+            marker = document.get(key)
+            if marker is None:
+                unique_documents.append(document)
+                continue
+        if marker not in seen:
+            seen.add(marker)
+            unique_documents.append(document)
+    return unique_documents
 
 
-def process_base_document(document: dict, transform_dict: dict) -> dict:
+def _compile_node(node: dict) -> tuple[Callable[[dict], tuple], list[tuple[str, ...]]]:
+    """把前缀树的一个节点编译成闭包, 闭包返回整棵子树中各个路径的值
+
+    node 的结构为 {key: 子节点}. 这一层的 key 用 map(value.get, keys) 一次取出, 值不为 None 的子节点再递归取出,
+    值为 None 时整棵子树都为 None.
+
+    Returns:
+        tuple[Callable[[dict], tuple], list[tuple[str, ...]]]: 闭包, 以及闭包返回值中每一项对应的路径(相对于 node)
+    """
+    keys = tuple(node)
+    paths = [(key,) for key in keys]
+    branches = []
+    for index, key in enumerate(keys):
+        if node[key]:
+            child, child_paths = _compile_node(node[key])
+            branches.append((index, child, (None,) * len(child_paths)))
+            paths.extend((key, *path) for path in child_paths)
+
+    if not branches:
+        def extract(value: dict) -> tuple:
+            return tuple(map(value.get, keys))
+    else:
+        def extract(value: dict) -> tuple:
+            values = tuple(map(value.get, keys))
+            for index, child, empty in branches:
+                item = values[index]
+                values += empty if item is None else child(item)
+            return values
+
+    return extract, paths
+
+
+def _compile_row_function(paths: list[list[str]]) -> Callable[[dict], tuple]:
+    """生成一个取出所有字段的函数, 公共前缀(例如 ["user", ...])只取一次
+
+    对应 process_base_document 原来的语义: 路径中间的值为 None 时整个字段为 None.
+    前缀树按 key 首次出现的顺序取值, 最后用 itemgetter 调整成 paths 的顺序; paths 为空时返回空 tuple.
+    """
+    root: dict = {}
+    for path in paths:
+        node = root
+        for key in path:
+            node = node.setdefault(key, {})
+    extract, extracted = _compile_node(root)
+    positions = [extracted.index(tuple(path)) for path in paths]
+    if positions == list(range(len(extracted))):
+        return extract
+    if len(positions) == 0:
+        return lambda document: ()
+    if len(positions) == 1:
+        (position,) = positions
+        return lambda document: (extract(document)[position],)
+    reorder = itemgetter(*positions)
+    return lambda document: reorder(extract(document))
+
+
+class TransformPlan:
+    """由 transform_dict 编译得到的字段提取计划: 生成一个一次取出所有字段的函数, 不再逐个文档解释 transform_dict
+
+    Attributes:
+        columns (list[str]): 转化后的字段名, 与 transform_dict 的 key 顺序相同
+    """
+
+    def __init__(self, transform_dict: dict):
+        self.columns = list(transform_dict)
+        paths = [[path] if isinstance(path, str) else list(path) for path in transform_dict.values()]
+        self._row = _compile_row_function(paths)
+
+    def extract(self, document: dict) -> dict:
+        """提取单个文档的字段, 同 process_base_document"""
+        return dict(zip(self.columns, self._row(document)))
+
+    def to_frame(self, documents: Iterable[dict], *, key: Optional[str] = "mid") -> pd.DataFrame:
+        """提取所有文档的字段后一次构造 DataFrame, 并按 key 列去重(保留第一次出现的行)
+
+        Args:
+            documents (Iterable[dict]): 文档列表, 也可以是生成器
+            key (Optional[str]): 去重依据的列, 为 None 或不在 columns 中时不去重; 该列为 None 的行都会保留. Defaults to "mid".
+
+        Returns:
+            pd.DataFrame: 列顺序与 columns 相同的表格
+        """
+        row = self._row
+        if key not in self.columns:
+            rows = [row(document) for document in documents]
+        else:
+            key_index = self.columns.index(key)
+            seen = set()
+            rows = []
+            for document in documents:
+                values = row(document)
+                marker = values[key_index]
+                if marker is not None:
+                    if marker in seen:
+                        continue
+                    seen.add(marker)
+                rows.append(values)
+        return pd.DataFrame.from_records(rows, columns=self.columns)
+
+
+def _freeze(transform_dict: dict) -> tuple:
+    return tuple((column, path if isinstance(path, str) else tuple(path)) for column, path in transform_dict.items())
+
+
+@lru_cache(maxsize=64)
+def _compile_frozen(frozen: tuple) -> TransformPlan:
+    return TransformPlan({column: path if isinstance(path, str) else list(path) for column, path in frozen})
+
+
+def compile_transform(transform_dict: Union[dict, TransformPlan]) -> TransformPlan:
+    """把 transform_dict 编译成 TransformPlan, 相同的 transform_dict 只编译一次"""
+    if isinstance(transform_dict, TransformPlan):
+        return transform_dict
+    return _compile_frozen(_freeze(transform_dict))
+
+
+def process_base_document(document: dict, transform_dict: Union[dict, TransformPlan]) -> dict:
     """将 document 处理成字典的形式
 
     transform_dict = {
@@ -75,29 +269,15 @@ def process_base_document(document: dict, transform_dict: dict) -> dict:
 
     Args:
         document (dict): 文档
-        transform_dict (dict): 转换字典, key 是转化后的字段, value 是原始字段
+        transform_dict (Union[dict, TransformPlan]): 转换字典, key 是转化后的字段, value 是原始字段; 也可以是编译好的 TransformPlan
 
     Returns:
         dict: 处理后的字典
     """
-    item = {}
-
-    for key, value in transform_dict.items():
-        if isinstance(value, str):
-            final_value = document.get(value, None)
-
-        elif isinstance(value, list):
-            final_value = document
-            for v in value:
-                if final_value is None:
-                    break
-                final_value = final_value.get(v, None)
-
-        item[key] = final_value
-    return item
+    return compile_transform(transform_dict).extract(document)
 
 
-def process_base_documents(documents: list[dict], transform_dict: dict) -> pd.DataFrame:
+def process_base_documents(documents: Iterable[dict], transform_dict: Union[dict, TransformPlan], *, key: Optional[str] = "mid") -> pd.DataFrame:
     """将 documents 处理成 dataframe 的形式
     
     transform_dict = {
@@ -108,13 +288,11 @@ def process_base_documents(documents: list[dict], transform_dict: dict) -> pd.Da
         }
 
     Args:
-        documents (list[dict]): 文档列表
-        transform_dict (dict): 转换字典, key 是转化后的字段, value 是原始字段
+        documents (Iterable[dict]): 文档列表, 也可以是生成器(只遍历一次, 原始文档用完即可释放)
+        transform_dict (Union[dict, TransformPlan]): 转换字典, key 是转化后的字段, value 是原始字段; 也可以是编译好的 TransformPlan
+        key (Optional[str]): 去重依据的列. Defaults to "mid".
 
     Returns:
-        pd.DataFrame: (去重)处理后得到的表格
+        pd.DataFrame: (按 key 去重)处理后得到的表格
     """
-    items = [process_base_document(document, transform_dict) for document in documents]
-    df = pd.DataFrame(items)
-    df.drop_duplicates(inplace=True)
-    return df
\ No newline at end of file
+    return compile_transform(transform_dict).to_frame(documents, key=key)
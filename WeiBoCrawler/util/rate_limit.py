@@ -0,0 +1,39 @@
+import toml
+from pydantic import BaseModel, Field
+from .path import config_path
+
+
+class HostRateLimit(BaseModel):
+    """单个 host 的令牌桶参数
+
+    Attributes:
+        rate (float): 每秒补充的令牌数, 即持续请求速率上限
+        burst (int): 桶容量, 允许的瞬时突发请求数
+    """
+    rate: float = Field(gt=0)
+    burst: int = Field(ge=1)
+
+
+class RateLimitConfig(BaseModel):
+    """[rate_limit]: 按 host 的令牌桶限速; 下载器报告失败响应时按 backoff_factor 降速, 之后随成功响应逐步恢复
+
+    Attributes:
+        default (HostRateLimit): 未单独配置的 host 使用的参数
+        hosts (dict[str, HostRateLimit]): 按 host 配置的参数
+        min_rate (float): 退避后速率的下限
+        backoff_factor (float): 检测到失败响应时速率乘以该系数
+        recovery (float): 每个成功响应把速率恢复 rate * recovery, 直到配置的速率
+        cooldown (float): 两次退避之间至少间隔的秒数, 避免同一波失败把速率连续减半
+    """
+    default: HostRateLimit = HostRateLimit(rate=5, burst=5)
+    hosts: dict[str, HostRateLimit] = {
+        "s.weibo.com": HostRateLimit(rate=2, burst=4),
+        "weibo.com": HostRateLimit(rate=8, burst=8),
+    }
+    min_rate: float = Field(default=0.2, gt=0)
+    backoff_factor: float = Field(default=0.5, gt=0, lt=1)
+    recovery: float = Field(default=0.02, gt=0)
+    cooldown: float = Field(default=2.0, ge=0)
+
+
+rate_limit_config = RateLimitConfig.model_validate(toml.load(config_path).get("rate_limit", {}))
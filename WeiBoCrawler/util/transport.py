@@ -0,0 +1,27 @@
+import toml
+from pydantic import BaseModel, Field
+from .path import config_path
+
+
+class TransportConfig(BaseModel):
+    """[transport]: 共享客户端的连接池大小、keep-alive、超时和 HTTP/2, 以及是否记录请求各阶段耗时
+
+    Attributes:
+        max_connections (int): 每个连接池的最大连接数
+        max_keepalive_connections (int): 每个连接池保留的空闲 keep-alive 连接数
+        keepalive_expiry (float): 空闲连接保留的秒数
+        timeout (float): 连接 / 读 / 写 / 等待连接池的超时秒数
+        http2 (bool): 对 http2_hosts 使用 HTTP/2 多路复用, 需要安装 h2(pip install httpx[http2]), 未安装时使用 HTTP/1.1
+        http2_hosts (list[str]): 使用 HTTP/2 的 host
+        timing (bool): 是否记录每个请求的连接 / TLS / 首字节 / 下载耗时
+    """
+    max_connections: int = Field(default=100, ge=1)
+    max_keepalive_connections: int = Field(default=20, ge=0)
+    keepalive_expiry: float = Field(default=30.0, ge=0)
+    timeout: float = Field(default=5.0, gt=0)
+    http2: bool = True
+    http2_hosts: list[str] = ["weibo.com", "s.weibo.com"]
+    timing: bool = True
+
+
+transport_config = TransportConfig.model_validate(toml.load(config_path).get("transport", {}))
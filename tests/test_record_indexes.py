@@ -0,0 +1,90 @@
+"""检查 sync_find_by_* 使用的查询条件能用上 RECORD_INDEXES 中声明的索引
+
+需要一个可以连接的 MongoDB(默认使用 config.toml 中的 mongo_uri, 可以用环境变量 MONGO_URI 覆盖),
+连接不上时跳过. 测试在临时数据库中进行, 结束后删除.
+
+    python -m unittest tests.test_record_indexes
+"""
+import os
+import sys
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from WeiBoCrawler.database.mongo import (BodyRecord, Comment1Record, MongoDBManager, RecordFrom, RECORD_INDEXES,
+                                         build_record_query, winning_index)
+from WeiBoCrawler.util import database_config
+
+
+def _index_name(record_type: type, keys: tuple[str, ...]) -> str:
+    """RECORD_INDEXES 中 keys 对应的 IndexSpec.name"""
+    return next(spec.name for spec in RECORD_INDEXES[record_type] if spec.keys == keys)
+
+
+class RecordIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from pymongo import MongoClient
+        from pymongo.errors import PyMongoError
+
+        uri = os.environ.get("MONGO_URI", database_config.mongo_uri)
+        client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+        try:
+            client.admin.command("ping")
+        except PyMongoError as e:
+            client.close()
+            raise unittest.SkipTest(f"MongoDB 不可用: {e}")
+
+        cls.db = MongoDBManager(uri, uri, f"weiboData_test_{uuid.uuid4().hex[:8]}", unique_keys=True)
+        cls.db.__dict__["sync_client"] = client
+
+        now = datetime.now()
+        bodies = [
+            BodyRecord(mid=mid, uid=1, search_for=f"关键词{mid % 3}", create_time=now - timedelta(hours=mid),
+                       record_from=RecordFrom.Html, json_data={"mid": mid})
+            for mid in range(1, 31)
+        ]
+        comments = [
+            Comment1Record(mid=100 + i, uid=2, f_mid=1 + i % 5, f_uid=1, search_for="关键词0",
+                           create_time=now - timedelta(minutes=i), json_data={"mid": 100 + i})
+            for i in range(30)
+        ]
+        cls.db.sync_upsert_records("body", [record.model_dump(by_alias=True, exclude={"id"}) for record in bodies])
+        cls.db.sync_upsert_records("comment1", [record.model_dump(by_alias=True, exclude={"id"}) for record in comments])
+        cls.now = now
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.sync_client.drop_database(cls.db.db_name)
+        cls.db.sync_client.close()
+
+    def assertUsesIndex(self, collection_name: str, query: dict, expected: str, *, sort=None):
+        plan = self.db.sync_explain(collection_name, query, sort=sort)
+        self.assertEqual(winning_index(plan), expected, plan)
+
+    def test_find_by_mid(self):
+        self.assertUsesIndex("body", build_record_query(mid=5),
+                             _index_name(BodyRecord, ("mid", "search_for", "record_from")))
+        self.assertUsesIndex("comment1", build_record_query(mid=105), _index_name(Comment1Record, ("mid",)))
+
+    def test_find_by_parent(self):
+        self.assertUsesIndex("comment1", build_record_query(f_mid=3),
+                             _index_name(Comment1Record, ("f_mid", "mid", "search_for")), sort=[("mid", 1)])
+
+    def test_find_by_time_range(self):
+        query = build_record_query(time_start=self.now - timedelta(hours=10), time_end=self.now)
+        self.assertUsesIndex("body", query, _index_name(BodyRecord, ("create_time",)), sort=[("create_time", 1)])
+
+        query = build_record_query(search_for="关键词1", time_start=self.now - timedelta(hours=10), time_end=self.now)
+        self.assertUsesIndex("body", query, _index_name(BodyRecord, ("search_for", "create_time")), sort=[("create_time", 1)])
+
+    def test_find_by_keyword(self):
+        self.assertUsesIndex("body", build_record_query(search_for="关键词2"),
+                             _index_name(BodyRecord, ("search_for", "create_time")))
+
+
+if __name__ == "__main__":
+    unittest.main()
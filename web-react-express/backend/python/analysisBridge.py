@@ -2,15 +2,12 @@
 
 import sys
 import json
-import pandas as pd
 from util import db
-from SentimentAnalysis import analysis_sentiment
-import numpy as np
 import datetime
-from bson import ObjectId
 import io
 import os # 引入 os 模块
 import traceback # 引入 traceback 用于更详细的错误输出
+# pandas / numpy / SentimentAnalysis(torch) 都在用到它们的函数里导入, get_collections 不需要加载这些模块
 
 # 强制标准流编码
 sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
@@ -28,6 +25,11 @@ def get_collections():
         sys.exit(1)
 
 def execute_query(params):
+    import numpy as np
+    import pandas as pd
+    from bson import ObjectId
+    from util import build_record_query
+
     try:
         collection = params.get('collection') # 使用 get 获取，避免 KeyError
         limit = int(params.get('limit', 0))
@@ -37,9 +39,16 @@ def execute_query(params):
         if not hasattr(db, 'sync_db') or db.sync_db is None:
             raise ConnectionError("Database connection not established.")
 
-        print(f"DEBUG: Executing query on collection '{collection}' with limit {limit}", file=sys.stderr)
-        cursor = db.sync_db[collection].find().limit(limit) if limit > 0 else db.sync_db[collection].find()
-        df = pd.DataFrame(list(cursor))
+        # 可选的关键词 / 时间范围过滤, 走 search_for + create_time 索引
+        time_start = params.get('time_start')
+        time_end = params.get('time_end')
+        query = build_record_query(
+            search_for=params.get('search_for') or None,
+            time_start=datetime.datetime.fromisoformat(time_start) if time_start else None,
+            time_end=datetime.datetime.fromisoformat(time_end) if time_end else None,
+        )
+        print(f"DEBUG: Executing query {query} on collection '{collection}' with limit {limit}", file=sys.stderr)
+        df = pd.DataFrame(db.sync_find_records(collection, query, limit=limit))
         print(f"DEBUG: Initial DataFrame shape: {df.shape}", file=sys.stderr)
 
         if df.empty:
@@ -146,7 +155,31 @@ def execute_query(params):
         print(traceback.format_exc(), file=sys.stderr)
         sys.exit(1) # 确保异常时退出并返回错误码
 
+def _sentiment_analyzer_options():
+    from SentimentAnalysis.server import RemoteSentimentAnalyzer
+
+    # 配置了 SENTIMENT_SERVER 且服务可用时交给常驻服务打分, 省去本进程加载模型的冷启动
+    analyzer = RemoteSentimentAnalyzer.from_env()
+    if analyzer is not None:
+        print(f"DEBUG: Using resident sentiment server at {analyzer.host}:{analyzer.port}", file=sys.stderr)
+    else:
+        print("DEBUG: No resident sentiment server available, loading models in-process.", file=sys.stderr)
+        # SENTIMENT_CASCADE=low,high: 先用快速模型打分, 只有概率落在 [low, high] 内的文本交给 BERT
+        cascade_band = os.environ.get("SENTIMENT_CASCADE")
+        if cascade_band:
+            from SentimentAnalysis.cascade import CascadeSentimentAnalyzer
+            low, high = (float(v) for v in cascade_band.split(","))
+            analyzer = CascadeSentimentAnalyzer(low, high)
+            print(f"DEBUG: Using cascade scoring, uncertainty band [{low}, {high}]", file=sys.stderr)
+    # SENTIMENT_WORKERS: 本地多进程打分的进程数, 0 表示自动选择, 默认 1(单进程)
+    workers = int(os.environ.get("SENTIMENT_WORKERS", "1"))
+    return analyzer, workers
+
 def analyze_sentiment_from_csv(params):
+    import numpy as np
+    import pandas as pd
+    from SentimentAnalysis import analysis_sentiment
+
     try:
         csv_filepath = params.get('csv_filepath')
         if not csv_filepath:
@@ -166,8 +199,9 @@ def analyze_sentiment_from_csv(params):
         if not callable(analysis_sentiment):
              raise ImportError("Function 'analysis_sentiment' is not available or not callable.")
 
+        analyzer, workers = _sentiment_analyzer_options()
         print("DEBUG: Calling analysis_sentiment function...", file=sys.stderr)
-        result_df = analysis_sentiment(df)
+        result_df = analysis_sentiment(df, analyzer=analyzer, workers=workers)
         print(f"DEBUG: Analysis result shape: {result_df.shape}", file=sys.stderr)
 
         if result_df.empty:
@@ -184,6 +218,51 @@ def analyze_sentiment_from_csv(params):
         print(traceback.format_exc(), file=sys.stderr) # 打印完整 traceback
         sys.exit(1)
 
+def analyze_sentiment_from_collection(params):
+    # 直接从 Mongo 游标流式打分, 不把整个集合读进内存
+    import numpy as np
+    import pandas as pd
+    from SentimentAnalysis import analysis_sentiment_stream
+
+    try:
+        collection = params.get('collection')
+        limit = int(params.get('limit', 0))
+        chunk_size = int(params.get('chunk_size', 2000))
+        output_csv_path = params.get('output_csv_path') or 'sentiment_analysis_result.csv'
+
+        if not collection:
+            raise ValueError("Collection name is required.")
+        if not hasattr(db, 'sync_db') or db.sync_db is None:
+            raise ConnectionError("Database connection not established.")
+
+        analyzer, workers = _sentiment_analyzer_options()
+        chunks = db.sync_iter_record_chunks(
+            collection,
+            chunk_size=chunk_size,
+            projection={'search_for': 1, 'content_all': 1, 'content': 1, 'json_data.content_all': 1, 'json_data.content': 1},
+            limit=limit,
+        )
+        print(f"DEBUG: Streaming collection '{collection}' in chunks of {chunk_size}", file=sys.stderr)
+        result_df = analysis_sentiment_stream(
+            chunks,
+            output_csv_path=output_csv_path,
+            analyzer=analyzer,
+            workers=workers,
+            # 以文档 _id 为键保存 CLS 向量, 之后换分类头或阈值时不需要重新跑 BERT
+            store_embeddings=bool(params.get('store_embeddings', False)),
+            positive_threshold=float(params.get('positive_threshold', 0.5)),
+        )
+
+        result_df = result_df.replace({np.nan: None, pd.NaT: None})
+        dict_records = result_df.to_dict(orient='records')
+        print(f"DEBUG: Converted analysis result to {len(dict_records)} records.", file=sys.stderr)
+        return dict_records
+
+    except Exception as e:
+        print(f"ERROR [analyze_sentiment_from_collection]: An unexpected error occurred - {str(e)}", file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+        sys.exit(1)
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("ERROR: Missing action argument.", file=sys.stderr)
@@ -217,6 +296,8 @@ if __name__ == "__main__":
                 result = execute_query(params)
             elif action == "analyze_sentiment_from_csv":
                 result = analyze_sentiment_from_csv(params)
+            elif action == "analyze_sentiment_from_collection":
+                result = analyze_sentiment_from_collection(params)
             else:
                 print(f"ERROR: Unknown action '{action}'", file=sys.stderr)
                 sys.exit(1)
@@ -0,0 +1,104 @@
+# importTimeCheck.py
+"""桥接脚本冷启动的 import 耗时检查
+
+Node 后端每个请求都会新起一个 Python 进程, 所以 import 阶段的耗时直接计入接口延迟.
+这里对每个桥接动作, 用 `python -X importtime` 在新进程里执行该动作会触发的导入,
+统计总耗时并检查不该出现的重量级模块(例如 get_collections 不应该加载 torch).
+
+    python importTimeCheck.py            # 检查全部动作
+    python importTimeCheck.py -v         # 同时列出每个动作最耗时的导入
+    python importTimeCheck.py --only get_collections
+
+任何动作超出预算或加载了禁止的模块时以非零状态码退出.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+_BRIDGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 动作 -> (新进程里执行的代码, 导入耗时预算(ms), 不允许加载的模块)
+# 代码只做 import 和不会发起网络请求的初始化, 与动作实际触发的导入保持一致
+_ACTIONS = {
+    "get_collections": (
+        "import analysisBridge; analysisBridge.db.sync_db",
+        800,
+        ["torch", "transformers", "pandas", "motor", "httpx", "SentimentAnalysis"],
+    ),
+    "execute_query": (
+        "import analysisBridge; analysisBridge.db.sync_db; import numpy, pandas, bson",
+        2000,
+        ["torch", "transformers", "motor", "httpx", "SentimentAnalysis"],
+    ),
+    "analyze_sentiment_from_csv (resident server)": (
+        "import analysisBridge, numpy, pandas; from SentimentAnalysis.server import RemoteSentimentAnalyzer",
+        2000,
+        ["torch", "transformers", "motor", "httpx"],
+    ),
+    "analyze_sentiment_from_collection (resident server)": (
+        "import analysisBridge, numpy, pandas; analysisBridge.db.sync_db; from SentimentAnalysis.server import RemoteSentimentAnalyzer",
+        2000,
+        ["torch", "transformers", "motor", "httpx"],
+    ),
+}
+
+
+def _parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """解析 -X importtime 的输出, 返回 [(模块名, self_us, cumulative_us)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # 表头
+        rows.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return rows
+
+
+def measure(code: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """在新进程里执行 code, 返回 (导入总耗时 ms, 逐模块明细)"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=_BRIDGE_DIR, env=env, capture_output=True, text=True, encoding="utf-8", errors="replace",
+    )
+    rows = _parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        tail = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"`{code}` exited with {proc.returncode}:\n{tail}")
+    return sum(self_us for _, self_us, _ in rows) / 1000, rows
+
+
+def check(name: str, *, verbose: bool = False) -> bool:
+    code, budget_ms, forbidden = _ACTIONS[name]
+    total_ms, rows = measure(code)
+    loaded = {module for module, _, _ in rows}
+    bad = sorted(module for module in forbidden if module in loaded)
+    ok = total_ms <= budget_ms and not bad
+
+    status = "PASS" if ok else "FAIL"
+    print(f"[{status}] {name}: {total_ms:.0f} ms (budget {budget_ms} ms)")
+    if bad:
+        print(f"       forbidden modules loaded: {', '.join(bad)}")
+    if verbose or not ok:
+        top_level = [row for row in rows if "." not in row[0]]
+        for module, _, cumulative_us in sorted(top_level, key=lambda row: row[2], reverse=True)[:8]:
+            print(f"       {cumulative_us / 1000:8.1f} ms  {module}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="桥接脚本冷启动的 import 耗时检查")
+    parser.add_argument("--only", choices=list(_ACTIONS), default=None)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    names = [args.only] if args.only else list(_ACTIONS)
+    results = [check(name, verbose=args.verbose) for name in names]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -112,16 +112,13 @@ def main_process():
         kind=kind,
         advanced_kind=advanced_kind,
         time_start=start,
-        time_end=end
+        time_end=end,
+        # 每次请求都是一次新的搜索, 返回的 res_ids 要覆盖全部页, 所以不从断点继续
+        resume=False,
     )
     
-    records = db.sync_get_records_by_ids(
-        collection_name=collection_name,
-        ids=res_ids
-    )
-    documents = [record["json_data"] for record in records]
-    processed_data = process_list_documents(documents)
-
+    # 分块按 _id 查询, 只取 json_data, 边查边处理
+    documents = db.sync_iter_json_data(collection_name, res_ids)
     df_results = process_list_documents(documents)
 
     # 检查 df_results 是否真的是 DataFrame
@@ -90,8 +90,8 @@ router.get('/collections', async (req, res) => {
 
 // 执行MongoDB查询并保存结果到CSV
 router.post('/query', async (req, res) => {
-  const { collection, limit } = req.body;
-  console.log(`执行查询: collection=${collection}, limit=${limit}`);
+  const { collection, limit, search_for, time_start, time_end } = req.body;
+  console.log(`执行查询: collection=${collection}, limit=${limit}, search_for=${search_for || ''}`);
   const pythonScript = path.resolve(__dirname, '../python/analysisBridge.py');
   const pythonExec = process.env.PYTHON_EXECUTABLE || 'python';
 
@@ -109,7 +109,10 @@ router.post('/query', async (req, res) => {
 
   pythonProcess.stdin.write(JSON.stringify({
     collection,
-    limit: limit || 0
+    limit: limit || 0,
+    search_for: search_for || null,
+    time_start: time_start || null,
+    time_end: time_end || null
   }));
   pythonProcess.stdin.end();
 
@@ -192,23 +195,38 @@ router.post('/query', async (req, res) => {
    });
 });
 
-// 执行情感分析（通过CSV文件）
+// 执行情感分析
+// 传 collection 时直接从 Mongo 游标分块流式打分(analyze_sentiment_from_collection), 内存占用与集合大小无关;
+// 传 csvFilename 时分析 /query 保存的 CSV 文件(analyze_sentiment_from_csv)
 router.post('/sentiment', async (req, res) => {
-  const { csvFilename } = req.body;
-  console.log(`执行情感分析，使用文件: ${csvFilename}`);
-
-  if (!csvFilename) {
-    return res.status(400).json({ error: '缺少 csvFilename 参数' });
-  }
-
-  const csvFilePath = path.join(dataCacheDir, csvFilename);
-
-  if (!fs.existsSync(csvFilePath)) {
-      console.error(`错误：CSV文件未找到 - ${csvFilePath}`);
-      return res.status(404).json({ error: `指定的CSV文件未找到: ${csvFilename}` });
+  const { csvFilename, collection, limit } = req.body;
+
+  let action;
+  let params;
+  if (collection) {
+    console.log(`执行情感分析，流式读取集合: ${collection}, limit=${limit || 0}`);
+    const timestamp = new Date().toISOString().replace(/[:.]/g, '-');
+    const safeCollectionName = collection.replace(/[^a-zA-Z0-9_-]/g, '_');
+    action = 'analyze_sentiment_from_collection';
+    params = {
+      collection,
+      limit: limit || 0,
+      // 逐条打分结果写到缓存目录, 不写到 Python 进程的工作目录
+      output_csv_path: path.join(dataCacheDir, `sentiment_${safeCollectionName}_${timestamp}.csv`)
+    };
+  } else if (csvFilename) {
+    console.log(`执行情感分析，使用文件: ${csvFilename}`);
+    const csvFilePath = path.join(dataCacheDir, csvFilename);
+    if (!fs.existsSync(csvFilePath)) {
+        console.error(`错误：CSV文件未找到 - ${csvFilePath}`);
+        return res.status(404).json({ error: `指定的CSV文件未找到: ${csvFilename}` });
+    }
+    action = 'analyze_sentiment_from_csv';
+    params = { csv_filepath: csvFilePath };
+  } else {
+    return res.status(400).json({ error: '缺少 collection 或 csvFilename 参数' });
   }
 
-
   const pythonScript = path.resolve(__dirname, '../python/analysisBridge.py');
   const pythonExec = process.env.PYTHON_EXECUTABLE || 'python';
 
@@ -217,14 +235,14 @@ router.post('/sentiment', async (req, res) => {
 
   const pythonProcess = spawn(pythonExec, [
     pythonScript,
-    'analyze_sentiment_from_csv'
+    action
   ], {
     env: { ...process.env, PYTHONIOENCODING: 'utf-8', PYTHONUTF8: '1' },
     encoding: 'utf-8',
     shell: process.platform === 'win32'
   });
 
-  pythonProcess.stdin.write(JSON.stringify({ csv_filepath: csvFilePath }));
+  pythonProcess.stdin.write(JSON.stringify(params));
   pythonProcess.stdin.end();
 
   pythonProcess.stdout.on('data', (data) => {
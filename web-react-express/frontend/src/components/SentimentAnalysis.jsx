@@ -11,6 +11,7 @@ const SentimentAnalysis = () => {
   const [limit, setLimit] = useState(1000);
   const [queryResult, setQueryResult] = useState(null); // 存储用于显示的查询结果
   const [csvFilename, setCsvFilename] = useState(null);
+  const [queriedParams, setQueriedParams] = useState(null); // 最近一次查询的集合和条数上限, 情感分析使用相同的范围
   const [analysisResult, setAnalysisResult] = useState(null);
   const [loading, setLoading] = useState(false);
   const [queryLoading, setQueryLoading] = useState(false);
@@ -57,6 +58,7 @@ const SentimentAnalysis = () => {
     setQueryLoading(true);
     setQueryResult(null); // 清空旧结果
     setCsvFilename(null);  // 清空旧文件名
+    setQueriedParams(null);
     setAnalysisResult(null); // 清空旧分析结果
 
     try {
@@ -90,6 +92,7 @@ const SentimentAnalysis = () => {
 
       setQueryResult(processedData);
       setCsvFilename(receivedCsvFilename);
+      setQueriedParams({ collection: selectedCollection, limit: limit || 0 });
 
       if (processedData.length === 0) {
           message.info('查询成功，但未找到符合条件的数据。');
@@ -123,7 +126,7 @@ const SentimentAnalysis = () => {
 
   // 执行情感分析
   const handleAnalysis = async () => {
-    if (!csvFilename) {
+    if (!csvFilename || !queriedParams) {
         message.warning('没有可供分析的数据文件。请先执行查询。');
         return;
     }
@@ -131,9 +134,8 @@ const SentimentAnalysis = () => {
     setAnalysisResult(null);
 
     try {
-      const res = await axios.post('/api/analysis/sentiment', {
-        csvFilename: csvFilename
-      });
+      // 按集合流式分析, 与查询使用相同的集合和条数上限, 不需要把查询结果整体读进内存
+      const res = await axios.post('/api/analysis/sentiment', queriedParams);
       setAnalysisResult(res.data);
       message.success('情感分析执行成功！');
     } catch (err) {
@@ -1,11 +1,32 @@
 import sys
 sys.path.append(".")
 
-from WeiBoCrawler.database import db, BodyRecord, Comment1Record, Comment2Record
-from WeiBoCrawler.pack import get_list_data, get_body_data, get_comment1_data, get_comment2_data
-from WeiBoCrawler.parse import process_list_documents, process_comment_documents, process_body_documents
-from WeiBoCrawler.request import get_qr_Info, get_qr_status
-from WeiBoCrawler.util import config_path, cookies_config
+from WeiBoCrawler.util.lazy import lazy_exports
+
+# 各桥接脚本只用到其中一部分, 按需导入, 避免 get_collections 之类的轻量操作也要加载 httpx / parsel / pandas
+_LAZY_ATTRS = {
+    "config_path": "WeiBoCrawler.util",
+    "cookies_config": "WeiBoCrawler.util",
+
+    "get_qr_Info": "WeiBoCrawler.request",
+    "get_qr_status": "WeiBoCrawler.request",
+
+    "get_list_data": "WeiBoCrawler.pack",
+    "get_body_data": "WeiBoCrawler.pack",
+    "get_comment1_data": "WeiBoCrawler.pack",
+    "get_comment2_data": "WeiBoCrawler.pack",
+    "crawl_pipeline": "WeiBoCrawler.pack",
+
+    "db": "WeiBoCrawler.database",
+    "BodyRecord": "WeiBoCrawler.database",
+    "Comment1Record": "WeiBoCrawler.database",
+    "Comment2Record": "WeiBoCrawler.database",
+    "build_record_query": "WeiBoCrawler.database",
+
+    "process_body_documents": "WeiBoCrawler.parse",
+    "process_list_documents": "WeiBoCrawler.parse",
+    "process_comment_documents": "WeiBoCrawler.parse",
+}
 
 
 __all__ = [
@@ -19,13 +40,18 @@ __all__ = [
     "get_body_data",
     "get_comment1_data",
     "get_comment2_data",
+    "crawl_pipeline",
 
     "db",
     "BodyRecord",
     "Comment1Record",
     "Comment2Record",
+    "build_record_query",
 
     "process_body_documents",
     "process_list_documents",
     "process_comment_documents",
-]
\ No newline at end of file
+]
+
+
+__getattr__, __dir__ = lazy_exports(globals(), _LAZY_ATTRS)
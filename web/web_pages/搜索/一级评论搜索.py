@@ -1,5 +1,5 @@
 import streamlit as st
-from util import get_comment1_data, db, Comment1Record, process_comment_documents
+from util import get_comment1_data, db, process_comment_documents
 
 cols = st.columns([4, 4, 3, 1, 2, 2], vertical_alignment="bottom")
 cols[0].text_input("uid 列表(用空格分隔)", value="2035895904 1749277070", key="uid")
@@ -18,10 +18,9 @@ if st.session_state["comment1_button"]:
         st.warning("uid列表和mid列表长度必须一致")
     else:
         with st.spinner("搜索中(进展在控制台)..."):
-            res_ids = get_comment1_data(uid=uids, mid=mids, table_name=st.session_state["table_name"])
+            res_ids = get_comment1_data(uid=uids, mid=mids, table_name=st.session_state["table_name"], resume=False)
         with st.spinner("导入中(进展在控制台)..."):
-            records = db.sync_get_records_by_ids(Comment1Record, res_ids)
-            documents = [record.json_data for record in records]
+            documents = db.sync_iter_json_data(st.session_state["table_name"], res_ids)
             st.session_state["comment1"] = process_comment_documents(documents)
 
 if "comment1" in st.session_state:
@@ -1,5 +1,5 @@
 import streamlit as st
-from util import get_list_data, db, BodyRecord, process_list_documents
+from util import get_list_data, db, process_list_documents
 from datetime import date
 import re
 from pypinyin import slug, Style  # 需要安装 pypinyin 库
@@ -79,16 +79,13 @@ if st.session_state["list_button"]:
                 kind=st.session_state["kind"],
                 advanced_kind=st.session_state["advanced_kind"],
                 time_start=st.session_state["start"],
-                time_end=st.session_state["end"]
+                time_end=st.session_state["end"],
+                resume=False,  # 每次搜索都重新请求全部页, 页面展示的是 res_ids 对应的记录
             )
         
         with st.spinner("导入中(进展在控制台)..."):
-            # 直接从集合查询
-            records = db.sync_get_records_by_ids(
-                collection_name=collection_name,
-                ids=res_ids
-            )
-            documents = [record["json_data"] for record in records]
+            # 分块按 _id 查询, 只取 json_data, 边查边处理
+            documents = db.sync_iter_json_data(collection_name, res_ids)
             st.session_state["list"] = process_list_documents(documents)
 
 if "list" in st.session_state:
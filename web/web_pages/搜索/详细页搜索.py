@@ -1,5 +1,5 @@
 import streamlit as st
-from util import get_body_data, db, BodyRecord, process_body_documents
+from util import get_body_data, db, process_body_documents
 
 cols = st.columns([7, 3, 2, 2, 2], vertical_alignment="bottom")
 cols[0].text_input("搜索id列表(用空格分隔)", value="OEEV7wXHY Oj0PXme8I OiZre8dir Oj0zUmucE", key="ids")
@@ -15,8 +15,7 @@ if st.session_state["body_button"]:
         with st.spinner("搜索中(进展在控制台)..."):
             res_ids = get_body_data(id=ids, table_name=st.session_state["table_name"])
         with st.spinner("导入中(进展在控制台)..."):
-            records = db.sync_get_records_by_ids(BodyRecord, res_ids)
-            documents = [record.json_data for record in records]
+            documents = db.sync_iter_json_data(st.session_state["table_name"], res_ids)
             st.session_state["body"] = process_body_documents(documents)
 
 if "body" in st.session_state:
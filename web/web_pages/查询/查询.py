@@ -1,4 +1,4 @@
-from util import db
+from util import db, build_record_query
 import streamlit as st
 import pandas as pd
 from SentimentAnalysis import analysis_sentiment
@@ -21,6 +21,8 @@ selected_collection = st.selectbox(
 # 2. 用户输入查询的 limit 值（0 表示取消 limit，查询全部内容）
 limit_value = st.number_input("请输入查询的 limit 值（0 表示查询全部）：", 
                             min_value=0, step=1, value=0, key="limit_value")
+# 3. 可选的搜索关键词过滤（走 search_for 索引，留空查询全部）
+search_for_value = st.text_input("按搜索关键词过滤（留空查询全部）：", value="", key="search_for_value")
 
 
 
@@ -29,10 +31,8 @@ if st.button("执行查询"):
     
     # 执行查询
     try:
-        cursor = db.sync_db[selected_collection].find(
-            limit=limit_value if limit_value > 0 else 0
-        )
-        df = pd.DataFrame(list(cursor))
+        query = build_record_query(search_for=search_for_value.strip() or None)
+        df = pd.DataFrame(db.sync_find_records(selected_collection, query, limit=limit_value))
         
         # 处理 ObjectId 类型
         if '_id' in df.columns: